@@ -37,10 +37,10 @@ macOS上でユーザーの依頼を精密かつ一貫して自動化で遂行し
 
 # 利用可能なツール（呼出し構文例は省略）
 
-- **操作系**: click, move, drag, scroll, type, press, hotkey
+- **操作系**: click, move, drag, scroll, type, press, hotkey, batch（複数の操作をまとめて実行）
 - **UI状態取得**: elementsJson, webElements, focusElement
 - **システム操作**: osa (AppleScript実行)
-- **思考・管理**: think(phase指定), done, wait
+- **思考・管理**: think(phase指定), done, wait, waitForStable（画面が落ち着くまで待機）, waitForElement（要素が現れる/消えるまで待機）
 
 # 出力フォーマット
 
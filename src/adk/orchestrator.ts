@@ -74,6 +74,17 @@ export class MacOSAgentOrchestrator extends EventEmitter {
 
       this.log("info", `画面サイズ: ${this.screenSize.width}x${this.screenSize.height}`);
 
+      if (PERFORMANCE_CONFIG.FRAME_GRABBER_FPS > 0) {
+        try {
+          await this.pythonBridge.call("startFrameGrabber", {
+            fps: PERFORMANCE_CONFIG.FRAME_GRABBER_FPS,
+            buffer_size: PERFORMANCE_CONFIG.FRAME_GRABBER_BUFFER_SIZE,
+          });
+        } catch (e) {
+          this.log("error", `フレームグラバーの開始に失敗しました: ${e}`);
+        }
+      }
+
       // ツールスイートの構築
       this.toolSuite = new MacOSToolSuite(this.pythonBridge, this.screenSize, this.debugMode);
 
@@ -1,4 +1,23 @@
 import { describe, it, expect, vi } from 'vitest';
+import { MacOSToolSuite } from './macos-tool-suite';
+
+// FunctionTool は渡された定義をそのまま保持するだけのスタブにし、execute を直接呼べるようにする
+vi.mock('@google/adk', () => ({
+  FunctionTool: class {
+    constructor(options: any) {
+      Object.assign(this, options);
+    }
+  },
+}));
+
+const createSuite = (respond: (action: string, params: any) => any) => {
+  const bridge = {
+    call: vi.fn(async (action: string, params: any) => respond(action, params)),
+  };
+  const suite = new MacOSToolSuite(bridge as any, { width: 1000, height: 1000 });
+  const tool = (name: string) => suite.createTools().find((t: any) => t.name === name) as any;
+  return { bridge, tool };
+};
 
 describe('MacOSToolSuite', () => {
   describe('coordinate normalization logic', () => {
@@ -65,11 +84,14 @@ describe('MacOSToolSuite', () => {
         'webElements',
         'osa',
         'wait',
+        'waitForStable',
+        'waitForElement',
+        'batch',
         'think',
         'done'
       ];
 
-      expect(expectedTools).toHaveLength(14);
+      expect(expectedTools).toHaveLength(17);
       expect(expectedTools).toContain('click');
       expect(expectedTools).toContain('type');
       expect(expectedTools).toContain('done');
@@ -153,5 +175,108 @@ describe('MacOSToolSuite', () => {
       expect(screenshot.inlineData).toHaveProperty('data');
       expect(screenshot.inlineData.mimeType).toBe('image/jpeg');
     });
+
+    it('should pass an unchanged marker instead of image data', () => {
+      // Replicate the branching in takePostActionScreenshot
+      const toScreenshot = (result: any) => {
+        if (result.status !== 'success') return undefined;
+        if (result.unchanged) return { unchanged: true, frame_id: result.frame_id };
+        if (!result.data) return undefined;
+        return { inlineData: { mimeType: 'image/jpeg', data: result.data } };
+      };
+
+      expect(toScreenshot({ status: 'success', unchanged: true, frame_id: 3 })).toEqual({
+        unchanged: true,
+        frame_id: 3
+      });
+      expect(toScreenshot({ status: 'success', data: 'abc', frame_id: 4 })).toHaveProperty('inlineData');
+      expect(toScreenshot({ status: 'error' })).toBeUndefined();
+    });
+  });
+
+  describe('batch tool', () => {
+    it('keeps a successful batch as success', async () => {
+      const { bridge, tool } = createSuite(() => ({
+        status: 'success',
+        steps: [{ index: 0, action: 'click', status: 'success', elapsed_ms: 3 }],
+        screenshot: { status: 'success', data: 'abc', mime_type: 'image/jpeg' },
+      }));
+
+      const result = await tool('batch').execute({ steps: [{ action: 'click', x: 500, y: 500 }] });
+
+      expect(result.status).toBe('success');
+      expect(result.message).toBeUndefined();
+      expect(result.screenshot).toEqual({ inlineData: { mimeType: 'image/jpeg', data: 'abc' } });
+      expect(bridge.call).toHaveBeenCalledWith(
+        'batch',
+        expect.objectContaining({ steps: [{ action: 'click', params: { x: 500, y: 500 } }] }),
+      );
+    });
+  });
+
+  describe('elementsJson tool', () => {
+    it('fails when observe returns no tree', async () => {
+      const { tool } = createSuite(() => ({
+        status: 'success',
+        errors: { tree: 'timeout' },
+        screenshot: { status: 'success', data: 'abc' },
+      }));
+
+      const result = await tool('elementsJson').execute({ app_name: 'Finder' });
+
+      expect(result.status).toBe('error');
+      expect(result.message).toBe('timeout');
+    });
+  });
+
+  describe('queued input', () => {
+    const queueingBridge = (flushStatus = 'success') => {
+      let pending = 0;
+      return (action: string) => {
+        if (action === 'move' || action === 'scroll') {
+          pending += 1;
+          return { status: 'success', queued: true, pending };
+        }
+        if (action === 'flushInput') {
+          pending = 0;
+          return { status: flushStatus, message: flushStatus === 'success' ? undefined : 'Deferred move failed: fail-safe' };
+        }
+        return { status: 'success', ui_data: { uiElements: [] } };
+      };
+    };
+
+    it('coalesces consecutive move calls and flushes once before the next observation', async () => {
+      const { bridge, tool } = createSuite(queueingBridge());
+
+      const first = await tool('move').execute({ x: 100, y: 100 });
+      const second = await tool('move').execute({ x: 200, y: 200 });
+      expect(first.queued).toBe(true);
+      expect(first.screenshot).toBeUndefined();
+      expect(second.pending).toBe(2);
+
+      await tool('elementsJson').execute({ app_name: 'Finder' });
+
+      expect(bridge.call.mock.calls.map((call) => call[0])).toEqual(['move', 'move', 'flushInput', 'observe']);
+    });
+
+    it('leaves the flush to the executor when the next call is an action', async () => {
+      const { bridge, tool } = createSuite(queueingBridge());
+
+      await tool('scroll').execute({ amount: 3 });
+      await tool('click').execute({ x: 500, y: 500 });
+      await tool('wait').execute({ seconds: 0 });
+
+      expect(bridge.call.mock.calls.map((call) => call[0])).toEqual(['scroll', 'click', 'screenshot', 'screenshot']);
+    });
+
+    it('returns a failed deferred flush as the observation result', async () => {
+      const { tool } = createSuite(queueingBridge('error'));
+
+      await tool('move').execute({ x: 100, y: 100 });
+      const result = await tool('waitForStable').execute({});
+
+      expect(result.status).toBe('error');
+      expect(result.message).toContain('fail-safe');
+    });
   });
 });
@@ -1,5 +1,6 @@
 import { FunctionTool, type ToolContext } from "@google/adk";
 import type { PythonBridge } from "../../core/python-bridge";
+import type { BatchStep, PythonResponse, WebElement } from "../../core/types";
 import { PERFORMANCE_CONFIG } from "../../core/constants";
 import * as schemas from "./schemas";
 
@@ -7,6 +8,8 @@ export class MacOSToolSuite {
   private bridge: PythonBridge;
   private screenSize: { width: number; height: number };
   private debugMode: boolean;
+  // 合体キューに実行待ちの move / scroll が残っているか
+  private pendingInput = false;
 
   constructor(bridge: PythonBridge, screenSize: { width: number; height: number }, debugMode: boolean = false) {
     this.bridge = bridge;
@@ -25,22 +28,70 @@ export class MacOSToolSuite {
     };
   }
 
-  private async takePostActionScreenshot(highlightPos?: { x: number; y: number }) {
-    const result = await this.bridge.call("screenshot", {
+  private screenshotParams(highlightPos?: { x: number; y: number }) {
+    return {
       highlight_pos: highlightPos,
       quality: PERFORMANCE_CONFIG.SCREENSHOT_QUALITY,
-    });
-    if (result.status !== "success" || !result.data) {
+      max_dimension: PERFORMANCE_CONFIG.SCREENSHOT_MAX_DIMENSION || undefined,
+      max_bytes: PERFORMANCE_CONFIG.SCREENSHOT_MAX_BYTES || undefined,
+      // フレームグラバー有効時は直前の操作完了後に撮られたフレームを使う
+      after: "last_action",
+    };
+  }
+
+  private toScreenshotPart(result: PythonResponse | undefined) {
+    if (!result || result.status !== "success") {
+      return undefined;
+    }
+    if (result.unchanged) {
+      // 画面が前回のスクリーンショットから変化していない場合は画像を送らず、その旨だけを伝える
+      return { unchanged: true, frame_id: result.frame_id };
+    }
+    if (!result.data) {
       return undefined;
     }
     return {
       inlineData: {
-        mimeType: "image/jpeg",
+        mimeType: result.mime_type || "image/jpeg",
         data: result.data
       }
     };
   }
 
+  private async act(action: string, params: any): Promise<PythonResponse> {
+    // 直列レーンのアクションは executor が実行前に合体待ちの move / scroll を実行する
+    // （遅延実行した入力が失敗していればこの応答がエラーになる）
+    const result = await this.bridge.call(action, params);
+    this.pendingInput = false;
+    return result;
+  }
+
+  private async queueInput(action: "move" | "scroll", params: any): Promise<PythonResponse> {
+    const result = await this.bridge.call(action, params);
+    if (!result.queued) {
+      return result;
+    }
+    // 合体キューに入った move / scroll は次の操作か観測の直前まで実行を遅らせ、
+    // 連続したツール呼び出しの間で合体させる（ここではスクリーンショットも撮らない）
+    this.pendingInput = true;
+    return { ...result, message: result.message ?? `${action} をキューに入れました（次の操作か観測の前に実行されます）` };
+  }
+
+  private async flushPendingInput(): Promise<PythonResponse | undefined> {
+    if (!this.pendingInput) {
+      return undefined;
+    }
+    // 並行レーンの観測（スクリーンショット・ツリー取得など）の前に合体待ちの入力を画面に反映させる
+    this.pendingInput = false;
+    const flushed = await this.bridge.call("flushInput", {});
+    return flushed.status === "success" ? undefined : flushed;
+  }
+
+  private async takePostActionScreenshot(highlightPos?: { x: number; y: number }) {
+    const result = await this.bridge.call("screenshot", this.screenshotParams(highlightPos));
+    return this.toScreenshotPart(result);
+  }
+
   public createTools(): FunctionTool<any>[] {
     return [
       this.createClickTool(),
@@ -55,6 +106,9 @@ export class MacOSToolSuite {
       this.createWebElementsTool(),
       this.createOsaTool(),
       this.createWaitTool(),
+      this.createWaitForStableTool(),
+      this.createWaitForElementTool(),
+      this.createBatchTool(),
       this.createThinkTool(),
       this.createDoneTool(),
     ];
@@ -70,7 +124,7 @@ export class MacOSToolSuite {
         if (this.debugMode) {
           console.error(`[Tool:click] Normalized position: (${args.x}, ${args.y}) -> (${pos.x}, ${pos.y})`);
         }
-        const result = await this.bridge.call("click", pos);
+        const result = await this.act("click", pos);
         const screenshot = await this.takePostActionScreenshot(pos);
         if (context) {
           context.state.set("last_action_pos", pos);
@@ -94,11 +148,14 @@ export class MacOSToolSuite {
         if (this.debugMode) {
           console.error(`[Tool:move] Normalized position: (${args.x}, ${args.y}) -> (${pos.x}, ${pos.y})`);
         }
-        const result = await this.bridge.call("move", pos);
-        const screenshot = await this.takePostActionScreenshot(pos);
+        const result = await this.queueInput("move", pos);
         if (context) {
           context.state.set("last_action_pos", pos);
         }
+        if (result.queued) {
+          return result;
+        }
+        const screenshot = await this.takePostActionScreenshot(pos);
         const finalResult: any = { ...result };
         if (screenshot) {
           finalResult.screenshot = screenshot;
@@ -123,7 +180,7 @@ export class MacOSToolSuite {
             `to (${args.to_x}, ${args.to_y}) -> (${to.x}, ${to.y})`
           );
         }
-        const result = await this.bridge.call("drag", {
+        const result = await this.act("drag", {
           from_x: from.x,
           from_y: from.y,
           to_x: to.x,
@@ -148,7 +205,10 @@ export class MacOSToolSuite {
       description: "垂直方向にスクロールします。正の値で下方向、負の値で上方向。",
       parameters: schemas.ScrollSchema,
       execute: async (args: any) => {
-        const result = await this.bridge.call("scroll", args);
+        const result = await this.queueInput("scroll", args);
+        if (result.queued) {
+          return result;
+        }
         const screenshot = await this.takePostActionScreenshot();
         const finalResult: any = { ...result };
         if (screenshot) {
@@ -165,7 +225,7 @@ export class MacOSToolSuite {
       description: "フォーカス中の入力欄にテキストを入力します。",
       parameters: schemas.TypeSchema,
       execute: async (args: any) => {
-        const result = await this.bridge.call("type", args);
+        const result = await this.act("type", args);
         const screenshot = await this.takePostActionScreenshot();
         const finalResult: any = { ...result };
         if (screenshot) {
@@ -182,7 +242,7 @@ export class MacOSToolSuite {
       description: "EnterやEscなどの単一キーを送信します。",
       parameters: schemas.PressSchema,
       execute: async (args: any) => {
-        const result = await this.bridge.call("press", args);
+        const result = await this.act("press", args);
         const screenshot = await this.takePostActionScreenshot();
         const finalResult: any = { ...result };
         if (screenshot) {
@@ -199,7 +259,7 @@ export class MacOSToolSuite {
       description: "修飾キーを含む複数キーの同時押下を送信します。",
       parameters: schemas.HotkeySchema,
       execute: async (args: any) => {
-        const result = await this.bridge.call("hotkey", args);
+        const result = await this.act("hotkey", args);
         const screenshot = await this.takePostActionScreenshot();
         const finalResult: any = { ...result };
         if (screenshot) {
@@ -213,16 +273,34 @@ export class MacOSToolSuite {
   private createElementsJsonTool() {
     return new FunctionTool({
       name: "elementsJson",
-      description: "macOSのアクセシビリティツリーを取得します。",
+      description:
+        "macOSのアクセシビリティツリーを取得します。結果は最大5秒キャッシュされ、操作やウィンドウの変化で取り直します（アプリ側だけの更新を確認する場合は use_cache: false）。",
       parameters: schemas.ElementsJsonSchema,
       execute: async (args: any, context?: ToolContext) => {
-        const result = await this.bridge.call("elementsJson", args);
-        const screenshot = await this.takePostActionScreenshot();
+        const flushError = await this.flushPendingInput();
+        if (flushError) {
+          return flushError;
+        }
+        // ツリー・スクリーンショット・フォーカス要素を observe の1回の往復で並行して取得する
+        // 転送量を抑えるためツリーは列指向形式で受け取る（PythonBridge がツリーに復元する）
+        const { app_name, max_depth, ...treeOptions } = args;
+        const result = await this.bridge.call("observe", {
+          app_name,
+          max_depth,
+          tree: { format: "columnar", ...treeOptions },
+          screenshot: this.screenshotParams(),
+        });
+        const { screenshot: shot, ...finalResult }: any = result;
+        const screenshot = this.toScreenshotPart(shot);
+        if (result.errors?.tree || !result.ui_data) {
+          // observe は一部の取得に成功すれば success を返すが、このツールはツリーが取れなければ失敗とする
+          finalResult.status = "error";
+          finalResult.message = result.errors?.tree || result.message || "アクセシビリティツリーを取得できませんでした";
+        }
         if (context && result.status === "success" && result.ui_data) {
-          context.state.set("last_ui_snapshot_app", args.app_name);
-          context.state.set("current_app", args.app_name);
+          context.state.set("last_ui_snapshot_app", app_name);
+          context.state.set("current_app", app_name);
         }
-        const finalResult: any = { ...result };
         if (screenshot) {
           finalResult.screenshot = screenshot;
         }
@@ -237,7 +315,7 @@ export class MacOSToolSuite {
       description: "要素をフォーカスします。",
       parameters: schemas.FocusElementSchema,
       execute: async (args: any) => {
-        const result = await this.bridge.call("focusElement", args);
+        const result = await this.act("focusElement", args);
         const screenshot = await this.takePostActionScreenshot();
         const finalResult: any = { ...result };
         if (screenshot) {
@@ -251,10 +329,22 @@ export class MacOSToolSuite {
   private createWebElementsTool() {
     return new FunctionTool({
       name: "webElements",
-      description: "ブラウザ内のDOM要素一覧を取得します。",
+      description:
+        "ブラウザ内のDOM要素一覧を取得します。next_cursor が返された場合は cursor に渡すと続きを取得できます。",
       parameters: schemas.WebElementsSchema,
       execute: async (args: any, context?: ToolContext) => {
-        const result = await this.bridge.call("webElements", args);
+        const flushError = await this.flushPendingInput();
+        if (flushError) {
+          return flushError;
+        }
+        // 途中結果としてチャンクごとに届いた要素と、最終応答の残りを合わせる
+        const elements: WebElement[] = [];
+        const result = await this.bridge.callStream("webElements", args, (chunk) => {
+          elements.push(...(chunk.elements ?? []));
+        });
+        if (result.ui_data && "elements" in result.ui_data) {
+          result.ui_data = { ...result.ui_data, elements: [...elements, ...result.ui_data.elements] };
+        }
         const screenshot = await this.takePostActionScreenshot();
         if (context && result.status === "success") {
           context.state.set("current_app", args.app_name);
@@ -274,7 +364,7 @@ export class MacOSToolSuite {
       description: "任意のAppleScriptを実行します。",
       parameters: schemas.OsaSchema,
       execute: async (args: any) => {
-        const result = await this.bridge.call("osa", args);
+        const result = await this.act("osa", args);
         const screenshot = await this.takePostActionScreenshot();
         const finalResult: any = { ...result };
         if (screenshot) {
@@ -291,6 +381,10 @@ export class MacOSToolSuite {
       description: "指定秒数待機します。",
       parameters: schemas.WaitSchema,
       execute: async (args: any) => {
+        const flushError = await this.flushPendingInput();
+        if (flushError) {
+          return flushError;
+        }
         await new Promise((resolve) => setTimeout(resolve, args.seconds * 1000));
         const screenshot = await this.takePostActionScreenshot();
         const finalResult: any = { status: "success", message: `${args.seconds}秒待機しました` };
@@ -302,6 +396,99 @@ export class MacOSToolSuite {
     });
   }
 
+  private createBatchTool() {
+    return new FunctionTool({
+      name: "batch",
+      description:
+        "複数の操作（click/move/drag/scroll/type/press/hotkey）を順に1回でまとめて実行し、最後にスクリーンショットを1枚返します。",
+      parameters: schemas.BatchSchema,
+      execute: async (args: any) => {
+        const steps: BatchStep[] = (args.steps ?? []).map((step: any) => {
+          const { action, ...params } = step;
+          if (action === "click" || action === "move") {
+            return { action, params: this.normalizeToScreen(params.x, params.y) };
+          }
+          if (action === "drag") {
+            const from = this.normalizeToScreen(params.from_x, params.from_y);
+            const to = this.normalizeToScreen(params.to_x, params.to_y);
+            return { action, params: { from_x: from.x, from_y: from.y, to_x: to.x, to_y: to.y } };
+          }
+          return { action, params };
+        });
+        const result = await this.act("batch", {
+          steps,
+          stop_on_error: args.stop_on_error ?? true,
+          wait_for_stable: args.wait_for_stable ?? false,
+          screenshot: this.screenshotParams(),
+        });
+        const { screenshot: shot, ...finalResult }: any = result;
+        const screenshot = this.toScreenshotPart(shot);
+        if (screenshot) {
+          finalResult.screenshot = screenshot;
+        }
+        return finalResult;
+      },
+    });
+  }
+
+  private createWaitForElementTool() {
+    return new FunctionTool({
+      name: "waitForElement",
+      description:
+        "UI要素が現れる（state: disappear なら消える）まで待機し、要素の位置を返します。wait と elementsJson の繰り返しの代わりに使います。",
+      parameters: schemas.WaitForElementSchema,
+      execute: async (args: any) => {
+        const flushError = await this.flushPendingInput();
+        if (flushError) {
+          return flushError;
+        }
+        const timeoutMs = args.timeout_ms ?? 5000;
+        return await this.bridge.call(
+          "waitForElement",
+          { ...args, timeout_ms: timeoutMs },
+          { timeout: timeoutMs + 10000, retries: 0 },
+        );
+      },
+    });
+  }
+
+  private createWaitForStableTool() {
+    return new FunctionTool({
+      name: "waitForStable",
+      description: "画面の描画が落ち着くまで待機し、安定した画面を返します。秒数が分からない待機にはwaitよりこちらを使います。",
+      parameters: schemas.WaitForStableSchema,
+      execute: async (args: any) => {
+        const flushError = await this.flushPendingInput();
+        if (flushError) {
+          return flushError;
+        }
+        const stableMs = args.stable_ms ?? 300;
+        const timeoutMs = args.timeout_ms ?? 3000;
+        const result = await this.bridge.call(
+          "waitForStable",
+          {
+            stable_ms: stableMs,
+            timeout_ms: timeoutMs,
+            quality: PERFORMANCE_CONFIG.SCREENSHOT_QUALITY,
+            max_dimension: PERFORMANCE_CONFIG.SCREENSHOT_MAX_DIMENSION || undefined,
+          },
+          { timeout: timeoutMs + 10000 },
+        );
+        const { data, ...rest } = result;
+        const finalResult: any = { ...rest };
+        if (result.status === "success" && data) {
+          finalResult.screenshot = {
+            inlineData: {
+              mimeType: result.mime_type || "image/jpeg",
+              data,
+            },
+          };
+        }
+        return finalResult;
+      },
+    });
+  }
+
   private createThinkTool() {
     return new FunctionTool({
       name: "think",
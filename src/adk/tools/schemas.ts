@@ -69,6 +69,19 @@ export const ElementsJsonSchema = {
   properties: {
     app_name: { type: "string", description: "アプリ名" },
     max_depth: { type: "number", description: "探索深さ" },
+    window: { type: "string", description: "対象ウィンドウ名（省略時は全ウィンドウ）" },
+    use_cache: {
+      type: "boolean",
+      description:
+        "falseで必ず取得し直す。操作を伴わないアプリ側の更新（読み込み完了など）は最大5秒キャッシュが返るため、その確認に使う",
+    },
+    interactive_only: { type: "boolean", description: "操作できる要素のみ取得" },
+    visible_only: { type: "boolean", description: "サイズ0・画面外の要素を除外" },
+    roles: { type: "array", items: { type: "string" }, description: "取得するrole（例: AXButton）" },
+    exclude_roles: { type: "array", items: { type: "string" }, description: "子孫ごと除外するrole" },
+    name_contains: { type: "string", description: "nameに含まれる文字列" },
+    name_regex: { type: "string", description: "nameにマッチする正規表現" },
+    max_nodes: { type: "number", description: "取得する要素数の上限" },
   },
   required: ["app_name"],
 } as any;
@@ -83,10 +96,48 @@ export const FocusElementSchema = {
   required: ["app_name", "role", "name"],
 } as any;
 
+export const BatchSchema = {
+  type: "object",
+  properties: {
+    steps: {
+      type: "array",
+      description: "順に実行する操作。座標は正規化座標 (0-1000)",
+      items: {
+        type: "object",
+        properties: {
+          action: {
+            type: "string",
+            enum: ["click", "move", "drag", "scroll", "type", "press", "hotkey"],
+          },
+          x: { type: "integer" },
+          y: { type: "integer" },
+          from_x: { type: "integer" },
+          from_y: { type: "integer" },
+          to_x: { type: "integer" },
+          to_y: { type: "integer" },
+          amount: { type: "integer" },
+          text: { type: "string" },
+          key: { type: "string" },
+          keys: { type: "array", items: { type: "string" } },
+        },
+        required: ["action"],
+      },
+    },
+    stop_on_error: { type: "boolean", description: "失敗した操作で中断する（既定true）" },
+    wait_for_stable: { type: "boolean", description: "各操作の後に画面が落ち着くまで待つ" },
+  },
+  required: ["steps"],
+} as any;
+
 export const WebElementsSchema = {
   type: "object",
   properties: {
     app_name: { type: "string" },
+    cursor: { type: "string", description: "前回の応答の next_cursor（続きを取得）" },
+    limit: { type: "number", description: "取得する要素数の上限（既定200）" },
+    roles: { type: "array", items: { type: "string" }, description: "取得するrole（例: AXLink）" },
+    exclude_roles: { type: "array", items: { type: "string" }, description: "子孫ごと除外するrole" },
+    visible_only: { type: "boolean", description: "falseで画面外の要素も取得" },
   },
   required: ["app_name"],
 } as any;
@@ -107,6 +158,27 @@ export const WaitSchema = {
   required: ["seconds"],
 } as any;
 
+export const WaitForStableSchema = {
+  type: "object",
+  properties: {
+    stable_ms: { type: "number", description: "この時間(ms)画面が変化しなければ安定とみなす" },
+    timeout_ms: { type: "number", description: "最大待機時間(ms)" },
+  },
+} as any;
+
+export const WaitForElementSchema = {
+  type: "object",
+  properties: {
+    app_name: { type: "string", description: "アプリ名" },
+    role: { type: "string", description: "要素のrole（例: AXButton）" },
+    name: { type: "string", description: "要素のname（完全一致）" },
+    name_regex: { type: "string", description: "nameにマッチする正規表現" },
+    state: { type: "string", enum: ["appear", "disappear"], description: "appear: 現れるまで / disappear: 消えるまで" },
+    timeout_ms: { type: "number", description: "最大待機時間(ms)" },
+  },
+  required: ["app_name"],
+} as any;
+
 export const ThinkSchema = {
   type: "object",
   properties: {
@@ -18,6 +18,16 @@ export const PERFORMANCE_CONFIG = {
   // JPEG品質: 85で視覚品質を維持しつつファイルサイズを削減（1-100）
   // AIの認識精度に問題がある場合は90-95に上げることを検討
   SCREENSHOT_QUALITY: 85,
+  // スクリーンショットの長辺の最大ピクセル数: Retina解像度のまま送らず、エンコード負荷と入力トークンを削減
+  // LLM側でも縮小されるため、認識精度への影響は小さい。0で縮小しない
+  SCREENSHOT_MAX_DIMENSION: 1920,
+  // スクリーンショットのバイト数上限（品質・解像度を自動調整）。0で無制限
+  SCREENSHOT_MAX_BYTES: 0,
+  // バックグラウンドフレーム取得のレート(fps)。0で無効
+  // 有効にすると操作後のスクリーンショットがキャプチャ完了を待たずに返る（CPU使用量は増える）
+  FRAME_GRABBER_FPS: 0,
+  // フレーム取得のリングバッファ長（メモリ使用量の上限を決める）
+  FRAME_GRABBER_BUFFER_SIZE: 3,
 };
 
 // LLM履歴のサイズ制御
@@ -1,4 +1,7 @@
 import { describe, it, expect, vi, beforeEach, afterEach } from 'vitest';
+import * as fs from 'node:fs';
+import * as os from 'node:os';
+import * as path from 'node:path';
 
 describe('PythonBridge', () => {
   describe('coordinate normalization logic', () => {
@@ -86,4 +89,157 @@ describe('PythonBridge', () => {
       expect(timeout).toBe(5000);
     });
   });
+
+  describe('pipelined response matching', () => {
+    // Replicate the dispatch logic from PythonBridge.dispatchResponse
+    const createDispatcher = () => {
+      const fifo: Array<(value: any) => void> = [];
+      const byId = new Map<number, (value: any) => void>();
+      const partialById = new Map<number, (chunk: any) => void>();
+      const dispatch = (parsed: any) => {
+        if (parsed.id !== undefined && parsed.id !== null) {
+          const resolve = byId.get(parsed.id);
+          if (resolve && parsed.partial) {
+            const { id: _id, partial: _partial, ...chunk } = parsed;
+            partialById.get(parsed.id)?.(chunk);
+          } else if (resolve) {
+            byId.delete(parsed.id);
+            resolve(parsed);
+          }
+          return;
+        }
+        const resolve = fifo.shift();
+        if (resolve) resolve(parsed);
+      };
+      return { fifo, byId, partialById, dispatch };
+    };
+
+    it('should resolve out-of-order responses by request id', () => {
+      const { byId, dispatch } = createDispatcher();
+      const received: string[] = [];
+      byId.set(1, (v) => received.push(`1:${v.action}`));
+      byId.set(2, (v) => received.push(`2:${v.action}`));
+
+      dispatch({ id: 2, action: 'size' });
+      dispatch({ id: 1, action: 'elementsJson' });
+
+      expect(received).toEqual(['2:size', '1:elementsJson']);
+      expect(byId.size).toBe(0);
+    });
+
+    it('should keep FIFO matching for responses without id', () => {
+      const { fifo, byId, dispatch } = createDispatcher();
+      const received: string[] = [];
+      fifo.push((v) => received.push(`fifo:${v.action}`));
+      byId.set(7, (v) => received.push(`7:${v.action}`));
+
+      dispatch({ id: 7, action: 'screenshot' });
+      dispatch({ action: 'click' });
+
+      expect(received).toEqual(['7:screenshot', 'fifo:click']);
+    });
+
+    it('should deliver partial chunks without completing the request', () => {
+      const { byId, partialById, dispatch } = createDispatcher();
+      const chunks: any[] = [];
+      const received: any[] = [];
+      byId.set(3, (v) => received.push(v));
+      partialById.set(3, (chunk) => chunks.push(chunk));
+
+      dispatch({ id: 3, partial: true, seq: 0, elements: [{ name: 'a' }] });
+      dispatch({ id: 3, partial: true, seq: 1, elements: [{ name: 'b' }] });
+      expect(received).toHaveLength(0);
+      expect(byId.has(3)).toBe(true);
+
+      dispatch({ id: 3, status: 'success', count: 2, streamed: 2 });
+      expect(chunks).toEqual([
+        { seq: 0, elements: [{ name: 'a' }] },
+        { seq: 1, elements: [{ name: 'b' }] },
+      ]);
+      expect(received).toEqual([{ id: 3, status: 'success', count: 2, streamed: 2 }]);
+      expect(byId.size).toBe(0);
+    });
+
+    it('should ignore responses for unknown ids', () => {
+      const { fifo, dispatch } = createDispatcher();
+      const received: any[] = [];
+      fifo.push((v) => received.push(v));
+
+      dispatch({ id: 99, action: 'late' });
+
+      expect(received).toHaveLength(0);
+      expect(fifo).toHaveLength(1);
+    });
+  });
+
+  describe('shared memory frame transport', () => {
+    // Replicate the slot layout written by utils/frame_transport.py and read by resolveFrameRef
+    const writeSlot = (file: string, slotOffset: number, handle: number, data: Buffer) => {
+      const fd = fs.openSync(file, 'r+');
+      const header = Buffer.alloc(8);
+      header.writeBigUInt64LE(BigInt(handle));
+      fs.writeSync(fd, Buffer.alloc(8), 0, 8, slotOffset);
+      fs.writeSync(fd, data, 0, data.length, slotOffset + 8);
+      fs.writeSync(fd, header, 0, 8, slotOffset);
+      fs.closeSync(fd);
+    };
+
+    const readFrame = (
+      ref: { path: string; handle: number; offset: number; length: number },
+      duringRead: () => void = () => {},
+    ) => {
+      const fd = fs.openSync(ref.path, 'r');
+      try {
+        const header = Buffer.alloc(8);
+        const checkHandle = () => {
+          fs.readSync(fd, header, 0, 8, ref.offset - 8);
+          if (Number(header.readBigUInt64LE(0)) !== ref.handle) {
+            throw new Error(`Frame ${ref.handle} was overwritten before it could be read`);
+          }
+        };
+        checkHandle();
+        const frame = Buffer.alloc(ref.length);
+        fs.readSync(fd, frame, 0, ref.length, ref.offset);
+        duringRead();
+        checkHandle();
+        return frame.toString('base64');
+      } finally {
+        fs.closeSync(fd);
+      }
+    };
+
+    let file: string;
+
+    beforeEach(() => {
+      file = path.join(os.tmpdir(), `miki-frames-test-${process.pid}.bin`);
+      fs.writeFileSync(file, Buffer.alloc(4 * 64));
+    });
+
+    afterEach(() => {
+      fs.rmSync(file, { force: true });
+    });
+
+    it('should read the frame referenced by data_ref', () => {
+      const jpeg = Buffer.from([0xff, 0xd8, 0xff, 0xe0, 1, 2, 3]);
+      writeSlot(file, 64, 1, jpeg);
+
+      const data = readFrame({ path: file, handle: 1, offset: 72, length: jpeg.length });
+
+      expect(data).toBe(jpeg.toString('base64'));
+    });
+
+    it('should reject a slot that has been overwritten by a newer frame', () => {
+      writeSlot(file, 64, 5, Buffer.from([1, 2, 3]));
+
+      expect(() => readFrame({ path: file, handle: 1, offset: 72, length: 3 })).toThrow(/overwritten/);
+    });
+
+    it('should reject a frame whose slot was rewritten while it was being read', () => {
+      writeSlot(file, 64, 1, Buffer.from([1, 2, 3]));
+
+      const rewrite = () => writeSlot(file, 64, 5, Buffer.from([4, 5, 6]));
+
+      expect(() => readFrame({ path: file, handle: 1, offset: 72, length: 3 }, rewrite)).toThrow(/overwritten/);
+    });
+  });
 });
@@ -2,7 +2,8 @@ import { spawn, type ChildProcessWithoutNullStreams } from "node:child_process";
 import * as fs from "node:fs";
 import * as readline from "node:readline";
 import * as path from "node:path";
-import type { PythonResponse } from "./types";
+import type { FrameRef, PythonResponse } from "./types";
+import { decodeColumnarTree } from "./ui-tree-codec";
 
 export class PythonBridge {
   private pythonProcess!: ChildProcessWithoutNullStreams;
@@ -11,6 +12,18 @@ export class PythonBridge {
     resolve: (value: any) => void;
     reject: (error: Error) => void;
   }> = [];
+  // パイプラインモード: リクエストIDで応答を対応付ける（応答順は不定）
+  private pendingById = new Map<number, {
+    resolve: (value: any) => void;
+    reject: (error: Error) => void;
+    // 途中結果（partial: true の行）の受け取り先（callStream のみ）
+    onPartial?: (chunk: any) => void;
+  }>();
+  private nextRequestId = 1;
+  private pipelined: boolean;
+  // 画像ペイロードの転送方式: "base64"（JSON埋め込み）または "shm"（共有メモリファイル）
+  private frameTransport: "base64" | "shm";
+  private frameFds = new Map<string, number>();
   private isRestarting = false;
   private onError: (message: string) => void;
   private onReady: () => void;
@@ -21,11 +34,14 @@ export class PythonBridge {
   constructor(
     onError: (message: string) => void,
     onReady: () => void = () => {},
-    debugMode: boolean = false
+    debugMode: boolean = false,
+    pipelined: boolean = process.env.MIKI_PIPELINED === "1"
   ) {
     this.onError = onError;
     this.onReady = onReady;
     this.debugMode = debugMode;
+    this.pipelined = pipelined;
+    this.frameTransport = process.env.MIKI_FRAME_TRANSPORT === "shm" ? "shm" : "base64";
     this.startPythonProcess();
   }
 
@@ -73,10 +89,7 @@ export class PythonBridge {
         if (this.debugMode) {
           console.error(`[PythonBridge] Received response: ${JSON.stringify(parsed).substring(0, 200)}...`);
         }
-        const resolver = this.pendingResolvers.shift();
-        if (resolver) {
-          resolver.resolve(parsed);
-        }
+        this.dispatchResponse(parsed);
       } catch (e) {
         // JSONパースエラー: 非JSON行（警告・デバッグ出力など）を無視
         // resolverをshiftせず、次の有効なJSON行を待つ
@@ -102,6 +115,84 @@ export class PythonBridge {
         this.handleProcessCrash();
       }
     });
+
+    if (this.frameTransport === "shm") {
+      this.negotiateFrameTransport();
+    }
+  }
+
+  /**
+   * 画像ペイロードを共有メモリファイル経由で受け取るようエグゼキューターに要求する。
+   * 失敗した場合はBase64モードのまま動作する（応答はどちらの形式でも処理できる）。
+   */
+  private negotiateFrameTransport() {
+    this.closeFrameFds();
+    this.call("setTransport", { mode: "shm" }, { retries: 0 })
+      .then((res) => {
+        if (res.status !== "success") {
+          console.warn(`Frame transport negotiation failed: ${res.message}`);
+        } else if (this.debugMode) {
+          console.error(`[PythonBridge] Frame transport: ${JSON.stringify(res)}`);
+        }
+      })
+      .catch((e) => console.warn(`Frame transport negotiation failed: ${e}`));
+  }
+
+  /**
+   * data_ref で参照された画像を共有メモリファイルから読み出し、Base64の data に変換する。
+   * スロット先頭のhandleを読み出しの前後で確認し、一致しない場合は上書き済みとしてエラーにする。
+   */
+  private resolveFrameRef(result: PythonResponse): PythonResponse {
+    // batch の最後のスクリーンショット
+    if (result.screenshot) {
+      this.resolveFrameRef(result.screenshot);
+    }
+    const ref: FrameRef | undefined = result.data_ref;
+    if (!ref) {
+      return result;
+    }
+    let fd = this.frameFds.get(ref.path);
+    if (fd === undefined) {
+      fd = fs.openSync(ref.path, "r");
+      this.frameFds.set(ref.path, fd);
+    }
+    const header = Buffer.alloc(8);
+    const checkHandle = () => {
+      fs.readSync(fd, header, 0, 8, ref.offset - 8);
+      if (Number(header.readBigUInt64LE(0)) !== ref.handle) {
+        throw new Error(`Frame ${ref.handle} was overwritten before it could be read`);
+      }
+    };
+    checkHandle();
+    const frame = Buffer.alloc(ref.length);
+    fs.readSync(fd, frame, 0, ref.length, ref.offset);
+    // 読み出し中にスロットが上書きされた場合は2つのフレームが混ざっているため破棄する
+    checkHandle();
+    result.data = frame.toString("base64");
+    delete result.data_ref;
+    return result;
+  }
+
+  /**
+   * 列指向形式の UI ツリー（ui_table）をネストしたツリー（ui_data）に変換する。
+   */
+  private decodeUiTable(result: PythonResponse): PythonResponse {
+    if (result.ui_table) {
+      result.ui_data = decodeColumnarTree(result.ui_table);
+      delete result.ui_table;
+    }
+    return result;
+  }
+
+  private closeFrameFds() {
+    for (const fd of this.frameFds.values()) {
+      try {
+        fs.closeSync(fd);
+      } catch (e) {
+        // 既に閉じられている場合は無視
+      }
+    }
+    this.frameFds.clear();
   }
 
   private async handleProcessCrash() {
@@ -118,6 +209,10 @@ export class PythonBridge {
         resolver.reject(error);
       }
     }
+    for (const resolver of this.pendingById.values()) {
+      resolver.reject(error);
+    }
+    this.pendingById.clear();
 
     // 古いプロセスのクリーンアップ
     try {
@@ -138,6 +233,32 @@ export class PythonBridge {
     this.onReady();
   }
 
+  /**
+   * 応答を対応するresolverへ渡す。
+   * idつきの応答はパイプラインモードの要求に、idなしの応答はFIFO順に対応付ける。
+   * partial: true の行は途中結果で、要求を完了させずに onPartial へ渡す。
+   */
+  private dispatchResponse(parsed: any) {
+    if (parsed && parsed.id !== undefined && parsed.id !== null) {
+      const resolver = this.pendingById.get(parsed.id);
+      if (resolver && parsed.partial) {
+        const { id: _id, partial: _partial, ...chunk } = parsed;
+        resolver.onPartial?.(chunk);
+      } else if (resolver) {
+        this.pendingById.delete(parsed.id);
+        delete parsed.id;
+        resolver.resolve(parsed);
+      } else if (this.debugMode) {
+        console.error(`[PythonBridge] Response for unknown request id: ${parsed.id}`);
+      }
+      return;
+    }
+    const resolver = this.pendingResolvers.shift();
+    if (resolver) {
+      resolver.resolve(parsed);
+    }
+  }
+
   async call(
     action: string,
     params: any = {},
@@ -154,7 +275,9 @@ export class PythonBridge {
 
     for (let attempt = 0; attempt <= maxRetries; attempt++) {
       try {
-        const result = await this.executeCall(action, params, timeout);
+        const result = this.decodeUiTable(
+          this.resolveFrameRef(await this.executeCall(action, params, timeout)),
+        );
         if (this.debugMode && result.execution_time_ms) {
           console.error(`[PythonBridge] Action ${action} completed in ${result.execution_time_ms}ms`);
         }
@@ -182,7 +305,33 @@ export class PythonBridge {
     throw lastError || new Error(`Failed to call Python action: ${action}`);
   }
 
+  /**
+   * 途中結果を返すアクション（webElements の stream など）を呼び出す。
+   * パイプラインモードでは params.stream = true で送り、途中結果を届いた順に onChunk へ渡す。
+   * 途中結果で渡した分は最終応答に含まれない。FIFOモードでは途中結果は無く、
+   * 全ての結果が最終応答に入る。途中結果を受け取った後は再送できないため、リトライしない。
+   */
+  async callStream(
+    action: string,
+    params: any,
+    onChunk: (chunk: any) => void,
+    options: { timeout?: number } = {},
+  ): Promise<PythonResponse> {
+    const timeout = options.timeout ?? this.defaultTimeout;
+    if (!this.pipelined) {
+      return this.call(action, params, { timeout, retries: 0 });
+    }
+    return this.decodeUiTable(
+      this.resolveFrameRef(
+        await this.executePipelinedCall(action, { ...params, stream: true }, timeout, onChunk),
+      ),
+    );
+  }
+
   private async executeCall(action: string, params: any, timeoutMs: number): Promise<PythonResponse> {
+    if (this.pipelined) {
+      return this.executePipelinedCall(action, params, timeoutMs);
+    }
     return new Promise((resolve, reject) => {
       const timeout = setTimeout(() => {
         const index = this.pendingResolvers.findIndex((r) => r.resolve === resolve);
@@ -216,6 +365,42 @@ export class PythonBridge {
     });
   }
 
+  private async executePipelinedCall(
+    action: string,
+    params: any,
+    timeoutMs: number,
+    onPartial?: (chunk: any) => void,
+  ): Promise<PythonResponse> {
+    const id = this.nextRequestId++;
+    return new Promise((resolve, reject) => {
+      const timeout = setTimeout(() => {
+        if (this.pendingById.delete(id)) {
+          reject(new Error(`PythonBridge timeout after ${timeoutMs}ms for action: ${action}`));
+        }
+      }, timeoutMs);
+
+      this.pendingById.set(id, {
+        resolve: (val) => {
+          clearTimeout(timeout);
+          resolve(val);
+        },
+        reject: (err) => {
+          clearTimeout(timeout);
+          reject(err);
+        },
+        onPartial,
+      });
+
+      try {
+        this.pythonProcess.stdin.write(JSON.stringify({ id, action, params }) + "\n");
+      } catch (e) {
+        clearTimeout(timeout);
+        this.pendingById.delete(id);
+        reject(e);
+      }
+    });
+  }
+
   async setCursorVisibility(visible: boolean): Promise<void> {
     try {
       await this.call("setCursorVisibility", { visible });
@@ -227,5 +412,6 @@ export class PythonBridge {
   destroy() {
     this.pythonProcess.kill();
     this.pythonReader.close();
+    this.closeFrameFds();
   }
 }
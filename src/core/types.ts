@@ -14,12 +14,96 @@ export interface UIElement {
   actions: string[];
   subrole: string;
   children: UIElement[];
+  id?: string;
 }
 
 export interface UIElementsResponse {
   windows: UIElement[];
 }
 
+// observe で取得するフォーカスされている要素
+export interface FocusedElement {
+  role: string;
+  subrole: string | null;
+  name: string;
+  value: string | null;
+  description: string;
+  position: [number, number] | null;
+  size: [number, number] | null;
+  enabled: boolean | null;
+}
+
+// batch の1ステップ
+export interface BatchStep {
+  action: string;
+  params?: Record<string, any>;
+}
+
+// batch の各ステップの結果（アクションの応答に action / elapsed_ms が付く）
+export interface BatchStepResult extends Partial<PythonResponse> {
+  status: string;
+  action: string;
+  elapsed_ms: number;
+  settle?: { stable: boolean; waited_ms?: number; samples?: number; message?: string };
+}
+
+// webElements の要素（AXWebArea 配下、深さ優先の前順）
+export interface WebElement {
+  role: string;
+  name: string;
+  value: string;
+  description: string;
+  position: [number, number];
+  size: [number, number];
+}
+
+export interface WebElementsResponse {
+  elements: WebElement[];
+  error?: string;
+}
+
+// findElements の各ロケーターの解決結果
+export interface FoundElement {
+  found: boolean;
+  role?: string;
+  name?: string;
+  frame?: [number, number, number, number];
+  center?: { x: number; y: number };
+  actions?: string[];
+  window?: number;
+  window_name?: string;
+  path?: number[];
+}
+
+// elementsJson の列指向形式（format: "columnar"）。復元は ui-tree-codec.ts
+export interface UITable {
+  format: "columnar-v1";
+  count: number;
+  roles: string[];
+  actions: string[];
+  action_sets: number[][];
+  columns: {
+    parent: number[];
+    id?: string[];
+    role: number[];
+    subrole: number[];
+    role_description: number[];
+    name: string[];
+    description: string[];
+    value: any[];
+    frame: number[];
+    flags: number[];
+    actions: number[];
+  };
+}
+
+// elementsJsonDelta で返されるフラットなノード（親子関係はノードIDで表す）
+export interface UIElementNode extends Omit<UIElement, "children"> {
+  id: string;
+  parent: string | null;
+  children: string[];
+}
+
 export const ActionSchemaBase = z.discriminatedUnion("action", [
   z.object({ action: z.literal("screenshot") }),
   z.object({ action: z.literal("click"), params: z.object({ x: z.number(), y: z.number() }) }),
@@ -47,7 +131,15 @@ export const ActionSchemaBase = z.discriminatedUnion("action", [
     action: z.literal("focusElement"),
     params: z.object({ app_name: z.string(), role: z.string(), name: z.string() }),
   }),
-  z.object({ action: z.literal("webElements"), params: z.object({ app_name: z.string() }) }),
+  z.object({
+    action: z.literal("webElements"),
+    params: z.object({
+      app_name: z.string(),
+      cursor: z.string().optional(),
+      limit: z.number().optional(),
+      roles: z.array(z.string()).optional(),
+    }),
+  }),
   z.object({ action: z.literal("wait"), params: z.object({ seconds: z.number() }) }),
   z.object({ action: z.literal("search"), params: z.object({ query: z.string() }) }),
   z.object({
@@ -89,7 +181,15 @@ export const ActionSchema = z.discriminatedUnion("action", [
     action: z.literal("focusElement"),
     params: z.object({ app_name: z.string(), role: z.string(), name: z.string() }),
   }),
-  z.object({ action: z.literal("webElements"), params: z.object({ app_name: z.string() }) }),
+  z.object({
+    action: z.literal("webElements"),
+    params: z.object({
+      app_name: z.string(),
+      cursor: z.string().optional(),
+      limit: z.number().optional(),
+      roles: z.array(z.string()).optional(),
+    }),
+  }),
   z.object({ action: z.literal("wait"), params: z.object({ seconds: z.number() }) }),
   z.object({ action: z.literal("search"), params: z.object({ query: z.string() }) }),
   z.object({
@@ -108,16 +208,83 @@ export const ActionSchema = z.discriminatedUnion("action", [
 
 export type Action = z.infer<typeof ActionSchema>;
 
+// 共有メモリ転送モードで返される画像ペイロードの参照情報
+export interface FrameRef {
+  transport: "shm";
+  path: string;
+  handle: number;
+  offset: number;
+  length: number;
+  mime_type: string;
+}
+
+// screenshotDelta で返される変化タイル（物理ピクセル座標）
+export interface FrameTile {
+  x: number;
+  y: number;
+  width: number;
+  height: number;
+  data: string;
+}
+
 export interface PythonResponse {
   status: string;
   data?: string;
+  data_ref?: FrameRef;
+  mime_type?: string;
+  image_width?: number;
+  image_height?: number;
+  image_scale?: number;
+  over_budget?: boolean;
   browser?: string;
   bundle_id?: string;
   width?: number;
   height?: number;
   mouse_position?: { x: number; y: number };
+  captured_at?: number;
+  frame_id?: number;
+  unchanged?: boolean;
+  mode?: "keyframe" | "delta" | "full";
+  base_frame_id?: number;
+  tiles?: FrameTile[];
+  stable?: boolean;
   elements?: string[];
-  ui_data?: UIElementsResponse;
+  ui_data?: UIElementsResponse | WebElementsResponse;
+  ui_table?: UITable;
+  snapshot_id?: number;
+  added?: UIElementNode[];
+  removed?: string[];
+  changed?: UIElementNode[];
+  node_count?: number;
+  results?: FoundElement[];
+  matched?: boolean;
+  element?: FoundElement | null;
+  polls?: number;
+  complete?: boolean;
+  visited?: number;
+  pruned?: number;
+  truncated?: boolean;
+  count?: number;
+  streamed?: number;
+  next_cursor?: string | null;
+  deadline_reached?: boolean;
+  steps?: BatchStepResult[];
+  completed?: number;
+  failed_step?: number | null;
+  screenshot?: PythonResponse;
+  profile?: string;
+  queued?: boolean;
+  pending?: number;
+  coalesced?: number;
+  input_flush?: (PythonResponse & { action: string; events: number }) | null;
+  settings?: Record<string, number>;
+  observed_at?: number;
+  app_name?: string | null;
+  focused_element?: FocusedElement | null;
+  timings_ms?: Record<string, number>;
+  errors?: Record<string, string>;
+  cached?: boolean;
+  cache_age_ms?: number;
   message?: string;
   execution_time_ms?: number;
 }
@@ -0,0 +1,65 @@
+import { describe, it, expect } from 'vitest';
+import { decodeColumnarTree } from './ui-tree-codec';
+import type { UITable } from './types';
+
+describe('decodeColumnarTree', () => {
+  // src/executor/utils/ui_tree_codec.py の encode_columnar が生成する形式
+  const table: UITable = {
+    format: 'columnar-v1',
+    count: 4,
+    roles: ['AXWindow', '', 'standard window', 'AXButton', 'button', 'AXTextField', 'text field'],
+    actions: ['AXRaise', 'AXPress'],
+    action_sets: [[0], [1], []],
+    columns: {
+      parent: [-1, 0, 0, -1],
+      id: ['w1', 'b1', 't1', 'w2'],
+      role: [0, 3, 5, 0],
+      subrole: [1, 1, 1, 1],
+      role_description: [2, 4, 6, 2],
+      name: ['Main', 'OK', '', 'Other'],
+      description: ['', '', 'Search', ''],
+      value: [null, null, 'query', null],
+      frame: [0, 0, 800, 600, 10, 20, 50, 24, 70, 20, 200, 24, 900, 0, 400, 300],
+      flags: [1, 1, 3, 5],
+      actions: [0, 1, 2, 0],
+    },
+  };
+
+  it('should rebuild the nested window tree', () => {
+    const tree = decodeColumnarTree(table);
+
+    expect(tree.windows.map((w) => w.name)).toEqual(['Main', 'Other']);
+    expect(tree.windows[0].children.map((c) => c.role)).toEqual(['AXButton', 'AXTextField']);
+    expect(tree.windows[1].children).toEqual([]);
+  });
+
+  it('should expand interned strings, frames and flags', () => {
+    const [main, other] = decodeColumnarTree(table).windows;
+    const [button, field] = main.children;
+
+    expect(button).toMatchObject({
+      id: 'b1',
+      role: 'AXButton',
+      roleDescription: 'button',
+      subrole: '',
+      position: [10, 20],
+      size: [50, 24],
+      enabled: true,
+      focused: false,
+      actions: ['AXPress'],
+    });
+    expect(field).toMatchObject({ value: 'query', description: 'Search', focused: true, actions: [] });
+    expect(other).toMatchObject({ position: [900, 0], selected: true, actions: ['AXRaise'] });
+  });
+
+  it('should omit ids when the id column is absent', () => {
+    const { id: _ids, ...columns } = table.columns;
+    const tree = decodeColumnarTree({ ...table, columns });
+
+    expect(tree.windows[0].id).toBeUndefined();
+  });
+
+  it('should reject unknown formats', () => {
+    expect(() => decodeColumnarTree({ ...table, format: 'columnar-v2' as any })).toThrow();
+  });
+});
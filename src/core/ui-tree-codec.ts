@@ -0,0 +1,52 @@
+import type { UIElement, UIElementsResponse, UITable } from "./types";
+
+// src/executor/utils/ui_tree_codec.py と同じビット割り当て
+const FLAG_ENABLED = 1;
+const FLAG_FOCUSED = 2;
+const FLAG_SELECTED = 4;
+
+/**
+ * elementsJson の列指向形式（format: "columnar"）をネストしたツリーに戻す。
+ * 行は深さ優先の前順で並んでおり、親の行は必ず子より前にある。
+ */
+export function decodeColumnarTree(table: UITable): UIElementsResponse {
+  if (table.format !== "columnar-v1") {
+    throw new Error(`Unsupported UI table format: ${table.format}`);
+  }
+  const { columns, roles, actions } = table;
+  const actionSets = table.action_sets.map((set) => set.map((index) => actions[index]));
+  const nodes: UIElement[] = new Array(table.count);
+  const windows: UIElement[] = [];
+
+  for (let row = 0; row < table.count; row++) {
+    const flags = columns.flags[row];
+    const f = row * 4;
+    const node: UIElement = {
+      role: roles[columns.role[row]],
+      roleDescription: roles[columns.role_description[row]],
+      name: columns.name[row],
+      description: columns.description[row],
+      value: columns.value[row],
+      position: [columns.frame[f], columns.frame[f + 1]],
+      size: [columns.frame[f + 2], columns.frame[f + 3]],
+      enabled: (flags & FLAG_ENABLED) !== 0,
+      focused: (flags & FLAG_FOCUSED) !== 0,
+      selected: (flags & FLAG_SELECTED) !== 0,
+      // 同じアクション集合のノードは配列を共有する（読み取り専用として扱う）
+      actions: actionSets[columns.actions[row]],
+      subrole: roles[columns.subrole[row]],
+      children: [],
+    };
+    if (columns.id) {
+      node.id = columns.id[row];
+    }
+    nodes[row] = node;
+    const parent = columns.parent[row];
+    if (parent < 0) {
+      windows.push(node);
+    } else {
+      nodes[parent].children.push(node);
+    }
+  }
+  return { windows };
+}
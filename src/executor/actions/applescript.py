@@ -16,6 +16,8 @@ AppleScript は高度な柔軟性を持つため、悪意のあるコードを
 import subprocess
 import re
 
+from utils.osa_host import run_script
+
 
 # 危険なシェルコマンドパターン（do shell script が検出された場合の二次防御）
 DANGEROUS_SHELL_PATTERNS = [
@@ -97,11 +99,7 @@ def run_osa(script):
         # スクリプトの検証
         validate_script(script)
 
-        result = subprocess.run(
-            ['osascript', '-e', script],
-            capture_output=True,
-            text=True,
-            timeout=30)  # タイムアウトを追加してハングを防ぐ
+        result = run_script(script, timeout=30)  # タイムアウトを追加してハングを防ぐ
         if result.returncode == 0:
             return {"status": "success", "output": result.stdout.strip()}
         else:
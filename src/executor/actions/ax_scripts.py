@@ -0,0 +1,608 @@
+"""UI要素・Web要素の取得と操作に使うスクリプトテンプレート
+
+本文は固定で、アプリ名などの引数は argv で渡す（utils/script_cache.py 参照）。
+JavaScript のテンプレートは argv[0] の JSON を引数として受け取る。
+"""
+from utils.script_cache import ScriptTemplate
+
+# argv: [アプリ名]
+UI_ELEMENTS_SCRIPT = ScriptTemplate("uiElements", '''
+on run argv
+    set appName to item 1 of argv
+    tell application "System Events"
+        if not (exists application process appName) then return "ERROR: Process not found"
+        tell application process appName
+            set elements_data to {}
+            repeat with win in windows
+                try
+                    -- ウィンドウ自身の情報
+                    set {r, n, p, s} to {role, name, position, size} of win
+                    if n is missing value then set n to ""
+                    set end of elements_data to r & "|" & n & "|" & (item 1 of p) & "," & (item 2 of p) & "|" & (item 1 of s) & "," & (item 2 of s)
+
+                    -- ウィンドウ直下の子要素を一括取得
+                    set children to UI elements of win
+                    set {rs, ns, ps, ss} to {role, name, position, size} of UI elements of win
+
+                    repeat with i from 1 to count of rs
+                        set n_val to item i of ns
+                        if n_val is missing value then set n_val to ""
+                        set end of elements_data to (item i of rs) & "|" & n_val & "|" & (item 1 of item i of ps) & "," & (item 2 of item i of ps) & "|" & (item 1 of item i of ss) & "," & (item 2 of item i of ss)
+
+                        -- さらにその下 (ボタンやテキストフィールドを拾うため。3階層目まで)
+                        try
+                            set subchildren to UI elements of (item i of children)
+                            if (count of subchildren) > 0 then
+                                set {rrs, nns, pps, sss} to {role, name, position, size} of subchildren
+                                repeat with j from 1 to count of rrs
+                                    set nn to item j of nns
+                                    if nn is missing value then set nn to ""
+                                    set end of elements_data to (item j of rrs) & "|" & nn & "|" & (item 1 of item j of pps) & "," & (item 2 of item j of pps) & "|" & (item 1 of item j of sss) & "," & (item 2 of item j of sss)
+                                end repeat
+                            end if
+                        end try
+                    end repeat
+                end try
+            end repeat
+            return elements_data
+        end tell
+    end tell
+end run
+''', language="AppleScript")
+
+# args: {app_name, max_depth, window, query, viewport}
+#   window: 指定時はその名前のウィンドウのみ
+#   query: 探索中に評価するフィルター（actions/ui_elements.py の get_ui_elements_json 参照）
+#     - exclude_roles / visible_only（サイズ0・viewport 外）に該当する要素は子孫ごと探索しない
+#     - interactive_only / roles / name_contains / name_regex に該当しない要素は出力せず、
+#       条件に合う子孫を親の children に繰り上げる
+#     - max_nodes: 出力する要素数の上限（超えた時点で探索を打ち切る）
+#   viewport: visible_only の判定に使う画面の矩形 [x, y, width, height]
+# 戻り値: {windows: [...], stats: {visited, pruned, truncated}}
+#   各ノードの path は [ウィンドウ番号, uiElements の添字, ...]（utils/locator_index.py が使う）
+UI_ELEMENTS_JSON_SCRIPT = ScriptTemplate("uiElementsJson", r'''
+const INTERACTIVE_ROLES = new Set([
+  "AXButton", "AXCheckBox", "AXRadioButton", "AXPopUpButton", "AXMenuButton", "AXComboBox",
+  "AXTextField", "AXTextArea", "AXSearchField", "AXSlider", "AXIncrementor", "AXLink",
+  "AXMenuItem", "AXMenuBarItem", "AXTab", "AXDisclosureTriangle", "AXColorWell"
+]);
+// 要素を操作しないアクション（これしか無い要素は操作対象とみなさない）
+const PASSIVE_ACTIONS = new Set(["AXShowMenu", "AXScrollToVisible", "AXShowDefaultUI", "AXShowAlternateUI"]);
+
+function run(argv) {
+  const args = JSON.parse(argv[0]);
+  const maxDepth = args.max_depth;
+  const query = args.query || {};
+  const roles = query.roles ? new Set(query.roles) : null;
+  const excludeRoles = new Set(query.exclude_roles || []);
+  const nameContains = query.name_contains ? query.name_contains.toLowerCase() : null;
+  let nameRegex = null;
+  try {
+    nameRegex = query.name_regex ? new RegExp(query.name_regex) : null;
+  } catch (e) {
+    return JSON.stringify({ error: "Invalid name_regex: " + e.message });
+  }
+  const viewport = query.visible_only ? args.viewport : null;
+  const maxNodes = query.max_nodes || 0;
+  const filtering = !!(query.interactive_only || roles || nameContains || nameRegex);
+  const stats = { visited: 0, pruned: 0, truncated: false };
+  let emitted = 0;
+
+  const se = Application("System Events");
+  if (!se.processes[args.app_name].exists()) {
+    return JSON.stringify({ error: "Process not found" });
+  }
+  const proc = se.processes[args.app_name];
+
+  function isVisible(props) {
+    if (!props.size || props.size[0] <= 0 || props.size[1] <= 0) return false;
+    if (!viewport || !props.position) return true;
+    const [x, y] = props.position;
+    return x < viewport[0] + viewport[2] && x + props.size[0] > viewport[0] &&
+           y < viewport[1] + viewport[3] && y + props.size[1] > viewport[1];
+  }
+
+  function matches(node) {
+    if (query.interactive_only && !INTERACTIVE_ROLES.has(node.role) &&
+        !node.actions.some(a => !PASSIVE_ACTIONS.has(a))) return false;
+    if (roles && !roles.has(node.role)) return false;
+    if (nameContains && node.name.toLowerCase().indexOf(nameContains) < 0) return false;
+    if (nameRegex && !nameRegex.test(node.name)) return false;
+    return true;
+  }
+
+  // 親の children に入れる要素の配列を返す（要素自身、または繰り上げた子孫）
+  function inspectElement(elem, depth, isWindow, path) {
+    if (depth > maxDepth) return [];
+    if (maxNodes && emitted >= maxNodes) {
+      stats.truncated = true;
+      return [];
+    }
+    stats.visited++;
+
+    let props;
+    try {
+      props = elem.properties();
+    } catch (e) {
+      return [];
+    }
+    if (excludeRoles.has(props.role) || (query.visible_only && !isVisible(props))) {
+      stats.pruned++;
+      return [];
+    }
+
+    const result = {
+      role: props.role,
+      roleDescription: props.roleDescription || "",
+      name: props.name || props.title || "",
+      description: props.description || "",
+      value: props.value || null,
+      position: props.position ? [props.position[0], props.position[1]] : [0, 0],
+      size: props.size ? [props.size[0], props.size[1]] : [0, 0],
+      enabled: props.enabled !== undefined ? props.enabled : true,
+      focused: props.focused || false,
+      selected: props.selected || false,
+      actions: [],
+      subrole: props.subrole || "",
+      children: [],
+      path: path
+    };
+
+    // アクション一覧を取得
+    try {
+      const actions = elem.actions();
+      result.actions = actions.map(a => a.name());
+    } catch (e) {}
+
+    // ウィンドウは常に出力し、絞り込み結果の親にする
+    const keep = isWindow || !filtering || matches(result);
+    if (keep) emitted++;
+
+    // 子要素取得（depth制限）
+    const children = [];
+    if (depth < maxDepth) {
+      try {
+        const childElements = elem.uiElements();
+        for (let i = 0; i < childElements.length; i++) {
+          children.push(...inspectElement(childElements[i], depth + 1, false, path.concat([i])));
+        }
+      } catch (e) {}
+    }
+
+    if (!keep) return children;
+    result.children = children;
+    return [result];
+  }
+
+  const windows = proc.windows();
+  const result = [];
+  for (let w = 0; w < windows.length; w++) {
+    if (args.window) {
+      try {
+        if (windows[w].name() !== args.window) continue;
+      } catch (e) {
+        continue;
+      }
+    }
+    result.push(...inspectElement(windows[w], 0, true, [w]));
+  }
+  return JSON.stringify({ windows: result, stats: stats });
+}
+''')
+
+# args: {app_name, role, name, action: "locate" | "focus", locators, walk}
+#   locators: 索引の候補 [{window, window_name, path}]（utils/locator_index.py）
+#   候補のパスで要素を直接参照し、role/name が一致しなければパスの親の周辺から探し直す。
+#   それでも見つからなければ全ウィンドウを深さ5までたどる（walk: false の場合はたどらない）
+# 戻り値: {status, x, y, frame, window, window_name, path, method: "index" | "rewalk" | "walk"}
+#   focus の場合はフォーカスを当ててから返す
+ELEMENT_ACTION_SCRIPT = ScriptTemplate("elementAction", r'''
+function run(argv) {
+  const args = JSON.parse(argv[0]);
+  const se = Application("System Events");
+  const proc = se.processes[args.app_name];
+  const windows = proc.windows;
+  const windowCount = windows.length;
+
+  function matches(props) {
+    return props.role === args.role && (props.name === args.name || props.title === args.name);
+  }
+
+  function resolvePath(root, path) {
+    let elem = root;
+    for (let i = 0; i < path.length; i++) elem = elem.uiElements[path[i]];
+    return elem;
+  }
+
+  // 番号のウィンドウ名が変わっていれば（前後関係の変化）名前で探し直す
+  function windowFor(locator) {
+    try {
+      if (locator.window < windowCount && windows[locator.window].name() === locator.window_name) {
+        return locator.window;
+      }
+      for (let w = 0; w < windowCount; w++) {
+        if (windows[w].name() === locator.window_name) return w;
+      }
+    } catch (e) {}
+    return -1;
+  }
+
+  function findElementRecursive(elem, path, depth, maxDepth) {
+    if (depth > maxDepth) return null;
+    try {
+      const props = elem.properties();
+      if (matches(props)) {
+        return { elem: elem, props: props, path: path };
+      }
+
+      const children = elem.uiElements();
+      for (let i = 0; i < children.length; i++) {
+        const found = findElementRecursive(children[i], path.concat([i]), depth + 1, maxDepth);
+        if (found) return found;
+      }
+    } catch (e) {}
+    return null;
+  }
+
+  if (windowCount === 0) {
+    return "ERROR: No windows found";
+  }
+
+  let found = null;
+  let window = -1;
+  let method = null;
+  const locators = args.locators || [];
+  for (let i = 0; i < locators.length && found === null; i++) {
+    window = windowFor(locators[i]);
+    if (window < 0) continue;
+    const path = locators[i].path;
+    try {
+      const elem = resolvePath(windows[window], path);
+      const props = elem.properties();
+      if (matches(props)) {
+        found = { elem: elem, props: props, path: path };
+        method = "index";
+      }
+    } catch (e) {}
+    if (found === null && path.length > 0) {
+      // 索引が古い: 元の位置の親から探し直す
+      try {
+        const parentPath = path.slice(0, -1);
+        found = findElementRecursive(resolvePath(windows[window], parentPath), parentPath, 0, 2);
+        if (found !== null) method = "rewalk";
+      } catch (e) {}
+    }
+  }
+
+  if (found === null && args.walk !== false) {
+    method = "walk";
+    for (window = 0; window < windowCount && found === null; window++) {
+      found = findElementRecursive(windows[window], [], 0, 5);
+    }
+    window -= 1;
+  }
+  if (found === null) {
+    return "ERROR: Element not found";
+  }
+
+  if (args.action === "focus") {
+    found.elem.focused = true;
+  }
+  const pos = found.props.position;
+  const size = found.props.size;
+  let windowName = "";
+  try { windowName = windows[window].name(); } catch (e) {}
+  return JSON.stringify({
+    status: "success",
+    x: pos[0] + size[0] / 2,
+    y: pos[1] + size[1] / 2,
+    frame: [pos[0], pos[1], size[0], size[1]],
+    window: window,
+    window_name: windowName,
+    path: found.path,
+    method: method
+  });
+}
+''')
+
+# args: {app_name, locators: [{role, name, name_regex, index}], max_depth}
+#   全ウィンドウを1回だけ深さ優先でたどり、全ロケーターが見つかった時点で打ち切る。
+#   role / name / name_regex は指定されたものだけを条件にし、index は何番目の一致か（0始まり）
+# 戻り値: {results: [{found, role, name, frame, center, actions, window, window_name, path}],
+#          visited, complete}
+FIND_ELEMENTS_SCRIPT = ScriptTemplate("findElements", r'''
+function run(argv) {
+  const args = JSON.parse(argv[0]);
+  const maxDepth = args.max_depth;
+  const se = Application("System Events");
+  if (!se.processes[args.app_name].exists()) {
+    return JSON.stringify({ error: "Process not found" });
+  }
+  const proc = se.processes[args.app_name];
+
+  let locators;
+  try {
+    locators = args.locators.map(loc => ({
+      role: loc.role || null,
+      name: loc.name !== undefined && loc.name !== null ? loc.name : null,
+      regex: loc.name_regex ? new RegExp(loc.name_regex) : null,
+      index: loc.index || 0,
+      seen: 0,
+      result: null
+    }));
+  } catch (e) {
+    return JSON.stringify({ error: "Invalid name_regex: " + e.message });
+  }
+  let remaining = locators.length;
+  let visited = 0;
+  let windowIndex = -1;
+  let windowName = "";
+
+  function matches(loc, props) {
+    const name = props.name || props.title || "";
+    if (loc.role !== null && props.role !== loc.role) return false;
+    if (loc.name !== null && name !== loc.name) return false;
+    if (loc.regex !== null && !loc.regex.test(name)) return false;
+    return true;
+  }
+
+  function record(elem, props, path) {
+    let actions = null;
+    for (let i = 0; i < locators.length; i++) {
+      const loc = locators[i];
+      if (loc.result !== null || !matches(loc, props)) continue;
+      if (loc.seen++ < loc.index) continue;
+      if (actions === null) {
+        try {
+          actions = elem.actions().map(a => a.name());
+        } catch (e) {
+          actions = [];
+        }
+      }
+      const pos = props.position || [0, 0];
+      const size = props.size || [0, 0];
+      loc.result = {
+        found: true,
+        role: props.role,
+        name: props.name || props.title || "",
+        frame: [pos[0], pos[1], size[0], size[1]],
+        center: { x: pos[0] + size[0] / 2, y: pos[1] + size[1] / 2 },
+        actions: actions,
+        window: windowIndex,
+        window_name: windowName,
+        path: path
+      };
+      remaining--;
+    }
+  }
+
+  function walk(elem, path, depth) {
+    if (remaining === 0 || depth > maxDepth) return;
+    visited++;
+    try {
+      const props = elem.properties();
+      if (depth > 0) record(elem, props, path);
+      if (depth === maxDepth) return;
+      const children = elem.uiElements();
+      for (let i = 0; i < children.length && remaining > 0; i++) {
+        walk(children[i], path.concat([i]), depth + 1);
+      }
+    } catch (e) {}
+  }
+
+  const windows = proc.windows();
+  for (let w = 0; w < windows.length && remaining > 0; w++) {
+    windowIndex = w;
+    try {
+      windowName = windows[w].name() || "";
+    } catch (e) {
+      windowName = "";
+    }
+    walk(windows[w], [], 0);
+  }
+
+  return JSON.stringify({
+    results: locators.map(loc => loc.result || { found: false }),
+    visited: visited,
+    complete: remaining === 0
+  });
+}
+''')
+
+# args: {app_name, window, known, frontier, limit, max_visits, viewport, roles, exclude_roles, name}
+#   window: 対象ウィンドウ名（省略時は最前面のウィンドウ）
+#   known: 以前に見つけた AXWebArea の位置 {ウィンドウ名: パス}。role を確認して使い、
+#          違っていれば幅優先探索（深さ・要素数の上限つき）で探し直す
+#   frontier: 未探索の要素のパス（AXWebArea からの uiElements の添字の列）のスタック。
+#             省略時は AXWebArea から始める。深さ優先の前順でたどる
+#   limit: このページで返す要素数、max_visits: このページで properties() を取得する要素数の上限
+#   viewport: [x, y, width, height]。指定時は AXWebArea の表示範囲との共通部分の外にある
+#             要素を子孫ごと除外する（サイズ0の要素はたどる）
+#   roles / name: 返す要素の条件、exclude_roles: 子孫ごと除外する role
+# 戻り値: {elements, frontier, visited, web_area: {window_name, path, frame}}
+WEB_ELEMENTS_PAGE_SCRIPT = ScriptTemplate("webElementsPage", r'''
+const WEB_AREA_MAX_DEPTH = 16;
+const WEB_AREA_MAX_NODES = 600;
+
+function run(argv) {
+  const args = JSON.parse(argv[0]);
+  const se = Application("System Events");
+  if (!se.processes[args.app_name].exists()) {
+    return JSON.stringify({ error: "Process not found" });
+  }
+  const windows = se.processes[args.app_name].windows;
+  if (windows.length === 0) {
+    return JSON.stringify({ error: "No windows found" });
+  }
+
+  let win = null;
+  let windowName = "";
+  try {
+    win = args.window ? windows.byName(args.window) : windows[0];
+    windowName = win.name() || "";
+  } catch (e) {
+    return JSON.stringify({ error: "Window not found" });
+  }
+
+  function resolvePath(root, path) {
+    let elem = root;
+    for (let i = 0; i < path.length; i++) elem = elem.uiElements[path[i]];
+    return elem;
+  }
+
+  // 上限つきの幅優先探索で AXWebArea を探す
+  function findWebArea() {
+    const queue = [[win, []]];
+    let visited = 0;
+    while (queue.length > 0 && visited < WEB_AREA_MAX_NODES) {
+      const [elem, path] = queue.shift();
+      visited++;
+      try {
+        if (path.length > 0 && elem.role() === "AXWebArea") return path;
+        if (path.length >= WEB_AREA_MAX_DEPTH) continue;
+        const children = elem.uiElements();
+        for (let i = 0; i < children.length; i++) queue.push([children[i], path.concat([i])]);
+      } catch (e) {}
+    }
+    return null;
+  }
+
+  let webAreaPath = (args.known || {})[windowName] || null;
+  if (webAreaPath !== null) {
+    try {
+      if (resolvePath(win, webAreaPath).role() !== "AXWebArea") webAreaPath = null;
+    } catch (e) {
+      webAreaPath = null;
+    }
+  }
+  if (webAreaPath === null) webAreaPath = findWebArea();
+  if (webAreaPath === null) {
+    return JSON.stringify({ error: "AXWebArea not found" });
+  }
+  const webArea = resolvePath(win, webAreaPath);
+
+  let clip = null;
+  let webAreaFrame = [0, 0, 0, 0];
+  try {
+    const props = webArea.properties();
+    webAreaFrame = [props.position[0], props.position[1], props.size[0], props.size[1]];
+  } catch (e) {}
+  if (args.viewport) {
+    const v = args.viewport;
+    const f = webAreaFrame;
+    const left = Math.max(v[0], f[0]);
+    const top = Math.max(v[1], f[1]);
+    const right = Math.min(v[0] + v[2], f[0] + f[2]);
+    const bottom = Math.min(v[1] + v[3], f[1] + f[3]);
+    clip = [left, top, Math.max(0, right - left), Math.max(0, bottom - top)];
+  }
+
+  function outside(props) {
+    if (clip === null || !props.position || !props.size) return false;
+    const [x, y] = props.position;
+    const [w, h] = props.size;
+    if (w <= 0 || h <= 0) return false;
+    return x >= clip[0] + clip[2] || x + w <= clip[0] || y >= clip[1] + clip[3] || y + h <= clip[1];
+  }
+
+  const roles = args.roles ? new Set(args.roles) : null;
+  const excludeRoles = new Set(args.exclude_roles || []);
+  const frontier = args.frontier || [[]];
+  const elements = [];
+  let visited = 0;
+
+  while (frontier.length > 0 && elements.length < args.limit && visited < args.max_visits) {
+    const path = frontier.pop();
+    visited++;
+    try {
+      const elem = resolvePath(webArea, path);
+      if (path.length > 0) {
+        const props = elem.properties();
+        if (excludeRoles.has(props.role) || outside(props)) continue;
+        const name = props.name || props.title || "";
+        if ((roles === null || roles.has(props.role)) && (args.name == null || name === args.name)) {
+          elements.push({
+            role: props.role,
+            name: name,
+            value: props.value || "",
+            description: props.description || "",
+            position: props.position ? [props.position[0], props.position[1]] : [0, 0],
+            size: props.size ? [props.size[0], props.size[1]] : [0, 0]
+          });
+        }
+      }
+      const count = elem.uiElements.length;
+      // 前順にするため、後ろの子から積む
+      for (let i = count - 1; i >= 0; i--) frontier.push(path.concat([i]));
+    } catch (e) {}
+  }
+
+  return JSON.stringify({
+    elements: elements,
+    frontier: frontier,
+    visited: visited,
+    web_area: { window_name: windowName, path: webAreaPath, frame: webAreaFrame }
+  });
+}
+''')
+
+# argv[0]: {app_name}
+# 戻り値: {focused: {role, subrole, name, value, description, position, size, enabled} | null}
+#         またはプロセスが無い場合 {error}
+FOCUSED_ELEMENT_SCRIPT = ScriptTemplate("focusedElement", r'''
+function run(argv) {
+  const args = JSON.parse(argv[0]);
+  const se = Application("System Events");
+  if (!se.processes[args.app_name].exists()) {
+    return JSON.stringify({ error: "Process not found" });
+  }
+  const proc = se.processes[args.app_name];
+  let element = null;
+  try {
+    element = proc.attributes.byName("AXFocusedUIElement").value();
+  } catch (e) {
+    element = null;
+  }
+  if (!element) return JSON.stringify({ focused: null });
+
+  let props;
+  try {
+    props = element.properties();
+  } catch (e) {
+    return JSON.stringify({ focused: null });
+  }
+  // value は文字列以外（数値・要素の参照など）の場合があるため文字列にそろえる
+  let value = props.value;
+  if (value !== null && value !== undefined && typeof value !== "string") {
+    value = typeof value === "number" || typeof value === "boolean" ? String(value) : null;
+  }
+  return JSON.stringify({
+    focused: {
+      role: props.role || "",
+      subrole: props.subrole || null,
+      name: props.name || props.title || "",
+      value: value === undefined ? null : value,
+      description: props.description || "",
+      position: props.position || null,
+      size: props.size || null,
+      enabled: props.enabled === undefined ? null : props.enabled
+    }
+  });
+}
+''')
+
+# argv: [Bundle ID]
+BUNDLE_APP_NAME_SCRIPT = ScriptTemplate("bundleAppName", '''
+on run argv
+    tell application "Finder" to get name of (application file id (item 1 of argv))
+end run
+''', language="AppleScript")
+
+# argv: [入力する文字列]
+KEYSTROKE_SCRIPT = ScriptTemplate("keystroke", '''
+on run argv
+    tell application "System Events"
+        keystroke (item 1 of argv)
+    end tell
+end run
+''', language="AppleScript")
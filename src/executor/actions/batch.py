@@ -0,0 +1,131 @@
+"""複数のアクションを1回の往復で実行する（batch アクション）
+
+クリック → 入力 → キー押下 → スクリーンショットのような一連の操作を、
+アクションごとにパイプを往復せずにまとめて実行する。各ステップは通常のコマンドと
+同じディスパッチ経路で実行される（入力アクションの後処理もステップごとに行われる）。
+
+隣接する move / scroll のステップは合体キュー（utils/input_queue.py）でまとめられる。
+ステップ間の待機（delay_ms / wait_for_stable）を指定した場合は、待機の前にキューを実行する。
+"""
+import time
+
+from actions.screenshot import wait_until_stable
+from utils.input_queue import attach_flush
+
+# batch の中から呼び出せないアクション
+NESTED_ACTIONS = frozenset({"batch", "exit"})
+
+
+def _flush_queued(dispatch):
+    """合体待ちの move / scroll を実行し、その結果を返す（無ければ None）"""
+    return dispatch("flushInput", {}).get("input_flush")
+
+
+def _settle(delay_ms, stable_options):
+    """ステップ間の待機。wait_for_stable 指定時は画面の安定を待った結果を返す"""
+    if delay_ms:
+        time.sleep(delay_ms / 1000)
+    if stable_options is None:
+        return None
+    try:
+        return wait_until_stable(**stable_options)
+    except Exception as e:
+        return {"stable": False, "message": str(e)}
+
+
+def run_batch(dispatch, steps, stop_on_error=True, delay_ms=0, wait_for_stable=False,
+              screenshot=False):
+    """
+    ステップ（{"action", "params"}）を順に実行し、ステップごとの結果と所要時間を返す
+
+    Args:
+        dispatch: (action, params) を実行して結果dictを返す関数
+        steps: [{"action": str, "params": dict}, ...]
+        stop_on_error: Trueの場合、失敗したステップで中断する（以降は実行しない）
+        delay_ms: ステップ間の待機時間（ミリ秒）
+        wait_for_stable: ステップ間で画面の安定を待つ。True または
+                         wait_until_stable の引数（stable_ms, timeout_ms など）のdict
+        screenshot: 最後にスクリーンショットを1枚撮る。True または screenshot の引数のdict
+                    （wait_for_stable 指定時は waitForStable で安定後のフレームを撮る）
+
+    Returns:
+        dict: steps（各ステップの結果に action / elapsed_ms を付けたもの）、completed（実行した
+              ステップ数）、failed_step（最初に失敗したステップの番号、無ければ None）、
+              coalesced（合体した move / scroll の数）、screenshot（指定時）。
+              いずれかのステップが失敗した場合 status は "error"
+    """
+    if wait_for_stable is True:
+        stable_options = {}
+    elif wait_for_stable:
+        stable_options = dict(wait_for_stable)
+    else:
+        stable_options = None
+
+    results = []
+    failed_step = None
+    for index, step in enumerate(steps):
+        action = step.get("action")
+        params = step.get("params") or {}
+        if index > 0 and (delay_ms or stable_options is not None):
+            flushed = _flush_queued(dispatch)
+            if flushed is not None:
+                results[-1] = attach_flush(results[-1], flushed)
+                if results[-1]["status"] != "success" and failed_step is None:
+                    failed_step = index - 1
+                    if stop_on_error:
+                        break
+            settled = _settle(delay_ms, stable_options)
+            if settled is not None:
+                results[-1]["settle"] = settled
+
+        start = time.monotonic()
+        if action in NESTED_ACTIONS:
+            result = {"status": "error", "message": f"batch 内では実行できないアクションです: {action}"}
+        else:
+            try:
+                result = dispatch(action, params)
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+        result = {**result, "action": action,
+                  "elapsed_ms": int((time.monotonic() - start) * 1000)}
+        results.append(result)
+
+        if result.get("status") != "success" and failed_step is None:
+            failed_step = index
+            if stop_on_error:
+                break
+
+    # 最後のステップまでに残った move / scroll を実行する
+    flushes = [result["input_flush"] for result in results if result.get("input_flush")]
+    flushed = _flush_queued(dispatch)
+    if flushed is not None:
+        flushes.append(flushed)
+        if flushed.get("status") != "success" and failed_step is None and results:
+            # 遅延実行した move / scroll の失敗は最後のステップの失敗として扱う
+            failed_step = len(results) - 1
+            results[-1] = attach_flush(results[-1], flushed)
+
+    response = {
+        "status": "success" if failed_step is None else "error",
+        "steps": results,
+        "completed": len(results),
+        "failed_step": failed_step,
+        "coalesced": sum(flush.get("coalesced", 0) for flush in flushes),
+    }
+    if flushed is not None:
+        response["input_flush"] = flushed
+    if failed_step is not None:
+        response["message"] = f"ステップ {failed_step}（{results[failed_step]['action']}）が失敗しました: " \
+                              f"{results[failed_step].get('message', '')}"
+
+    if screenshot:
+        options = {"after": "last_action"} if screenshot is True else dict(screenshot)
+        start = time.monotonic()
+        if stable_options is not None:
+            options.pop("after", None)
+            shot = dispatch("waitForStable", {**stable_options, **options})
+        else:
+            shot = dispatch("screenshot", options)
+        shot["elapsed_ms"] = int((time.monotonic() - start) * 1000)
+        response["screenshot"] = shot
+    return response
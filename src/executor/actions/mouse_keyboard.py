@@ -1,75 +1,78 @@
-"""マウスとキーボード操作"""
+"""マウスとキーボード操作
+
+マウス操作は utils/input_engine.py の入力エンジンが CGEvent を直接送る
+（速度プロファイルは setSpeedProfile アクションで切り替える）。テキスト入力は
+utils/text_entry.py のクリップボード経由の入力エンジン、キー操作は pyautogui を使う。
+"""
 import pyautogui
-import time
 import AppKit
 
-# パフォーマンスプロファイル設定
-# 将来的に設定から切り替えやすくするため定数化
-# 環境や用途に応じて調整可能（高速化優先だが、UIが追いつかない場合は値を増やすこと）
-DEFAULT_SPEED_PROFILE = {
-    "PAUSE": 0.1,               # アクション間の基本待機時間（OSの負荷を考慮）
-    "CLICK_DURATION": 0.1,      # クリック時のマウス移動時間（速度優先）
-    "MOUSE_MOVE_DURATION": 0.1, # マウス移動時間
-    "DRAG_DURATION": 0.2,       # ドラッグ操作時間
-}
-
-# アクション間の待機時間を設定（高速化のため最小限に）
+from utils.input_engine import get_input_engine
+
+# キー操作（pyautogui）の操作後の待機時間は、現在の速度プロファイルの PAUSE に合わせる
 # Note: 一部の環境やリモート操作では速すぎてUIが追いつかない可能性があります
-# その場合は PAUSE を 0.1 以上に増やすことを推奨
-pyautogui.PAUSE = DEFAULT_SPEED_PROFILE["PAUSE"]
+# その場合は setSpeedProfile で PAUSE を増やすか humanlike を使うことを推奨
+pyautogui.PAUSE = get_input_engine().profile["PAUSE"]
+
+from actions.ax_scripts import KEYSTROKE_SCRIPT
+from utils.script_cache import run_template
+from utils.text_entry import get_text_entry
+
 
-from actions.clipboard_utils import copy_text
+def set_speed_profile(name=None, overrides=None):
+    """
+    マウス操作の速度プロファイルを切り替える（setSpeedProfile アクション）
+
+    Args:
+        name: "instant" / "default" / "humanlike"（省略時は現在のプロファイルのまま）
+        overrides: 個別の設定の上書き（PAUSE / CLICK_DURATION / MOUSE_MOVE_DURATION /
+                   DRAG_DURATION / EVENT_RATE）
+    """
+    engine = get_input_engine()
+    try:
+        profile = engine.set_profile(name, overrides)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    pyautogui.PAUSE = profile["PAUSE"]
+    return {"status": "success", "profile": engine.profile_name, "settings": profile}
 
 
 def click(x, y, clicks=1, button="left", duration=None):
     """指定された座標に移動しながらクリックする"""
-    if duration is None:
-        duration = DEFAULT_SPEED_PROFILE["CLICK_DURATION"]
     try:
-        pyautogui.click(x=x, y=y, clicks=clicks, button=button,duration=duration, tween=pyautogui.easeInOutQuad)
+        get_input_engine().click(x, y, clicks=clicks, button=button, duration=duration)
         return {"status": "success"}
     except Exception as e:
         return {"status": "error", "message": f"Failed to click: {str(e)}"}
 
 
-def type_text(text):
-    """テキストを入力する（クリップボード経由で日本語なども確実にペースト）"""
-    import subprocess
-    from actions.clipboard_utils import copy_text
-    import time
+def type_text(text, restore_clipboard=True, restore_delay_ms=None):
+    """テキストを入力する（クリップボード経由で日本語なども確実にペースト）
 
-    copy_res = copy_text(text)
-    if copy_res["status"] != "success":
-        return copy_res
+    入力前のクリップボードの内容は、ペースト後に元に戻す（restore_clipboard=False で無効化）。
+    restore_delay_ms でペーストから戻すまでの待機時間を変更できる（既定 500ms。経験則による値で、
+    ペースト先のアプリがそれより遅れて読み取ると元の内容が貼り付けられる）。
+    """
+    restore_delay = None if restore_delay_ms is None else restore_delay_ms / 1000
+    try:
+        entry = get_text_entry().type_text(text, restore=restore_clipboard, restore_delay=restore_delay)
+        return {"status": "success", "method": "pasteboard_paste", **entry}
+    except Exception as e:
+        paste_error = str(e)
 
-    osa_script = '''
-    tell application "System Events"
-        keystroke "v" using {command down}
-    end tell
-    '''
     try:
-        time.sleep(0.05)
-        result = subprocess.run(
-            ["osascript", "-e", osa_script],
-            capture_output=True,
-            text=True
-        )
+        result = run_template(KEYSTROKE_SCRIPT, [text])
         if result.returncode == 0:
-            return {"status": "success", "method": "clipboard_paste"}
-        else:
-            osa_script_fallback = f'''
-            tell application "System Events"
-                keystroke "{text.replace('"', '\\"')}"
-            end tell
-            '''
-            subprocess.run(["osascript", "-e", osa_script_fallback])
-            return {"status": "success", "method": "osascript_keystroke_fallback"}
+            return {"status": "success", "method": "osascript_keystroke_fallback",
+                    "paste_error": paste_error}
+    except Exception:
+        pass
+    try:
+        pyautogui.write(text)
+        return {"status": "success", "method": "pyautogui_fallback", "paste_error": paste_error}
     except Exception as e:
-        try:
-            pyautogui.write(text)
-            return {"status": "success", "method": "pyautogui_fallback"}
-        except:
-            return {"status": "error", "message": f"Failed to type text: {str(e)}"}
+        return {"status": "error", "message": f"Failed to type text: {str(e)}"}
+
 
 def press_key(key):
     """特定のキーを押す"""
@@ -100,10 +103,8 @@ def hotkey(keys):
 
 def mouse_move(x, y, duration=None):
     """指定された座標に移動する"""
-    if duration is None:
-        duration = DEFAULT_SPEED_PROFILE["MOUSE_MOVE_DURATION"]
     try:
-        pyautogui.moveTo(x, y, duration=duration, tween=pyautogui.easeInOutQuad)
+        get_input_engine().move(x, y, duration=duration)
         return {"status": "success"}
     except Exception as e:
         return {"status": "error", "message": f"Failed to move mouse: {str(e)}"}
@@ -116,20 +117,19 @@ def scroll(amount):
     except (TypeError, ValueError):
         return {"status": "error", "message": f"Invalid scroll amount: {amount}"}
 
-    # ツール仕様は「正の値で下方向」だが、pyautoguiは正の値で上方向
+    # ツール仕様は「正の値で下方向」だが、スクロールホイールのイベントは正の値で上方向
     # 仕様と一致させるために符号を反転する
-    pyautogui.scroll(-scroll_amount)
-    return {"status": "success"}
+    try:
+        get_input_engine().scroll(-scroll_amount)
+        return {"status": "success"}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to scroll: {str(e)}"}
 
 
 def drag(from_x, from_y, to_x, to_y, duration=None, button="left"):
     """ドラッグアンドドロップを実行する"""
-    if duration is None:
-        duration = DEFAULT_SPEED_PROFILE["DRAG_DURATION"]
     try:
-        move_duration = DEFAULT_SPEED_PROFILE["MOUSE_MOVE_DURATION"]
-        pyautogui.moveTo(from_x, from_y, duration=move_duration,tween=pyautogui.easeInOutQuad)
-        pyautogui.dragTo(to_x, to_y, duration=duration,button=button, tween=pyautogui.easeInOutQuad)
+        get_input_engine().drag(from_x, from_y, to_x, to_y, duration=duration, button=button)
         return {"status": "success"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
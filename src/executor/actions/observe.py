@@ -0,0 +1,132 @@
+"""画面の状態を1回の往復でまとめて取得する（observe アクション）
+
+screenshot → elementsJson のように続けて呼び出していた取得処理を、スレッドで並行して実行する:
+- frame: スクリーンショット（screenshot と同じ応答。応答の screenshot に入る）
+- tree: アプリのアクセシビリティツリー（elementsJson と同じ応答。ui_data / ui_table などは
+  応答の最上位に入る）
+- cursor: マウスカーソルの位置（mouse_position）
+- focused: アプリのフォーカスされている要素（focused_element）
+
+全体の所要時間は各取得の合計ではなく、最も遅い取得の時間に近くなる。
+各取得は同じ時刻（observed_at）に開始し、timings_ms で個別の所要時間が分かる。
+ツリーとフォーカス要素の取得はそれぞれのスクリプトのタイムアウトで打ち切られるため、
+全体の待機に別のタイムアウトは設けない（打ち切った取得がプールのスレッドを占有し続けないように）。
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from actions.ax_scripts import FOCUSED_ELEMENT_SCRIPT
+from actions.screenshot import screenshot as take_screenshot
+from actions.ui_elements import get_ui_elements_json
+from utils.ax_cache import frontmost_app
+from utils.capture_backends import get_capture_backend
+from utils.script_cache import run_template
+
+PARTS = ("frame", "tree", "cursor", "focused")
+FOCUSED_TIMEOUT = 5  # 秒
+
+_pool = ThreadPoolExecutor(max_workers=len(PARTS), thread_name_prefix="miki-observe")
+
+
+def _read_cursor():
+    x, y = get_capture_backend().cursor_position()
+    return {"x": x, "y": y}
+
+
+def _read_focused(app_name):
+    result = run_template(FOCUSED_ELEMENT_SCRIPT, {"app_name": app_name}, timeout=FOCUSED_TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    data = json.loads(result.stdout.strip())
+    if "error" in data:
+        raise RuntimeError(data["error"])
+    return data["focused"]
+
+
+def _timed(func, *args, **kwargs):
+    """func を実行し、(結果, 例外, 所要ミリ秒) を返す"""
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs), None, (time.perf_counter() - start) * 1000
+    except Exception as e:
+        return None, e, (time.perf_counter() - start) * 1000
+
+
+def observe(app_name=None, parts=None, max_depth=3, screenshot=None, tree=None):
+    """
+    スクリーンショット・アクセシビリティツリー・マウス位置・フォーカス要素を並行して取得する
+
+    Args:
+        app_name: 対象アプリ（省略時は最前面のアプリ）
+        parts: 取得する項目の一覧（frame / tree / cursor / focused。省略時はすべて）
+        max_depth: ツリーの最大深さ
+        screenshot: screenshot アクションの引数（quality / max_dimension / after など）
+        tree: elementsJson アクションの引数（window / use_cache / フィルター / format など）
+
+    Returns:
+        dict: observed_at（取得を開始した時刻）、app_name、ツリーの応答の各フィールド、
+              screenshot、mouse_position、focused_element、timings_ms（項目ごとと total）、
+              errors（失敗した項目のメッセージ。失敗が無ければ含まれない）。
+              すべての項目が失敗した場合のみ status が error になる
+    """
+    parts = list(PARTS) if parts is None else list(parts)
+    unknown = [part for part in parts if part not in PARTS]
+    if unknown:
+        return {"status": "error", "message": f"Unknown observe parts: {', '.join(unknown)}"}
+    if not parts:
+        return {"status": "error", "message": "parts が空です"}
+
+    requested = parts
+    start = time.perf_counter()
+    observed_at = time.time()
+    errors = {}
+    if app_name is None and ("tree" in parts or "focused" in parts):
+        app_name = frontmost_app()
+        if app_name is None:
+            for part in ("tree", "focused"):
+                if part in parts:
+                    errors[part] = "最前面のアプリを特定できませんでした"
+            parts = [part for part in parts if part not in errors]
+
+    calls = {
+        "frame": lambda: _pool.submit(_timed, take_screenshot, **(screenshot or {})),
+        "tree": lambda: _pool.submit(_timed, get_ui_elements_json, app_name,
+                                     max_depth=max_depth, **(tree or {})),
+        "cursor": lambda: _pool.submit(_timed, _read_cursor),
+        "focused": lambda: _pool.submit(_timed, _read_focused, app_name),
+    }
+    futures = {part: calls[part]() for part in parts}
+
+    reply = {"status": "success", "observed_at": observed_at, "app_name": app_name}
+    timings = {}
+    for part, future in futures.items():
+        # 各項目はそれぞれのタイムアウトで終わる（タイムアウトは _timed が例外として返す）
+        value, error, elapsed = future.result()
+        timings[part] = round(elapsed, 1)
+        if error is None and isinstance(value, dict) and value.get("status") == "error":
+            error = value.get("message", "")
+        if error is not None:
+            errors[part] = str(error)
+        elif part == "frame":
+            reply["screenshot"] = value
+        elif part == "tree":
+            reply.update({key: item for key, item in value.items() if key != "status"})
+        elif part == "cursor":
+            reply["mouse_position"] = value
+        else:
+            reply["focused_element"] = value
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    reply["timings_ms"] = timings
+    if errors:
+        reply["errors"] = errors
+        if all(part in errors for part in requested):
+            reply["status"] = "error"
+            reply["message"] = "; ".join(f"{part}: {message}" for part, message in errors.items())
+    return reply
+
+
+def shutdown_observe_pool():
+    """取得用のスレッドプールを停止する（エグゼキューター終了時）"""
+    _pool.shutdown(wait=False, cancel_futures=True)
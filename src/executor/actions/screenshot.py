@@ -1,28 +1,68 @@
 """スクリーンショット取得とハイライト描画"""
-import pyautogui
 import base64
+import threading
+import time
 from io import BytesIO
+import numpy as np
 from PIL import Image, ImageDraw
 
+from utils.capture_backends import get_capture_backend
+from utils.frame_transport import encode_image_payload
+from utils.image_encoder import resize_for_target, encode_screenshot
+from utils.frame_grabber import get_frame_grabber, last_action_end
+from utils.ax_cache import note_screen_fingerprint
+from utils.frame_diff import (
+    make_thumbnail, thumbnail_distance, frame_fingerprint, dirty_tile_grid, dirty_rects
+)
+from utils.display_geometry import (
+    get_display_geometry, refresh_display_geometry, note_frame_size
+)
 
-def _calculate_image_scale_factors(img):
+# 最後に割り当てた frame_id（全ての種類のフレームで共通の連番）
+_last_frame_id = 0
+# 種類（screen / region / delta）ごとに最後にクライアントへ送ったフレームの (キー, frame_id)。
+# 重複送信の抑止に使う。領域や差分のフレームで全画面の判定が変わらないよう種類ごとに分ける
+_last_frames = {}
+_frame_lock = threading.Lock()
+
+# screenshotDelta の差分計算の基準となるフレーム (frame_id, 画素配列)
+_delta_base = None
+_delta_lock = threading.Lock()
+
+# screenshotRegion の拡大率の範囲。これより小さい値はエラー、大きい値は上限に切り詰める
+MIN_REGION_ZOOM = 0.1
+MAX_REGION_ZOOM = 4.0
+
+
+def _calculate_image_scale_factors(img, logical_size=None):
     """
     画像とスクリーンサイズから倍率を計算
     Retina等でのスクリーンショットと論理座標の差を考慮
+
+    Args:
+        logical_size: 画像が表す領域の論理サイズ (width, height)。省略時は画面全体
     """
-    screen_w, screen_h = pyautogui.size()
+    if logical_size is None:
+        geometry = get_display_geometry()
+        logical_size = (geometry.width, geometry.height)
+    screen_w, screen_h = logical_size
     img_w, img_h = img.size
     return img_w / screen_w, img_h / screen_h
 
 
-def draw_point_on_screenshot(img, x, y, radius=15, color="red"):
-    """スクリーンショット上の指定座標にハイライト（赤い点）を描画する"""
+def draw_point_on_screenshot(img, x, y, radius=15, color="red", origin=(0, 0), logical_size=None):
+    """スクリーンショット上の指定座標にハイライト（赤い点）を描画する
+
+    Args:
+        origin: 画像左上の論理座標（領域スクリーンショットの場合）
+        logical_size: 画像が表す領域の論理サイズ。省略時は画面全体
+    """
     draw = ImageDraw.Draw(img)
 
     # ディスプレイのスケーリング（Retina等）を考慮
-    scale_x, scale_y = _calculate_image_scale_factors(img)
+    scale_x, scale_y = _calculate_image_scale_factors(img, logical_size)
 
-    ix, iy = x * scale_x, y * scale_y
+    ix, iy = (x - origin[0]) * scale_x, (y - origin[1]) * scale_y
 
     left_up = (ix - radius, iy - radius)
     right_down = (ix + radius, iy + radius)
@@ -30,51 +70,409 @@ def draw_point_on_screenshot(img, x, y, radius=15, color="red"):
     return img
 
 
-def screenshot(highlight_pos=None, quality=85):
-    """
-    画面のスクリーンショットを撮り、Base64文字列で返し、現在のマウス位置も提供する
-    
+def capture_screen():
+    """現在のキャプチャバックエンドで画面全体をキャプチャする"""
+    img = get_capture_backend().grab()
+    # 解像度の変化を検知した場合はジオメトリのキャッシュを破棄する
+    note_frame_size(img.size)
+    return img
+
+
+def acquire_frame(after=None):
+    """画面フレームを取得し、(画像, キャプチャ時刻) を返す
+
+    フレームグラバーが有効で after が指定されている場合は、その時刻より後に
+    バックグラウンドで撮られた最新フレームを使う。間に合わなければ新たにキャプチャする。
+
     Args:
-        highlight_pos: ハイライト位置 {"x": int, "y": int}
-        quality: JPEG品質（1-100）。デフォルト85で高品質かつ軽量
-                 TypeScript側のPERFORMANCE_CONFIG.SCREENSHOT_QUALITYから渡される
+        after: "last_action"（最後の入力アクション完了時刻）または time.monotonic() 基準の秒数
     """
-    shot = pyautogui.screenshot()
+    grabber = get_frame_grabber()
+    if grabber is not None and after is not None:
+        timestamp = last_action_end() if after == "last_action" else float(after)
+        grabber.start()
+        frame = grabber.wait_for_frame_after(timestamp, timeout=grabber.interval * 2)
+        if frame is not None:
+            # ハイライト描画でバッファ内のフレームを書き換えないようコピーする
+            return frame.image.copy(), frame.timestamp
+    return capture_screen(), time.monotonic()
 
-    # ハイライト位置が指定されている場合は描画
-    if highlight_pos:
-        shot = draw_point_on_screenshot(
-            shot, highlight_pos['x'], highlight_pos['y'])
 
+def encode_jpeg(img, quality=85):
+    """画像をJPEGバイト列にエンコードする"""
     # JPEG形式で圧縮して転送データ量を削減
     # Note: スクリーンショットは通常透明度を持たないため、RGBへの変換は安全
     buffered = BytesIO()
-    if shot.mode == 'RGBA':
+    if img.mode == 'RGBA':
         # RGBAの場合は白背景で合成してRGBに変換
-        rgb_shot = Image.new('RGB', shot.size, (255, 255, 255))
-        rgb_shot.paste(shot, mask=shot.split()[3])  # アルファチャンネルをマスクとして使用
-        rgb_shot.save(buffered, format="JPEG", quality=quality, optimize=True)
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        rgb_img.paste(img, mask=img.split()[3])  # アルファチャンネルをマスクとして使用
+        rgb_img.save(buffered, format="JPEG", quality=quality, optimize=True)
+    elif img.mode == 'RGB':
+        img.save(buffered, format="JPEG", quality=quality, optimize=True)
     else:
-        shot.convert('RGB').save(buffered, format="JPEG", quality=quality, optimize=True)
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    x, y = pyautogui.position()
-    return {"status": "success", "data": img_str, "mouse_position": {"x": x, "y": y}}
-
-
-def get_screen_size():
-    """画面サイズを取得する。物理解像度と論理解像度の比率（スケール）も返す"""
-    width, height = pyautogui.size()
-    # スクリーンショットを一時的に撮って物理サイズを確認
-    shot = pyautogui.screenshot()
-    phys_width, phys_height = shot.size
-    scale_x = phys_width / width
-    scale_y = phys_height / height
-    
-    return {
-        "status": "success", 
-        "width": width, 
+        img.convert('RGB').save(buffered, format="JPEG", quality=quality, optimize=True)
+    return buffered.getvalue()
+
+
+def _frame_key(thumb, highlight_pos, quality, image_options=None):
+    """送信済みフレームとの同一性判定に使うキー（画素の指紋・ハイライト・エンコード設定）"""
+    highlight = (highlight_pos['x'], highlight_pos['y']) if highlight_pos else None
+    options = tuple(sorted((image_options or {}).items()))
+    return frame_fingerprint(thumb), highlight, quality, options
+
+
+def _screen_frame_key(thumb, highlight_pos, quality, image_options=None):
+    """全画面フレームのキーを作り、画面の指紋をアクセシビリティツリーのキャッシュに知らせる
+
+    thumb はハイライト描画前の画像から作るため、指紋は常にハイライトなしの画面のもの。
+    """
+    key = _frame_key(thumb, highlight_pos, quality, image_options)
+    note_screen_fingerprint(key[0])
+    return key
+
+
+def _register_frame(key, kind="screen"):
+    """送信するフレームに新しいframe_idを割り当て、種類ごとに記録する"""
+    global _last_frame_id
+    with _frame_lock:
+        _last_frame_id += 1
+        _last_frames[kind] = (key, _last_frame_id)
+        return _last_frame_id
+
+
+def _image_options(max_dimension=None, scale=None, resample="bilinear", max_bytes=None, format="jpeg"):
+    """縮小・エンコードの設定をまとめる（既定値のものは省く）"""
+    options = {
+        "max_dimension": max_dimension,
+        "scale": scale,
+        "resample": resample if (max_dimension or scale) else None,
+        "max_bytes": max_bytes,
+        "format": format if format != "jpeg" else None,
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def _build_screenshot_result(shot, highlight_pos, quality, captured_at, frame_key=None,
+                             image_options=None, region=None):
+    """キャプチャ済みの画像からスクリーンショット応答を組み立てる
+
+    縮小 → ハイライト描画 → エンコードの順で処理するため、ハイライトは
+    縮小後の画像上の正しい位置に描かれる。
+
+    Args:
+        region: 画像が画面の一部の場合、その論理座標の矩形 (x, y, width, height)
+    """
+    image_options = image_options or {}
+    if frame_key is None:
+        frame_key = _frame_key(make_thumbnail(shot), highlight_pos, quality, image_options)
+    frame_id = _register_frame(frame_key, "region" if region else "screen")
+
+    # 目標解像度へ縮小（LLM側での縮小を待たずにエンコード負荷と転送量を減らす）
+    shot = resize_for_target(
+        shot,
+        max_dimension=image_options.get("max_dimension"),
+        scale=image_options.get("scale"),
+        resample=image_options.get("resample", "bilinear"),
+    )
+
+    # ハイライト位置が指定されている場合は描画
+    if highlight_pos:
+        if region:
+            shot = draw_point_on_screenshot(
+                shot, highlight_pos['x'], highlight_pos['y'],
+                origin=region[:2], logical_size=region[2:])
+        else:
+            shot = draw_point_on_screenshot(
+                shot, highlight_pos['x'], highlight_pos['y'])
+
+    encoded = encode_screenshot(
+        shot,
+        fmt=image_options.get("format", "jpeg"),
+        quality=quality,
+        max_bytes=image_options.get("max_bytes"),
+    )
+    payload = encode_image_payload(encoded["data"], encoded["mime_type"])
+    image_w, image_h = encoded["image"].size
+    logical_w = region[2] if region else get_display_geometry().width
+    x, y = get_capture_backend().cursor_position()
+    result = {
+        "status": "success",
+        **payload,
+        "mime_type": encoded["mime_type"],
+        "quality": encoded["quality"],
+        "image_width": image_w,
+        "image_height": image_h,
+        "image_scale": image_w / logical_w,
+        "mouse_position": {"x": x, "y": y},
+        "captured_at": captured_at,
+        "frame_id": frame_id,
+    }
+    if encoded["over_budget"]:
+        # max_bytes に収まらず、試した中で最も小さい結果を返している
+        result["over_budget"] = True
+    if region:
+        result["region"] = {"x": region[0], "y": region[1], "width": region[2], "height": region[3]}
+    return result
+
+
+def screenshot(highlight_pos=None, quality=85, after=None, dedupe=True,
+               max_dimension=None, scale=None, resample="bilinear", max_bytes=None,
+               format="jpeg"):
+    """
+    画面のスクリーンショットを撮り、現在の転送方式（Base64または共有メモリ参照）で返し、
+    現在のマウス位置も提供する
+
+    直前に返したフレームと画面が変わっていない場合は、画像を再エンコード・再送せずに
+    {"unchanged": true, "frame_id": 前回のID} のみを返す。
+
+    Args:
+        highlight_pos: ハイライト位置 {"x": int, "y": int}
+        quality: JPEG品質（1-100）。デフォルト85で高品質かつ軽量
+                 TypeScript側のPERFORMANCE_CONFIG.SCREENSHOT_QUALITYから渡される
+                 max_bytes 指定時は品質の上限として扱う
+        after: フレームグラバー有効時、この時刻より後のフレームを返す（acquire_frame参照）
+        dedupe: Falseの場合は変化がなくても常に画像を返す
+        max_dimension: 長辺の最大ピクセル数（Retina解像度のまま送らないための縮小）
+        scale: 物理解像度に対する倍率（0 < scale <= 1）
+        resample: 縮小フィルター（nearest/box/bilinear/hamming/bicubic/lanczos）
+        max_bytes: エンコード後のバイト数の上限。収まる最大の品質・サイズを選ぶ
+        format: "jpeg" / "webp" / "png" / "auto"（最も小さくなる形式）
+    """
+    image_options = _image_options(max_dimension, scale, resample, max_bytes, format)
+    shot, captured_at = acquire_frame(after)
+    frame_key = _screen_frame_key(make_thumbnail(shot), highlight_pos, quality, image_options)
+
+    if dedupe:
+        with _frame_lock:
+            last_key, frame_id = _last_frames.get("screen", (None, 0))
+            unchanged = frame_key == last_key
+        if unchanged:
+            x, y = get_capture_backend().cursor_position()
+            return {
+                "status": "success",
+                "unchanged": True,
+                "frame_id": frame_id,
+                "mouse_position": {"x": x, "y": y},
+                "captured_at": captured_at,
+            }
+
+    return _build_screenshot_result(
+        shot, highlight_pos, quality, captured_at, frame_key, image_options)
+
+
+def screenshot_region(x, y, width, height, zoom=1.0, highlight_pos=None, quality=85,
+                      max_dimension=None, max_bytes=None, format="jpeg"):
+    """
+    画面の一部（論理座標の矩形）だけをキャプチャして返す
+
+    ダイアログやツールバーなど一部だけを読みたい場合に、全画面のキャプチャと
+    エンコードを避けられる。Retinaの倍率は自動的に考慮される。
+
+    Args:
+        x, y, width, height: 論理座標の矩形（画面外にはみ出す部分は切り詰める）
+        zoom: 拡大率。小さな文字を読む場合は2などを指定する。MIN_REGION_ZOOM 未満はエラー、
+              MAX_REGION_ZOOM を超える値は上限に切り詰める（適用した値を応答の zoom に返す）
+        highlight_pos: ハイライト位置（画面全体の論理座標）
+        quality: JPEG品質（1-100）
+        max_dimension, max_bytes, format: screenshot() と同じエンコード設定
+    """
+    try:
+        zoom = 1.0 if zoom is None else float(zoom)
+    except (TypeError, ValueError):
+        return {"status": "error", "message": f"Invalid zoom: {zoom}"}
+    if not zoom >= MIN_REGION_ZOOM:
+        return {"status": "error", "message": f"zoom must be at least {MIN_REGION_ZOOM}: {zoom}"}
+    zoom = min(zoom, MAX_REGION_ZOOM)
+
+    geometry = get_display_geometry()
+    left = max(0, int(x))
+    top = max(0, int(y))
+    right = min(geometry.width, int(x + width))
+    bottom = min(geometry.height, int(y + height))
+    if right <= left or bottom <= top:
+        return {"status": "error", "message": f"Region is outside the screen: {x},{y} {width}x{height}"}
+    region = (left, top, right - left, bottom - top)
+
+    shot = get_capture_backend().grab_region(*region)
+    captured_at = time.monotonic()
+    if zoom != 1.0:
+        shot = shot.resize(
+            (max(1, round(shot.size[0] * zoom)), max(1, round(shot.size[1] * zoom))),
+            Image.LANCZOS if zoom > 1.0 else Image.BILINEAR)
+
+    image_options = _image_options(max_dimension, None, "bilinear", max_bytes, format)
+    result = _build_screenshot_result(
+        shot, highlight_pos, quality, captured_at, image_options=image_options, region=region)
+    if result.get("status") == "success":
+        result["zoom"] = zoom
+    return result
+
+
+def _sample_until_stable(stable_ms, timeout_ms, interval_ms, threshold):
+    """画面が stable_ms の間変化しなくなるまでサムネイルを比較し続ける
+
+    Returns:
+        tuple: (最後のフレーム, キャプチャ時刻, そのサムネイル, 安定したか, サンプル数, 開始時刻)
+    """
+    start = time.monotonic()
+    deadline = start + timeout_ms / 1000
+    stable_window = stable_ms / 1000
+    interval = interval_ms / 1000
+
+    shot, captured_at = acquire_frame()
+    previous = make_thumbnail(shot)
+    last_change = captured_at
+    samples = 1
+    stable = False
+
+    while True:
+        if captured_at - last_change >= stable_window:
+            stable = True
+            break
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(max(0.0, min(interval, deadline - time.monotonic())))
+        shot, captured_at = acquire_frame()
+        current = make_thumbnail(shot)
+        samples += 1
+        if thumbnail_distance(previous, current) > threshold:
+            last_change = captured_at
+        previous = current
+    return shot, captured_at, previous, stable, samples, start
+
+
+def wait_for_stable(stable_ms=300, timeout_ms=3000, interval_ms=50, threshold=1.0,
+                    highlight_pos=None, quality=85, max_dimension=None, scale=None,
+                    resample="bilinear", max_bytes=None, format="jpeg"):
+    """
+    画面が安定する（一定時間変化しなくなる）まで待ち、安定したフレームを返す
+
+    縮小グレースケールのサムネイル同士の平均絶対差で変化を判定するため、
+    アニメーションやレンダリング途中の画面を撮ってしまうことを防げる。
+
+    Args:
+        stable_ms: この時間（ミリ秒）変化がなければ安定とみなす
+        timeout_ms: 最大待機時間（ミリ秒）。超えた場合は最後のフレームを返す
+        interval_ms: サンプリング間隔（ミリ秒）
+        threshold: 変化とみなす平均絶対差（0-255）
+        highlight_pos: 返すフレームに描画するハイライト位置
+        quality: JPEG品質（1-100）
+        max_dimension, scale, resample, max_bytes, format: screenshot() と同じエンコード設定
+    """
+    image_options = _image_options(max_dimension, scale, resample, max_bytes, format)
+    shot, captured_at, thumb, stable, samples, start = _sample_until_stable(
+        stable_ms, timeout_ms, interval_ms, threshold)
+
+    result = _build_screenshot_result(
+        shot, highlight_pos, quality, captured_at,
+        _screen_frame_key(thumb, highlight_pos, quality, image_options), image_options)
+    result["stable"] = stable
+    result["waited_ms"] = int((time.monotonic() - start) * 1000)
+    result["samples"] = samples
+    return result
+
+
+def wait_until_stable(stable_ms=300, timeout_ms=3000, interval_ms=50, threshold=1.0):
+    """
+    wait_for_stable と同じ条件で画面の安定を待つが、画像は返さない（batch のステップ間用）
+    """
+    _, _, _, stable, samples, start = _sample_until_stable(
+        stable_ms, timeout_ms, interval_ms, threshold)
+    return {"stable": stable, "waited_ms": int((time.monotonic() - start) * 1000),
+            "samples": samples}
+
+
+def screenshot_delta(base_frame_id=None, tile_size=128, quality=85, max_dirty_ratio=0.5):
+    """
+    前回のフレームからの差分タイルのみを返すスクリーンショット
+
+    フレームを固定グリッドに分割して前回フレームと比較し、変化したタイル
+    （行方向に連結した矩形）だけをJPEGで返す。クライアントは base_frame_id の
+    フレームに各タイルを貼り付けて完全なフレームを復元する
+    （utils/frame_diff.apply_tile_delta 参照）。
+
+    基準フレームが一致しない場合や変化が大きい場合は、全体フレーム（keyframe）を返す。
+    差分の基準を汚さないよう、ハイライト描画はこのモードでは行わない。
+
+    Args:
+        base_frame_id: クライアントが保持しているフレームのID
+        tile_size: タイルの一辺（物理ピクセル）
+        quality: JPEG品質（1-100）
+        max_dirty_ratio: 変化したタイルの割合がこれを超えたらkeyframeを返す
+    """
+    global _delta_base
+    shot, captured_at = acquire_frame()
+    current = np.asarray(shot)
+    width, height = shot.size
+    frame_id = _register_frame(_screen_frame_key(make_thumbnail(shot), None, quality), "delta")
+
+    with _delta_lock:
+        base = _delta_base
+        _delta_base = (frame_id, current)
+
+    grid = None
+    if base is not None and base_frame_id is not None and base[0] == base_frame_id:
+        grid = dirty_tile_grid(base[1], current, tile_size)
+
+    result = {
+        "status": "success",
+        "frame_id": frame_id,
+        "width": width,
         "height": height,
-        "physical_width": phys_width,
-        "physical_height": phys_height,
-        "scale": scale_x 
+        "captured_at": captured_at,
     }
+
+    dirty_ratio = float(grid.mean()) if grid is not None else 1.0
+    if grid is None or dirty_ratio > max_dirty_ratio:
+        result["mode"] = "keyframe"
+        result.update(encode_image_payload(encode_jpeg(shot, quality), "image/jpeg"))
+        return result
+
+    tiles = []
+    for x, y, w, h in dirty_rects(grid, tile_size, width, height):
+        tile_bytes = encode_jpeg(shot.crop((x, y, x + w, y + h)), quality)
+        tiles.append({
+            "x": x,
+            "y": y,
+            "width": w,
+            "height": h,
+            "data": base64.b64encode(tile_bytes).decode("utf-8"),
+        })
+
+    result.update({
+        "mode": "delta",
+        "base_frame_id": base_frame_id,
+        "tile_size": tile_size,
+        "dirty_ratio": dirty_ratio,
+        "tiles": tiles,
+    })
+    return result
+
+
+def _geometry_result(geometry):
+    return {
+        "status": "success",
+        "width": geometry.width,
+        "height": geometry.height,
+        "physical_width": geometry.physical_width,
+        "physical_height": geometry.physical_height,
+        "scale": geometry.scale_x
+    }
+
+
+def get_screen_size(refresh=False):
+    """画面サイズを取得する。物理解像度と論理解像度の比率（スケール）も返す
+
+    値はキャッシュされたディスプレイジオメトリから返すため、キャプチャは発生しない。
+
+    Args:
+        refresh: Trueの場合はキャッシュを破棄して再計算する
+    """
+    geometry = refresh_display_geometry() if refresh else get_display_geometry()
+    return _geometry_result(geometry)
+
+
+def refresh_display():
+    """ディスプレイ構成を再取得する（解像度変更やディスプレイ接続後に使用）"""
+    return _geometry_result(refresh_display_geometry())
@@ -2,32 +2,17 @@
 import subprocess
 import json
 import time
-import pyautogui
 
-from actions.clipboard_utils import copy_text
-
-
-def _type_text(text):
-    """
-    テキストを入力する（クリップボード経由でより確実に）
-    Note: This is duplicated from mouse_keyboard to avoid circular dependency
-    """
-    # 特殊な文字や日本語入力の不安定さを避けるため、クリップボード経由での貼り付けを試みる
-    copy_result = copy_text(text)
-    if copy_result["status"] == "success":
-        try:
-            time.sleep(0.1)
-            pyautogui.hotkey('command', 'v')
-            time.sleep(0.2)
-            return {"status": "success", "method": copy_result["method"]}
-        except Exception as e:
-            return {"status": "error", "message": f"Failed to paste text: {str(e)}"}
-
-    try:
-        pyautogui.write(text, interval=0.05)
-        return {"status": "success", "method": "write"}
-    except Exception as e:
-        return {"status": "error", "message": f"Failed to type text: {str(e)}"}
+from actions.ax_scripts import (
+    ELEMENT_ACTION_SCRIPT, FIND_ELEMENTS_SCRIPT, UI_ELEMENTS_JSON_SCRIPT, UI_ELEMENTS_SCRIPT
+)
+from utils.ax_cache import app_window_state, current_screen_fingerprint, get_ax_cache
+from utils.ax_snapshots import diff_flat, get_snapshot_store
+from utils.display_geometry import get_display_geometry
+from utils.input_engine import get_input_engine
+from utils.locator_index import Locator, get_locator_index
+from utils.script_cache import run_template
+from utils.ui_tree_codec import encode_columnar
 
 
 def get_ui_elements(app_name):
@@ -35,49 +20,8 @@ def get_ui_elements(app_name):
     AppleScriptのGUI Scriptingを使用して、指定されたアプリのGUI要素一覧を効率的に取得する。
     entire contentsを使用せず、一括プロパティ取得を利用することで高速化。
     """
-    script = f'''
-    tell application "System Events"
-        if not (exists application process "{app_name}") then return "ERROR: Process not found"
-        tell application process "{app_name}"
-            set elements_data to {{}}
-            repeat with win in windows
-                try
-                    -- ウィンドウ自身の情報
-                    set {{r, n, p, s}} to {{role, name, position, size}} of win
-                    if n is missing value then set n to ""
-                    set end of elements_data to r & "|" & n & "|" & (item 1 of p) & "," & (item 2 of p) & "|" & (item 1 of s) & "," & (item 2 of s)
-
-                    -- ウィンドウ直下の子要素を一括取得
-                    set children to UI elements of win
-                    set {{rs, ns, ps, ss}} to {{role, name, position, size}} of UI elements of win
-
-                    repeat with i from 1 to count of rs
-                        set n_val to item i of ns
-                        if n_val is missing value then set n_val to ""
-                        set end of elements_data to (item i of rs) & "|" & n_val & "|" & (item 1 of item i of ps) & "," & (item 2 of item i of ps) & "|" & (item 1 of item i of ss) & "," & (item 2 of item i of ss)
-
-                        -- さらにその下 (ボタンやテキストフィールドを拾うため。3階層目まで)
-                        try
-                            set subchildren to UI elements of (item i of children)
-                            if (count of subchildren) > 0 then
-                                set {{rrs, nns, pps, sss}} to {{role, name, position, size}} of subchildren
-                                repeat with j from 1 to count of rrs
-                                    set nn to item j of nns
-                                    if nn is missing value then set nn to ""
-                                    set end of elements_data to (item j of rrs) & "|" & nn & "|" & (item 1 of item j of pps) & "," & (item 2 of item j of pps) & "|" & (item 1 of item j of sss) & "," & (item 2 of item j of sss)
-                                end repeat
-                            end if
-                        end try
-                    end repeat
-                end try
-            end repeat
-            return elements_data
-        end tell
-    end tell
-    '''
     try:
-        result = subprocess.run(
-            ['osascript', '-e', script], capture_output=True, text=True)
+        result = run_template(UI_ELEMENTS_SCRIPT, [app_name])
         if result.returncode == 0:
             output = result.stdout.strip()
             if output.startswith("ERROR"):
@@ -93,78 +37,95 @@ def get_ui_elements(app_name):
         return {"status": "error", "message": str(e)}
 
 
-def get_ui_elements_json(app_name, max_depth=3):
+def _tree_query(interactive_only=False, visible_only=False, roles=None, exclude_roles=None,
+                name_contains=None, name_regex=None, max_nodes=None):
+    """探索中に評価するフィルターをまとめる（指定されたものだけを含む）"""
+    query = {
+        "interactive_only": bool(interactive_only),
+        "visible_only": bool(visible_only),
+        "roles": list(roles) if roles else None,
+        "exclude_roles": list(exclude_roles) if exclude_roles else None,
+        "name_contains": name_contains,
+        "name_regex": name_regex,
+        "max_nodes": int(max_nodes) if max_nodes else None,
+    }
+    return {name: value for name, value in query.items() if value}
+
+
+def _tree_reply(data, format, **fields):
+    """ツリーを指定形式で応答に載せる（columnar は ui_table、それ以外は ui_data）"""
+    if format == "columnar":
+        return {"status": "success", "ui_table": encode_columnar(data), **fields}
+    return {"status": "success", "ui_data": data, **fields}
+
+
+def get_ui_elements_json(app_name, max_depth=3, window=None, use_cache=True, max_age=None,
+                         interactive_only=False, visible_only=False, roles=None,
+                         exclude_roles=None, name_contains=None, name_regex=None, max_nodes=None,
+                         format="tree"):
     """
     UI要素をJSON形式で詳細に取得（JXA使用）
     properties()とactions()を使って、UI要素の詳細情報を再帰的に取得する
-    """
-    jxa_script = f'''
-    ObjC.import('stdlib');
-
-    const se = Application("System Events");
-    if (!se.processes["{app_name}"].exists()) {{
-      JSON.stringify({{ error: "Process not found" }});
-    }} else {{
-      const proc = se.processes["{app_name}"];
-
-      function inspectElement(elem, depth) {{
-        if (depth > {max_depth}) return null;
-
-        try {{
-          const props = elem.properties();
-          const result = {{
-            role: props.role,
-            roleDescription: props.roleDescription || "",
-            name: props.name || props.title || "",
-            description: props.description || "",
-            value: props.value || null,
-            position: props.position ? [props.position[0], props.position[1]] : [0, 0],
-            size: props.size ? [props.size[0], props.size[1]] : [0, 0],
-            enabled: props.enabled !== undefined ? props.enabled : true,
-            focused: props.focused || false,
-            selected: props.selected || false,
-            actions: [],
-            subrole: props.subrole || "",
-            children: []
-          }};
-
-          // アクション一覧を取得
-          try {{
-            const actions = elem.actions();
-            result.actions = actions.map(a => a.name());
-          }} catch (e) {{}}
-
-          // 子要素取得（depth制限）
-          if (depth < {max_depth}) {{
-            try {{
-              const children = elem.uiElements();
-              result.children = children.map(child => inspectElement(child, depth + 1))
-                                       .filter(c => c !== null);
-            }} catch (e) {{}}
-          }}
-
-          return result;
-        }} catch (e) {{
-          return null;
-        }}
-      }}
-
-      const windows = proc.windows();
-      const result = windows.map(win => inspectElement(win, 0)).filter(w => w !== null);
-      JSON.stringify({{ windows: result }});
-    }}
-    '''
 
+    取得結果は (アプリ, ウィンドウ, 深さ, フィルター) ごとにキャッシュされ（utils/ax_cache.py）、
+    有効なキャッシュがあればツリーをたどらずに返す。応答の cached と
+    cache_age_ms でキャッシュの使用有無と経過時間が分かる。
+
+    各ノードには再取得しても変わらない "id" が付き、応答の snapshot_id を
+    elementsJsonDelta の base_snapshot_id に渡すと差分だけを取得できる。
+
+    フィルターは探索中に評価される。応答の visited は properties() を取得した要素数、
+    pruned は子孫ごと探索を省いた要素数、truncated は max_nodes で打ち切ったかどうか。
+
+    Args:
+        window: 指定した名前のウィンドウのみを取得する
+        use_cache: Falseの場合は常に取得し直す（結果はキャッシュに保存される）
+        max_age: キャッシュの最大経過秒数（省略時はキャッシュのTTL）
+        interactive_only: 操作できる要素（ボタン・入力欄や、AXPress などのアクションを持つ要素）のみ
+        visible_only: サイズ0の要素と画面外の要素を子孫ごと除外する
+        roles: 出力する role の一覧
+        exclude_roles: 子孫ごと除外する role の一覧
+        name_contains: name に含まれる文字列（大文字小文字を区別しない）
+        name_regex: name にマッチする正規表現（JavaScript の RegExp）
+        max_nodes: 出力する要素数の上限
+        format: "tree"（ネストしたJSON、ui_data）または "columnar"（列指向、ui_table。
+                utils/ui_tree_codec.py 参照）
+
+    roles / interactive_only / name_contains / name_regex に該当しない要素は出力されず、
+    条件に合う子孫が親の children に繰り上げられる。
+    """
+    query = _tree_query(interactive_only, visible_only, roles, exclude_roles,
+                        name_contains, name_regex, max_nodes)
+    cache = get_ax_cache()
+    store = get_snapshot_store()
+    key = cache.make_key(app_name, window, max_depth, query)
+    screen_fingerprint = current_screen_fingerprint()
+    windows = app_window_state(app_name)
+    if use_cache:
+        hit = cache.get(key, screen_fingerprint, windows, max_age)
+        if hit is not None:
+            (data, stats), age = hit
+            return _tree_reply(data, format, snapshot_id=store.register(data),
+                               **stats, cached=True, cache_age_ms=int(age * 1000))
+
+    args = {"app_name": app_name, "max_depth": max_depth, "window": window, "query": query}
+    if visible_only:
+        geometry = get_display_geometry()
+        args["viewport"] = [0, 0, geometry.width, geometry.height]
     try:
-        result = subprocess.run(
-            ['osascript', '-l', 'JavaScript', '-e', jxa_script],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+        result = run_template(UI_ELEMENTS_JSON_SCRIPT, args, timeout=10)
         if result.returncode == 0:
             data = json.loads(result.stdout.strip())
-            return {"status": "success", "ui_data": data}
+            if "error" in data:
+                return {"status": "success", "ui_data": data, "cached": False, "cache_age_ms": 0}
+            stats = data.pop("stats", {})
+            # ウィンドウやフィルターで絞った結果は既存の索引に追加する
+            get_locator_index().rebuild(app_name, data.get("windows") or [],
+                                        replace=not (window or query))
+            snapshot_id = store.register(data)
+            cache.put(key, (data, stats), screen_fingerprint, windows)
+            return _tree_reply(data, format, snapshot_id=snapshot_id,
+                               **stats, cached=False, cache_age_ms=0)
         else:
             return {"status": "error", "message": result.stderr.strip()}
     except subprocess.TimeoutExpired:
@@ -173,71 +134,208 @@ def get_ui_elements_json(app_name, max_depth=3):
         return {"status": "error", "message": str(e)}
 
 
+def get_ui_elements_json_delta(app_name, base_snapshot_id=None, max_depth=3, window=None,
+                               use_cache=True, max_age=None, full=False, **query):
+    """
+    elementsJson の結果を、呼び出し側が持っているスナップショットとの差分で返す
+
+    base_snapshot_id のスナップショットが保持されていない場合や full=True の場合は
+    ツリー全体を返す（mode: "full"）。差分の場合（mode: "delta"）は
+    added / changed にフラットなノード（parent と children は ID）、removed に ID を返す。
+    query には get_ui_elements_json と同じフィルターと format を指定できる。
+    """
+    result = get_ui_elements_json(app_name, max_depth=max_depth, window=window,
+                                  use_cache=use_cache, max_age=max_age, **query)
+    if result["status"] != "success" or "snapshot_id" not in result:
+        return result
+
+    store = get_snapshot_store()
+    base = store.flat(base_snapshot_id) if base_snapshot_id is not None and not full else None
+    if base is None:
+        return {**result, "mode": "full"}
+
+    current = store.flat(result["snapshot_id"])
+    delta = diff_flat(base, current)
+    return {
+        "status": "success",
+        "mode": "delta",
+        "snapshot_id": result["snapshot_id"],
+        "base_snapshot_id": base_snapshot_id,
+        "node_count": len(current),
+        **delta,
+        "visited": result.get("visited"),
+        "pruned": result.get("pruned"),
+        "truncated": result.get("truncated"),
+        "cached": result["cached"],
+        "cache_age_ms": result["cache_age_ms"],
+    }
+
+
+def _locate_element(app_name, role, name, action, walk=True, timeout=5):
+    """ロケーター索引を使って要素を特定する（action="focus" ならフォーカスも当てる）
+
+    索引のパスが古ければスクリプト側で探し直し、見つけた位置で索引を更新する。
+    walk=False の場合は索引の位置とその周辺だけを調べ、全ウィンドウの探索は行わない。
+
+    Returns:
+        dict: 成功時は {"status": "success", "x", "y", "frame", "method"}
+    """
+    index = get_locator_index()
+    locators = [{"window": loc.window, "window_name": loc.window_name, "path": loc.path}
+                for loc in index.lookup(app_name, role, name)]
+    result = run_template(ELEMENT_ACTION_SCRIPT,
+                          {"app_name": app_name, "role": role, "name": name, "action": action,
+                           "locators": locators, "walk": walk},
+                          timeout=timeout)
+    output = result.stdout.strip()
+    if not output.startswith("{"):
+        return {"status": "error", "message": output or result.stderr.strip()}
+    data = json.loads(output)
+    if data["method"] != "index":
+        index.update(app_name, role, name,
+                     Locator(data["window"], data["window_name"], data["path"], data["frame"]))
+    return {"status": "success", "x": data["x"], "y": data["y"], "frame": data["frame"],
+            "method": data["method"]}
+
+
+def find_elements(app_name, locators, max_depth=6, timeout=10):
+    """
+    複数のロケーターを1回のツリー探索でまとめて解決する
+
+    全ウィンドウを深さ優先で1回だけたどり、全てのロケーターが見つかった時点で打ち切る。
+    見つかった要素はロケーター索引にも登録され、続く focusElement などで直接参照される。
+
+    Args:
+        locators: [{"role", "name", "name_regex", "index"}] のリスト。
+                  role / name / name_regex は指定したものだけを条件にし、
+                  index は何番目の一致を返すか（0始まり、デフォルト0）
+        max_depth: 探索する深さ（ウィンドウが0）
+
+    Returns:
+        dict: results はロケーターと同じ順で、見つかったものは
+              {"found": True, "role", "name", "frame", "center", "actions", ...}、
+              見つからなかったものは {"found": False}
+    """
+    try:
+        result = run_template(FIND_ELEMENTS_SCRIPT,
+                              {"app_name": app_name, "locators": locators, "max_depth": max_depth},
+                              timeout=timeout)
+        if result.returncode != 0:
+            return {"status": "error", "message": result.stderr.strip()}
+        data = json.loads(result.stdout.strip())
+        if "error" in data:
+            return {"status": "error", "message": data["error"]}
+        index = get_locator_index()
+        for found in data["results"]:
+            if found["found"]:
+                index.update(app_name, found["role"], found["name"],
+                             Locator(found["window"], found["window_name"], found["path"],
+                                     found["frame"]))
+        return {"status": "success", **data}
+    except subprocess.TimeoutExpired:
+        return {"status": "error", "message": "要素の検索がタイムアウトしました（10秒以上）"}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+def _probe_element(app_name, locator, max_depth, timeout):
+    """要素を1回探し、見つかれば {"frame", "center", ...}、無ければNoneを返す
+
+    role と name が完全一致で指定されていれば、まずロケーター索引の位置だけを調べる
+    （ツリーをたどらない）。索引に無い場合は findElements の1回の探索で探す。
+    """
+    deadline = time.monotonic() + timeout
+    role, name = locator.get("role"), locator.get("name")
+    if role and name is not None and not locator.get("name_regex") and not locator.get("index"):
+        if get_locator_index().lookup(app_name, role, name):
+            located = _locate_element(app_name, role, name, "locate", walk=False, timeout=timeout)
+            if located["status"] == "success":
+                x, y, width, height = located["frame"]
+                return {"found": True, "role": role, "name": name, "frame": located["frame"],
+                        "center": {"x": x + width / 2, "y": y + height / 2}}
+    # 索引の確認と探索を合わせて timeout 内に収める
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise subprocess.TimeoutExpired("osascript", timeout)
+    result = find_elements(app_name, [locator], max_depth=max_depth, timeout=remaining)
+    if result["status"] != "success":
+        raise RuntimeError(result["message"])
+    found = result["results"][0]
+    return found if found["found"] else None
+
+
+def wait_for_element(app_name, role=None, name=None, name_regex=None, index=0, state="appear",
+                     timeout_ms=5000, interval_ms=50, max_interval_ms=1000, max_depth=6):
+    """
+    要素が現れる（または消える）まで、エグゼキューター内でポーリングして待つ
+
+    ポーリング間隔は interval_ms から始めて倍々に伸ばし、max_interval_ms で頭打ちにする。
+    各ポーリングはツリー全体の取得ではなく、索引の位置の確認または
+    findElements と同じ打ち切り付きの探索で行う。
+
+    Args:
+        role, name, name_regex, index: findElements のロケーターと同じ
+        state: "appear"（現れるまで待つ）または "disappear"（消えるまで待つ）
+        timeout_ms: 最大待機時間（ミリ秒）
+        interval_ms: 最初のポーリング間隔（ミリ秒）
+        max_interval_ms: ポーリング間隔の上限（ミリ秒）
+
+    Returns:
+        dict: matched（条件を満たしたか）、element（appear の場合は要素の frame / center など、
+              disappear の場合は最後に見えていた要素）、waited_ms、polls
+    """
+    if state not in ("appear", "disappear"):
+        return {"status": "error", "message": f"Unknown state: {state}"}
+    locator = {"role": role, "name": name, "name_regex": name_regex, "index": index}
+    start = time.monotonic()
+    deadline = start + timeout_ms / 1000
+    interval = interval_ms / 1000
+    polls = 0
+    last_seen = None
+    last_error = None
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            result = {"status": "success", "matched": False, "state": state, "element": last_seen,
+                      "waited_ms": int((time.monotonic() - start) * 1000), "polls": polls}
+            if last_error:
+                result["last_error"] = last_error
+            return result
+        polls += 1
+        # 1回の探索が待機時間の残りを超えないようにする
+        probe_timeout = min(10.0, remaining)
+        try:
+            found = _probe_element(app_name, locator, max_depth, probe_timeout)
+            present = found is not None
+        except Exception as e:
+            # アプリの起動前などの失敗は「まだ見つからない」とみなす。
+            # disappear では失敗を「消えた」と判断しない
+            found, last_error = None, str(e)
+            present = state == "disappear"
+        if found is not None:
+            last_seen = found
+        if present == (state == "appear"):
+            return {"status": "success", "matched": True, "state": state, "element": last_seen,
+                    "waited_ms": int((time.monotonic() - start) * 1000), "polls": polls}
+
+        time.sleep(max(0.0, min(interval, deadline - time.monotonic())))
+        interval = min(interval * 2, max_interval_ms / 1000)
+
+
 def click_element(app_name, role, name):
     """
     UI要素をroleとnameで検索してクリック
-    """
-    jxa_script = f'''
-    const se = Application("System Events");
-    const proc = se.processes["{app_name}"];
-
-    function findElementRecursive(elem, role, name, depth) {{
-      if (depth > 5) return null;
-      try {{
-        const props = elem.properties();
-        if (props.role === role && (props.name === name || props.title === name)) {{
-          return elem;
-        }}
-        
-        const children = elem.uiElements();
-        for (let i = 0; i < children.length; i++) {{
-          const found = findElementRecursive(children[i], role, name, depth + 1);
-          if (found) return found;
-        }}
-      }} catch (e) {{}}
-      return null;
-    }}
-
-    if (proc.windows.length === 0) {{
-      "ERROR: No windows found";
-    }} else {{
-      const elem = findElementRecursive(proc.windows[0], "{role}", "{name}", 0);
-      if (elem !== null) {{
-        const props = elem.properties();
-        const pos = props.position;
-        const size = props.size;
-        // 座標とサイズをJSONで返す
-        JSON.stringify({{
-          status: "success",
-          x: pos[0] + size[0] / 2,
-          y: pos[1] + size[1] / 2
-        }});
-      }} else {{
-        "ERROR: Element not found";
-      }}
-    }}
-    '''
 
+    elementsJson で作られたロケーター索引で要素を直接参照する（全ウィンドウが対象）。
+    """
     try:
-        result = subprocess.run(
-            ['osascript', '-l', 'JavaScript', '-e', jxa_script],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        output = result.stdout.strip()
-        if output.startswith("{"):
-            data = json.loads(output)
-            if data.get("status") == "success":
-                # pyautoguiを使用して移動アニメーション付きでクリック
-                pyautogui.click(x=data["x"], y=data["y"], duration=0.5,
-                                tween=pyautogui.easeInOutQuad)
-                return {"status": "success"}
-        
-        if output == "success":
-            return {"status": "success"}
-        else:
-            return {"status": "error", "message": output}
+        located = _locate_element(app_name, role, name, "locate")
+        if located["status"] != "success":
+            return located
+        # 入力エンジンで現在の速度プロファイルに従ってクリック
+        get_input_engine().click(located["x"], located["y"])
+        return {"status": "success", "method": located["method"]}
     except subprocess.TimeoutExpired:
         return {"status": "error", "message": "クリック操作がタイムアウトしました（5秒以上）"}
     except Exception as e:
@@ -247,53 +345,16 @@ def click_element(app_name, role, name):
 def focus_element(app_name, role, name):
     """
     UI要素にフォーカスを当てる
-    """
-    jxa_script = f'''
-    const se = Application("System Events");
-    const proc = se.processes["{app_name}"];
-
-    function findElementRecursive(elem, role, name, depth) {{
-      if (depth > 5) return null;
-      try {{
-        const props = elem.properties();
-        if (props.role === role && (props.name === name || props.title === name)) {{
-          return elem;
-        }}
-        
-        const children = elem.uiElements();
-        for (let i = 0; i < children.length; i++) {{
-          const found = findElementRecursive(children[i], role, name, depth + 1);
-          if (found) return found;
-        }}
-      }} catch (e) {{}}
-      return null;
-    }}
-
-    if (proc.windows.length === 0) {{
-      "ERROR: No windows found";
-    }} else {{
-      const elem = findElementRecursive(proc.windows[0], "{role}", "{name}", 0);
-      if (elem !== null) {{
-        elem.focused = true;
-        "success";
-      }} else {{
-        "ERROR: Element not found";
-      }}
-    }}
-    '''
 
+    elementsJson で作られたロケーター索引で要素を直接参照する（全ウィンドウが対象）。
+    応答の method は "index"（索引で参照）/ "rewalk"（索引の位置の周辺から再探索）/
+    "walk"（全ウィンドウを探索）のいずれか。
+    """
     try:
-        result = subprocess.run(
-            ['osascript', '-l', 'JavaScript', '-e', jxa_script],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        output = result.stdout.strip()
-        if output == "success":
-            return {"status": "success"}
-        else:
-            return {"status": "error", "message": output}
+        located = _locate_element(app_name, role, name, "focus")
+        if located["status"] != "success":
+            return located
+        return {"status": "success", "frame": located["frame"], "method": located["method"]}
     except subprocess.TimeoutExpired:
         return {"status": "error", "message": "フォーカス操作がタイムアウトしました（5秒以上）"}
     except Exception as e:
@@ -309,6 +370,7 @@ def type_to_element(app_name, role, name, text):
     if focus_result["status"] != "success":
         return focus_result
 
-    # テキスト入力
+    # テキスト入力（入力系の依存は使うときだけ読み込む）
+    from actions.mouse_keyboard import type_text
     time.sleep(0.2)
-    return _type_text(text=text)
+    return type_text(text)
@@ -1,78 +1,171 @@
-"""Web要素の取得と操作（ブラウザ内）"""
+"""Web要素の取得と操作（ブラウザ内）
+
+AXWebArea はウィンドウから上限つきの幅優先探索で探し、見つけた位置（uiElements の
+添字の列）をウィンドウごとに記憶する。次回以降は記憶した位置の role を確認するだけで済む。
+
+要素の一覧は AXWebArea 配下を深さ優先の前順でたどり、chunk_size 件ずつ取得する。
+未探索の位置（frontier）はサーバー側に保持し、応答の next_cursor で続きを取得できる。
+パイプラインモード（IDつきコマンド）で stream=True の場合、各チャンクは
+{"id", "partial": true, "seq", "elements": [...]} の行として先に書き出される。
+
+ページの取得を繰り返す処理には全体の締め切り（deadline_ms）があり、巨大なDOMや
+変化し続けるDOMでもブリッジのタイムアウトより先に応答する。締め切りに達した場合は
+それまでの要素と next_cursor を返す。
+"""
 import subprocess
 import json
 import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from actions.ax_scripts import BUNDLE_APP_NAME_SCRIPT, WEB_ELEMENTS_PAGE_SCRIPT
+from utils.display_geometry import get_display_geometry
+from utils.input_engine import get_input_engine
+from utils.request_scheduler import emit_partial
+from utils.script_cache import run_template
+
+# 1回のスクリプト実行で properties() を取得する要素数の上限
+MAX_VISITS_PER_PAGE = 400
+MAX_CURSORS = 16
+# 1ページの取得のタイムアウト（秒）
+PAGE_TIMEOUT = 10
+# 全体の締め切りの既定値（ミリ秒）。ブリッジの既定のタイムアウト（30秒）より短くする
+DEFAULT_DEADLINE_MS = 20000
+DEFAULT_CLICK_DEADLINE_MS = 15000
+
+# {アプリ名: {ウィンドウ名: AXWebArea のパス}}
+_web_areas = {}
+# {cursor: 続きの取得に必要な状態}（古いものから破棄する）
+_cursors = OrderedDict()
+_lock = threading.Lock()
+
+
+def _fetch_page(state, limit, timeout):
+    """AXWebArea 配下を state["frontier"] から最大 limit 件たどり、state を進める"""
+    with _lock:
+        known = dict(_web_areas.get(state["app_name"], {}))
+    args = {**state, "known": known, "limit": limit, "max_visits": MAX_VISITS_PER_PAGE}
+    result = run_template(WEB_ELEMENTS_PAGE_SCRIPT, args, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    data = json.loads(result.stdout.strip())
+    if "error" in data:
+        return data
+    web_area = data["web_area"]
+    with _lock:
+        _web_areas.setdefault(state["app_name"], {})[web_area["window_name"]] = web_area["path"]
+    # 続きは同じウィンドウから取得する
+    state["window"] = web_area["window_name"]
+    state["frontier"] = data["frontier"]
+    return data
+
+
+def _page_timeout(deadline, limit=PAGE_TIMEOUT):
+    """締め切りまでの残り時間に合わせた1ページのタイムアウト（秒、最低1秒）"""
+    return max(1.0, min(limit, deadline - time.monotonic()))
+
+
+def _save_cursor(state):
+    cursor = uuid.uuid4().hex[:16]
+    with _lock:
+        _cursors[cursor] = state
+        while len(_cursors) > MAX_CURSORS:
+            _cursors.popitem(last=False)
+    return cursor
 
 
-def get_web_elements(app_name):
+def get_web_elements(app_name, cursor=None, limit=200, chunk_size=50, stream=False,
+                     roles=None, exclude_roles=None, visible_only=True, window=None,
+                     deadline_ms=DEFAULT_DEADLINE_MS):
     """
     ブラウザ内のWeb要素を取得（AXWebArea配下）
+
+    Args:
+        cursor: 前回の応答の next_cursor。指定した場合は同じ条件で続きを返す
+                （他の条件の引数は無視される）
+        limit: この応答で返す要素数の上限
+        chunk_size: 1回のスクリプト実行で取得する要素数（stream 時のチャンクの大きさ）
+        stream: パイプラインモードでチャンクごとに途中結果を書き出す
+                （書き出した要素は最終応答の ui_data には含まれない）
+        roles: 返す要素の role の一覧
+        exclude_roles: 子孫ごと除外する role の一覧
+        visible_only: 画面と AXWebArea の表示範囲の外にある要素を子孫ごと除外する
+        window: 対象ウィンドウ名（省略時は最前面のウィンドウ）
+        deadline_ms: 全体の締め切り（ミリ秒）。達した場合はそれまでの要素と next_cursor を返す
+
+    Returns:
+        dict: ui_data.elements と count（返した要素数、stream 分を含む）、streamed（途中結果で
+              返した要素数）、visited、complete（最後までたどったか）、next_cursor（続きが
+              無ければ None）、deadline_reached（締め切りで打ち切った場合のみ True）
     """
-    jxa_script = f'''
-    const se = Application("System Events");
-    const proc = se.processes["{app_name}"];
-
-    function findWebArea(root) {{
-      try {{
-        const elements = root.entireContents();
-        for (let i = 0; i < elements.length; i++) {{
-          try {{
-            if (elements[i].role() === "AXWebArea") {{
-              return elements[i];
-            }}
-          }} catch (e) {{}}
-        }}
-      }} catch (e) {{}}
-      return null;
-    }}
-
-    if (proc.windows.length === 0) {{
-      JSON.stringify({{ error: "No windows found" }});
-    }} else {{
-      const webArea = findWebArea(proc.windows[0]);
-      if (webArea !== null) {{
-        const webElements = webArea.entireContents();
-        const result = [];
-
-        for (let i = 0; i < Math.min(webElements.length, 100); i++) {{
-          try {{
-            const elem = webElements[i];
-            const props = elem.properties();
-            result.push({{
-              role: props.role,
-              name: props.name || props.title || "",
-              value: props.value || "",
-              description: props.description || "",
-              position: props.position ? [props.position[0], props.position[1]] : [0, 0],
-              size: props.size ? [props.size[0], props.size[1]] : [0, 0]
-            }});
-          }} catch (e) {{}}
-        }}
-
-        JSON.stringify({{ elements: result }});
-      }} else {{
-        JSON.stringify({{ error: "AXWebArea not found" }});
-      }}
-    }}
-    '''
+    if cursor is not None:
+        with _lock:
+            state = _cursors.pop(cursor, None)
+        if state is None:
+            return {"status": "error", "message": f"cursor が無効か期限切れです: {cursor}"}
+    else:
+        state = {"app_name": app_name, "window": window, "frontier": None,
+                 "roles": roles, "exclude_roles": exclude_roles, "viewport": None}
+        if visible_only:
+            geometry = get_display_geometry()
+            state["viewport"] = [0, 0, geometry.width, geometry.height]
 
+    deadline = time.monotonic() + deadline_ms / 1000
+    elements = []
+    count = 0
+    streamed = 0
+    visited = 0
+    deadline_reached = False
+    pages = 0
     try:
-        result = subprocess.run(
-            ['osascript', '-l', 'JavaScript', '-e', jxa_script],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            data = json.loads(result.stdout.strip())
-            return {"status": "success", "ui_data": data}
-        else:
-            return {"status": "error", "message": result.stderr.strip()}
+        while count < limit:
+            if pages and time.monotonic() >= deadline:
+                deadline_reached = True
+                break
+            try:
+                data = _fetch_page(state, min(chunk_size, limit - count),
+                                   timeout=_page_timeout(deadline))
+            except subprocess.TimeoutExpired:
+                if not pages:
+                    raise
+                # 取得済みの要素を返し、失敗したページは next_cursor から取得し直せるようにする
+                deadline_reached = True
+                break
+            pages += 1
+            if "error" in data:
+                if count == 0 and cursor is None:
+                    return {"status": "success", "ui_data": data}
+                return {"status": "error", "message": data["error"]}
+            chunk = data["elements"]
+            visited += data["visited"]
+            count += len(chunk)
+            if chunk and stream and emit_partial({"elements": chunk}):
+                streamed += len(chunk)
+            else:
+                elements.extend(chunk)
+            if not state["frontier"]:
+                break
     except subprocess.TimeoutExpired:
-        return {"status": "error", "message": "Web要素取得がタイムアウトしました（10秒以上）"}
+        return {"status": "error", "message": "Web要素取得がタイムアウトしました"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+    complete = not state["frontier"]
+    result = {
+        "status": "success",
+        "ui_data": {"elements": elements},
+        "count": count,
+        "streamed": streamed,
+        "visited": visited,
+        "complete": complete,
+        "next_cursor": None if complete else _save_cursor(state),
+    }
+    if deadline_reached:
+        result["deadline_reached"] = True
+    return result
+
 
 def get_default_browser():
     """
@@ -113,10 +206,9 @@ def get_default_browser():
     browser_name = None
 
     # Bundle IDからアプリ名を取得（Finder経由）
-    osa_cmd = f'tell application "Finder" to get name of (application file id "{bundle_id}")'
     try:
-        browser_name = subprocess.check_output(
-            ['osascript', '-e', osa_cmd], text=True).strip()
+        result = run_template(BUNDLE_APP_NAME_SCRIPT, [bundle_id], timeout=5)
+        browser_name = result.stdout.strip() if result.returncode == 0 else None
     except Exception:
         browser_name = None
 
@@ -162,91 +254,33 @@ def get_default_browser():
     }
 
 
-def click_web_element(app_name, role, name):
+def click_web_element(app_name, role, name, deadline_ms=DEFAULT_CLICK_DEADLINE_MS):
     """
     ブラウザ内のWeb要素をクリック
-    """
-    jxa_script = f'''
-    const se = Application("System Events");
-    const proc = se.processes["{app_name}"];
-
-    function findWebArea(root) {{
-      try {{
-        const elements = root.entireContents();
-        for (let i = 0; i < elements.length; i++) {{
-          try {{
-            if (elements[i].role() === "AXWebArea") {{
-              return elements[i];
-            }}
-          }} catch (e) {{}}
-        }}
-      }} catch (e) {{}}
-      return null;
-    }}
-
-    function findElement(root, role, name) {{
-      try {{
-        const elements = root.entireContents();
-        for (let i = 0; i < elements.length; i++) {{
-          const elem = elements[i];
-          try {{
-            const props = elem.properties();
-            if (props.role === role && (props.name === name || props.title === name)) {{
-              return elem;
-            }}
-          }} catch (e) {{}}
-        }}
-      }} catch (e) {{}}
-      return null;
-    }}
-
-    if (proc.windows.length === 0) {{
-      "ERROR: No windows found";
-    }} else {{
-      const webArea = findWebArea(proc.windows[0]);
-      if (webArea !== null) {{
-        const elem = findElement(webArea, "{role}", "{name}");
-        if (elem !== null) {{
-          const props = elem.properties();
-          const pos = props.position;
-          const size = props.size;
-          JSON.stringify({{
-            status: "success",
-            x: pos[0] + size[0] / 2,
-            y: pos[1] + size[1] / 2
-          }});
-        }} else {{
-          "ERROR: Element not found";
-        }}
-      }} else {{
-        "ERROR: AXWebArea not found";
-      }}
-    }}
-    '''
 
+    get_web_elements と同じページ単位の探索で、最初に見つかった要素の中心をクリックする。
+    deadline_ms（ミリ秒）までに見つからなければ探索を打ち切る。
+    """
+    deadline = time.monotonic() + deadline_ms / 1000
     try:
-        import pyautogui
-        
-        result = subprocess.run(
-            ['osascript', '-l', 'JavaScript', '-e', jxa_script],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        output = result.stdout.strip()
-        
-        if output.startswith("{"):
-            data = json.loads(output)
-            if data.get("status") == "success":
-                pyautogui.click(x=data["x"], y=data["y"], duration=0.5,
-                                tween=pyautogui.easeInOutQuad)
+        state = {"app_name": app_name, "window": None, "frontier": None,
+                 "roles": [role], "exclude_roles": None, "viewport": None, "name": name}
+        while True:
+            if time.monotonic() >= deadline:
+                return {"status": "error",
+                        "message": f"ERROR: Element not found within {deadline_ms}ms"}
+            data = _fetch_page(state, 1, timeout=_page_timeout(deadline, 5))
+            if "error" in data:
+                return {"status": "error", "message": f"ERROR: {data['error']}"}
+            if data["elements"]:
+                elem = data["elements"][0]
+                x = elem["position"][0] + elem["size"][0] / 2
+                y = elem["position"][1] + elem["size"][1] / 2
+                get_input_engine().click(x, y)
                 return {"status": "success"}
-        
-        if output == "success":
-            return {"status": "success"}
-        else:
-            return {"status": "error", "message": output}
+            if not state["frontier"]:
+                return {"status": "error", "message": "ERROR: Element not found"}
     except subprocess.TimeoutExpired:
-        return {"status": "error", "message": "Web要素クリックがタイムアウトしました（5秒以上）"}
+        return {"status": "error", "message": "Web要素クリックがタイムアウトしました"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
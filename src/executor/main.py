@@ -22,17 +22,36 @@ DEBUG_MODE = os.environ.get("MIKI_DEBUG") == "1"
 if DEBUG_MODE:
     print("[Executor] Debug mode enabled", file=sys.stderr, flush=True)
 
-from actions.screenshot import screenshot, get_screen_size
+from actions.screenshot import (
+    screenshot, screenshot_delta, screenshot_region, get_screen_size, refresh_display,
+    wait_for_stable
+)
 from actions.mouse_keyboard import (
     click, type_text, press_key, hotkey,
-    mouse_move, scroll, drag, set_cursor_visibility
+    mouse_move, scroll, drag, set_cursor_visibility, set_speed_profile
 )
 from actions.applescript import run_osa
+from actions.batch import run_batch
+from actions.observe import observe, shutdown_observe_pool
 from actions.ui_elements import (
-    get_ui_elements, get_ui_elements_json,
-    focus_element
+    get_ui_elements, get_ui_elements_json, get_ui_elements_json_delta,
+    focus_element, find_elements, wait_for_element
 )
 from actions.web_elements import get_web_elements, get_default_browser
+from utils.request_scheduler import (
+    RequestScheduler, ResponseWriter, SERIAL_ACTIONS, in_parallel_lane
+)
+from utils.frame_grabber import (
+    start_frame_grabber, stop_frame_grabber, mark_action_end
+)
+from utils.frame_transport import set_transport, get_frame_transport
+from utils.osa_host import close_script_pool
+from utils.script_cache import get_script_cache_stats
+from utils.ax_cache import clear_elements_cache, invalidate_for_input
+from utils.text_entry import get_text_entry
+from utils.input_queue import (
+    COALESCABLE_ACTIONS, InputQueue, attach_flush, coalescing_enabled
+)
 
 # 安全装置: マウスを画面の隅に移動させるとプログラムが停止する
 pyautogui.FAILSAFE = True
@@ -40,6 +59,10 @@ pyautogui.FAILSAFE = True
 
 ACTION_HANDLERS = {
     "screenshot": screenshot,
+    "screenshotDelta": screenshot_delta,
+    "screenshotRegion": screenshot_region,
+    "waitForStable": wait_for_stable,
+    "observe": observe,
     "click": click,
     "type": type_text,
     "press": press_key,
@@ -48,25 +71,69 @@ ACTION_HANDLERS = {
     "scroll": scroll,
     "drag": drag,
     "setCursorVisibility": set_cursor_visibility,
+    "setSpeedProfile": set_speed_profile,
     "osa": run_osa,
     "elements": get_ui_elements,
     "elementsJson": get_ui_elements_json,
+    "elementsJsonDelta": get_ui_elements_json_delta,
+    "clearElementsCache": clear_elements_cache,
     "focusElement": focus_element,
+    "findElements": find_elements,
+    "waitForElement": wait_for_element,
     "webElements": get_web_elements,
     "browser": get_default_browser,
+    "scriptCacheStats": get_script_cache_stats,
     "size": get_screen_size,
+    "refreshDisplay": refresh_display,
+    "setTransport": set_transport,
+    "startFrameGrabber": start_frame_grabber,
+    "stopFrameGrabber": stop_frame_grabber,
 }
 
 
+def _run_handler(action, params):
+    """ハンドラーを実行し、入力アクションの後処理を行う"""
+    result = ACTION_HANDLERS[action](**params)
+    if action in SERIAL_ACTIONS:
+        # フレームグラバーが「操作後のフレーム」を判定するための基準時刻
+        mark_action_end()
+        # 操作対象アプリのアクセシビリティツリーのキャッシュは古くなる
+        invalidate_for_input(params)
+    return result
+
+
+# 連続した move / scroll を合体させるキュー（utils/input_queue.py）
+input_queue = InputQueue(_run_handler) if coalescing_enabled() else None
+
+
+def flush_input():
+    """合体待ちの move / scroll を実行し、その結果とキューの統計を返す（flushInput アクション）"""
+    flushed = input_queue.flush() if input_queue is not None else None
+    stats = input_queue.stats() if input_queue is not None else {}
+    last_flush = input_queue.last_flush if input_queue is not None else None
+    result = attach_flush({"status": "success", "last_flush": last_flush, **stats}, flushed)
+    result.setdefault("input_flush", None)
+    return result
+
+
 def dispatch_action(action, params):
-    """アクションをディスパッチして実行する"""
+    """アクションをディスパッチして実行する
+
+    move / scroll は合体キューに入れ、直列レーン上の他のアクションの前にキューを実行する。
+    並行プールで実行中の読み取り専用アクションからはキューを実行しない（入力の順序を保つため）。
+    """
     if DEBUG_MODE:
         params_preview = str(params)[:200] if params else "{}"
         print(f"[Executor] Dispatching action: {action}, params: {params_preview}...", file=sys.stderr, flush=True)
     
-    handler = ACTION_HANDLERS.get(action)
-    if handler:
-        result = handler(**params)
+    if action in ACTION_HANDLERS:
+        if input_queue is not None and action in COALESCABLE_ACTIONS:
+            result = input_queue.enqueue(action, params)
+        elif input_queue is not None and action != "flushInput" and not in_parallel_lane():
+            flushed = input_queue.flush()
+            result = attach_flush(_run_handler(action, params), flushed)
+        else:
+            result = _run_handler(action, params)
         if DEBUG_MODE:
             result_preview = str(result)[:200] if result else "{}"
             print(f"[Executor] Action {action} completed: {result_preview}...", file=sys.stderr, flush=True)
@@ -75,44 +142,85 @@ def dispatch_action(action, params):
         return {"status": "error", "message": f"Unknown action: {action}"}
 
 
+def batch(steps, **options):
+    """複数のアクションを1回の往復で順に実行する（actions/batch.py 参照）"""
+    return run_batch(dispatch_action, steps, **options)
+
+
+ACTION_HANDLERS["batch"] = batch
+ACTION_HANDLERS["flushInput"] = flush_input
+
+
+def execute_command(action, params):
+    """アクションを実行し、実行時間を付与した結果を返す（例外はエラー応答に変換する）"""
+    try:
+        start_time = time.time()
+        result = dispatch_action(action, params)
+
+        end_time = time.time()
+        execution_time = int((end_time - start_time) * 1000)
+        result["execution_time_ms"] = execution_time
+
+        if DEBUG_MODE:
+            print(f"[Executor] Total execution time: {execution_time}ms", file=sys.stderr, flush=True)
+        return result
+    except Exception as e:
+        if DEBUG_MODE:
+            print(f"[Executor] Exception occurred: {e}", file=sys.stderr, flush=True)
+            print(f"[Executor] Traceback:\n{traceback.format_exc()}", file=sys.stderr, flush=True)
+        return {"status": "error", "message": str(e)}
+
+
 def main():
-    """メインループ: 標準入力からコマンドを読み取り、実行し、結果を返す"""
+    """メインループ: 標準入力からコマンドを読み取り、実行し、結果を返す
+
+    "id" を含むコマンドはパイプラインモードで処理され、応答は同じ "id" つきで
+    完了順に返される。"id" を含まないコマンドは従来通り逐次実行（FIFO）される。
+    """
     if DEBUG_MODE:
         print("[Executor] Starting main loop", file=sys.stderr, flush=True)
-    
-    while True:
-        line = sys.stdin.readline()
-        if not line:
-            break
 
-        try:
-            start_time = time.time()
-            command_data = json.loads(line)
-            action = command_data.get("action")
-            params = command_data.get("params", {})
+    writer = ResponseWriter()
+    scheduler = RequestScheduler(execute_command, writer)
+
+    try:
+        while True:
+            line = sys.stdin.readline()
+            if not line:
+                break
+
+            request_id = None
+            try:
+                command_data = json.loads(line)
+                request_id = command_data.get("id")
+                action = command_data.get("action")
+                params = command_data.get("params", {})
+            except Exception as e:
+                if DEBUG_MODE:
+                    print(f"[Executor] Invalid command: {e}", file=sys.stderr, flush=True)
+                writer.write({"status": "error", "message": str(e)})
+                continue
 
             if action == "exit":
                 if DEBUG_MODE:
                     print("[Executor] Exit command received", file=sys.stderr, flush=True)
                 break
 
-            result = dispatch_action(action, params)
-
-            end_time = time.time()
-            execution_time = int((end_time - start_time) * 1000)
-            result["execution_time_ms"] = execution_time
-            
-            if DEBUG_MODE:
-                print(f"[Executor] Total execution time: {execution_time}ms", file=sys.stderr, flush=True)
-
-            print(json.dumps(result, ensure_ascii=False))
-            sys.stdout.flush()
-        except Exception as e:
-            if DEBUG_MODE:
-                print(f"[Executor] Exception occurred: {e}", file=sys.stderr, flush=True)
-                print(f"[Executor] Traceback:\n{traceback.format_exc()}", file=sys.stderr, flush=True)
-            print(json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False))
-            sys.stdout.flush()
+            if request_id is not None:
+                scheduler.submit(request_id, action, params)
+            else:
+                writer.write(execute_command(action, params))
+    finally:
+        scheduler.shutdown()
+        if input_queue is not None:
+            input_queue.flush()
+        stop_frame_grabber()
+        shutdown_observe_pool()
+        close_script_pool()
+        # 終了前に入力前のクリップボードの内容を戻す
+        get_text_entry().flush()
+        # 専用ディレクトリはプロセス終了時に削除される（utils/frame_transport.py）
+        get_frame_transport().close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,9 @@
+"""Executor のテスト設定
+
+アクション・ユーティリティは src/executor を起点に import されるため（main.py と同じ）、
+そのディレクトリを sys.path に加える。macOS 専用の依存（Quartz / pyautogui）は読み込まない。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
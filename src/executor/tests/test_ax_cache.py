@@ -0,0 +1,51 @@
+from utils import ax_cache
+from utils.ax_cache import AXSnapshotCache, app_window_state
+
+KEY = AXSnapshotCache.make_key("Finder", depth=3)
+
+
+def test_entry_is_served_until_the_ttl():
+    cache = AXSnapshotCache(ttl=60)
+    cache.put(KEY, "tree", screen_fingerprint="a", windows=((1, (0, 0, 800, 600)),))
+    data, age = cache.get(KEY, "a", ((1, (0, 0, 800, 600)),))
+    assert data == "tree"
+    assert cache.get(KEY, "a", None, max_age=-1) is None
+    assert cache.invalidations["ttl"] == 1
+
+
+def test_screen_change_invalidates():
+    cache = AXSnapshotCache(ttl=60)
+    cache.put(KEY, "tree", screen_fingerprint="a")
+    assert cache.get(KEY, screen_fingerprint="b") is None
+    assert cache.invalidations["screen"] == 1
+
+
+def test_window_list_change_invalidates_without_a_screenshot():
+    cache = AXSnapshotCache(ttl=60)
+    cache.put(KEY, "tree", windows=((1, (0, 0, 800, 600)),))
+    # 画面の指紋が分からなくても、ウィンドウのリサイズや新しいウィンドウで破棄する
+    assert cache.get(KEY, None, ((1, (0, 0, 800, 700)),)) is None
+    cache.put(KEY, "tree", windows=((1, (0, 0, 800, 600)),))
+    assert cache.get(KEY, None, ((2, (10, 10, 300, 200)), (1, (0, 0, 800, 600)))) is None
+    assert cache.invalidations["window"] == 2
+
+
+def test_app_window_state_reads_only_the_window_list(monkeypatch):
+    monkeypatch.setattr(ax_cache, "_on_screen_windows", lambda: [
+        ("Safari", 7, (0, 0, 100, 100)),
+        ("Finder", 3, (5, 5, 800, 600)),
+        ("Finder", 4, (50, 50, 400, 300)),
+    ])
+    assert app_window_state("Finder") == ((3, (5, 5, 800, 600)), (4, (50, 50, 400, 300)))
+    assert app_window_state("Mail") == ()
+    monkeypatch.setattr(ax_cache, "_on_screen_windows", lambda: None)
+    assert app_window_state("Finder") is None
+
+
+def test_input_invalidates_the_target_app(monkeypatch):
+    cache = AXSnapshotCache(ttl=60)
+    monkeypatch.setattr(ax_cache, "_cache", cache)
+    cache.put(AXSnapshotCache.make_key("Finder"), "tree")
+    cache.put(AXSnapshotCache.make_key("Safari"), "tree")
+    assert ax_cache.invalidate_for_input({"app_name": "Finder"}) == 1
+    assert len(cache) == 1
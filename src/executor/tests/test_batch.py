@@ -0,0 +1,95 @@
+from actions.batch import run_batch
+from utils.input_queue import COALESCABLE_ACTIONS, InputQueue, attach_flush
+
+
+class FakeDispatch:
+    """main.dispatch_action と同じく move / scroll を合体キューに入れ、他は記録して成功を返す"""
+
+    def __init__(self, fail=()):
+        self.executed = []
+        self.fail = set(fail)
+        self.queue = InputQueue(self._run)
+
+    def _run(self, action, params):
+        self.executed.append((action, params))
+        if action in self.fail:
+            return {"status": "error", "message": f"{action} failed"}
+        return {"status": "success"}
+
+    def __call__(self, action, params):
+        if action in COALESCABLE_ACTIONS:
+            return self.queue.enqueue(action, params)
+        if action == "flushInput":
+            return attach_flush({"status": "success"}, self.queue.flush())
+        flushed = self.queue.flush()
+        return attach_flush(self._run(action, params), flushed)
+
+
+def test_steps_run_in_order_with_one_final_screenshot():
+    dispatch = FakeDispatch()
+    result = run_batch(dispatch, [
+        {"action": "click", "params": {"x": 1, "y": 2}},
+        {"action": "type", "params": {"text": "hi"}},
+        {"action": "press", "params": {"key": "enter"}},
+    ], screenshot=True)
+
+    assert result["status"] == "success"
+    assert result["completed"] == 3
+    assert [step["action"] for step in result["steps"]] == ["click", "type", "press"]
+    assert all("elapsed_ms" in step for step in result["steps"])
+    assert dispatch.executed[-1] == ("screenshot", {"after": "last_action"})
+
+
+def test_stop_on_error_skips_the_remaining_steps():
+    dispatch = FakeDispatch(fail={"type"})
+    steps = [{"action": "click", "params": {}}, {"action": "type", "params": {}},
+             {"action": "press", "params": {}}]
+
+    stopped = run_batch(dispatch, steps)
+    assert stopped["status"] == "error"
+    assert stopped["failed_step"] == 1
+    assert stopped["completed"] == 2
+    assert "type failed" in stopped["message"]
+
+    continued = run_batch(FakeDispatch(fail={"type"}), steps, stop_on_error=False)
+    assert continued["completed"] == 3
+    assert continued["failed_step"] == 1
+
+
+def test_nested_batch_is_rejected():
+    result = run_batch(FakeDispatch(), [{"action": "batch", "params": {"steps": []}}])
+    assert result["status"] == "error"
+    assert result["failed_step"] == 0
+
+
+def test_adjacent_moves_are_coalesced():
+    dispatch = FakeDispatch()
+    result = run_batch(dispatch, [
+        {"action": "move", "params": {"x": 1, "y": 1}},
+        {"action": "move", "params": {"x": 2, "y": 2}},
+        {"action": "move", "params": {"x": 3, "y": 3}},
+        {"action": "click", "params": {"x": 3, "y": 3}},
+    ])
+    assert result["status"] == "success"
+    assert result["coalesced"] == 2
+    assert dispatch.executed == [("move", {"x": 3, "y": 3}), ("click", {"x": 3, "y": 3})]
+
+
+def test_failed_trailing_move_fails_the_batch():
+    result = run_batch(FakeDispatch(fail={"move"}), [
+        {"action": "click", "params": {}},
+        {"action": "move", "params": {"x": 1, "y": 1}},
+    ])
+    assert result["status"] == "error"
+    assert result["failed_step"] == 1
+
+
+def test_wait_for_stable_takes_the_settled_frame(monkeypatch):
+    monkeypatch.setattr("actions.batch.wait_until_stable",
+                        lambda **options: {"stable": True, "waited_ms": 0, "samples": 1})
+    dispatch = FakeDispatch()
+    result = run_batch(dispatch, [{"action": "click", "params": {}}, {"action": "press", "params": {}}],
+                       wait_for_stable={"stable_ms": 100}, screenshot=True)
+
+    assert result["steps"][0]["settle"]["stable"] is True
+    assert dispatch.executed[-1] == ("waitForStable", {"stable_ms": 100})
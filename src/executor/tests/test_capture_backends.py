@@ -0,0 +1,46 @@
+import pytest
+from PIL import Image
+
+from utils import capture_backends
+from utils.capture_backends import (
+    FakeCaptureBackend,
+    PyAutoGUICaptureBackend,
+    create_capture_backend,
+)
+
+
+def test_backend_is_selected_from_the_environment(monkeypatch):
+    monkeypatch.setenv("MIKI_CAPTURE_BACKEND", "fake")
+    assert isinstance(create_capture_backend(), FakeCaptureBackend)
+    assert isinstance(create_capture_backend("PyAutoGUI"), PyAutoGUICaptureBackend)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_capture_backend("screencapture")
+
+
+def test_auto_falls_back_to_pyautogui_off_macos(monkeypatch):
+    monkeypatch.delenv("MIKI_CAPTURE_BACKEND", raising=False)
+    monkeypatch.setattr(capture_backends.sys, "platform", "linux")
+    assert isinstance(create_capture_backend(), PyAutoGUICaptureBackend)
+
+
+def test_fake_frames_are_physical_resolution():
+    backend = FakeCaptureBackend(width=320, height=200, scale=2)
+    frame = backend.grab()
+    assert frame.mode == "RGB"
+    assert frame.size == (640, 400) == backend.physical_size()
+    assert backend.logical_size() == (320, 200)
+
+
+def test_default_region_grab_crops_in_physical_pixels():
+    backend = FakeCaptureBackend(width=320, height=200, scale=2)
+    frame = Image.new("RGB", (640, 400), (0, 0, 0))
+    frame.paste((255, 0, 0), (20, 40, 120, 140))
+    backend.set_frame(frame)
+
+    region = backend.grab_region(10, 20, 50, 50)
+    assert region.size == (100, 100)
+    assert region.getpixel((0, 0)) == (255, 0, 0)
+    assert region.getpixel((99, 99)) == (255, 0, 0)
@@ -0,0 +1,55 @@
+import pytest
+from PIL import Image
+
+from actions.screenshot import get_screen_size, screenshot
+from utils import capture_backends
+from utils.capture_backends import FakeCaptureBackend, set_capture_backend
+from utils.display_geometry import get_display_geometry, invalidate_display_geometry
+
+
+class CountingBackend(FakeCaptureBackend):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.size_queries = 0
+
+    def logical_size(self):
+        self.size_queries += 1
+        return super().logical_size()
+
+
+@pytest.fixture
+def backend():
+    previous = capture_backends._backend
+    backend = CountingBackend(width=320, height=200, scale=2)
+    set_capture_backend(backend)
+    invalidate_display_geometry()
+    yield backend
+    set_capture_backend(previous)
+    invalidate_display_geometry()
+
+
+def test_geometry_is_computed_once_without_capturing(backend):
+    first = get_display_geometry()
+    second = get_screen_size()
+    assert (first.width, first.height, first.scale_x) == (320, 200, 2.0)
+    assert second["scale"] == 2.0
+    assert backend.size_queries == 1
+    assert backend.grab_count == 0
+
+
+def test_refresh_recomputes(backend):
+    get_display_geometry()
+    backend.width, backend.height = 160, 100
+    assert get_screen_size()["width"] == 320
+    assert get_screen_size(refresh=True)["width"] == 160
+    assert backend.size_queries == 2
+
+
+def test_capture_with_a_new_size_invalidates_the_cache(backend):
+    get_display_geometry()
+    # 解像度の変更で物理サイズが変わったフレームが届く
+    backend.scale = 1
+    backend.set_frame(Image.new("RGB", (320, 200), (0, 0, 0)))
+    screenshot(dedupe=False)
+    assert get_display_geometry().scale_x == 1.0
+    assert backend.size_queries >= 2
@@ -0,0 +1,47 @@
+import threading
+
+from PIL import Image
+
+from utils import frame_grabber
+from utils.frame_grabber import FrameGrabber, last_action_end, mark_action_end
+
+
+class GatedBackend:
+    """1回目のキャプチャを、テストが解放するまで完了させないバックエンド"""
+
+    def __init__(self):
+        self.first_started = threading.Event()
+        self.release = threading.Event()
+        self.grabs = 0
+
+    def grab(self):
+        self.grabs += 1
+        if self.grabs == 1:
+            self.first_started.set()
+            self.release.wait(2.0)
+        return Image.new("RGB", (8, 8))
+
+
+def test_capture_spanning_the_action_is_not_a_post_action_frame(monkeypatch):
+    backend = GatedBackend()
+    monkeypatch.setattr(frame_grabber, "get_capture_backend", lambda: backend)
+    monkeypatch.setattr(frame_grabber, "note_frame_size", lambda size: None)
+    grabber = FrameGrabber(fps=50)
+    grabber.start()
+    try:
+        assert backend.first_started.wait(2.0)
+        # キャプチャの途中で入力が完了し、その後にキャプチャが終わる
+        mark_action_end()
+        backend.release.set()
+
+        frame = grabber.wait_for_frame_after(last_action_end(), timeout=2.0)
+        assert frame is not None
+        assert frame.frame_id >= 2
+        assert frame.timestamp > last_action_end()
+    finally:
+        grabber.stop()
+
+
+def test_wait_for_frame_after_times_out_when_stopped():
+    grabber = FrameGrabber()
+    assert grabber.wait_for_frame_after(0.0, timeout=0.05) is None
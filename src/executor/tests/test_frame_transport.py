@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+from utils import frame_transport
+from utils.frame_transport import SLOT_HEADER, SharedMemoryTransport, set_transport, get_frame_transport
+
+
+def read_frame(ref, during_read=None):
+    """python-bridge.ts の resolveFrameRef と同じ手順で data_ref を読む"""
+    with open(ref["path"], "rb", buffering=0) as f:
+        def check_handle():
+            f.seek(ref["offset"] - SLOT_HEADER.size)
+            (handle,) = SLOT_HEADER.unpack(f.read(SLOT_HEADER.size))
+            if handle != ref["handle"]:
+                raise ValueError("overwritten")
+
+        check_handle()
+        f.seek(ref["offset"])
+        data = f.read(ref["length"])
+        if during_read is not None:
+            during_read()
+        check_handle()
+        return data
+
+
+@pytest.fixture
+def transport():
+    transport = SharedMemoryTransport(slot_size=64, slots=2)
+    yield transport
+    transport.close()
+
+
+def test_written_frame_can_be_read_back(transport):
+    ref = transport.encode(b"\xff\xd8frame")["data_ref"]
+    assert ref["offset"] % transport.slot_size == SLOT_HEADER.size
+    assert read_frame(ref) == b"\xff\xd8frame"
+
+
+def test_wrapped_slot_is_rejected(transport):
+    first = transport.encode(b"first")["data_ref"]
+    transport.encode(b"second")
+    third = transport.encode(b"third")["data_ref"]
+    assert third["offset"] == first["offset"]
+    with pytest.raises(ValueError):
+        read_frame(first)
+    assert read_frame(third) == b"third"
+
+
+def test_wrap_during_read_is_rejected(transport):
+    first = transport.encode(b"aaaaa")["data_ref"]
+
+    def wrap():
+        transport.encode(b"bbbbb")
+        transport.encode(b"ccccc")
+
+    with pytest.raises(ValueError):
+        read_frame(first, during_read=wrap)
+
+
+def test_oversized_frame_falls_back_to_base64(transport):
+    assert "data" in transport.encode(b"x" * 64)
+
+
+def test_files_live_in_a_private_directory(transport):
+    directory = os.path.dirname(transport.path)
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    named = SharedMemoryTransport(path="frames.bin", slot_size=64, slots=2)
+    try:
+        assert os.path.dirname(named.path) == directory
+    finally:
+        named.close()
+
+
+def test_set_transport_rejects_paths_outside_the_private_directory(tmp_path):
+    victim = tmp_path / "victim.txt"
+    victim.write_text("keep")
+    result = set_transport(mode="shm", path=str(victim))
+    assert result["status"] == "error"
+    assert victim.read_text() == "keep"
+    assert get_frame_transport().mode == "base64"
+
+
+@pytest.mark.parametrize("layout", [{"slots": 0}, {"slots": -1}, {"slot_size": SLOT_HEADER.size}])
+def test_set_transport_rejects_unusable_layouts(layout):
+    result = set_transport(mode="shm", **layout)
+    assert result["status"] == "error"
+    assert get_frame_transport().mode == "base64"
+
+
+def test_close_still_removes_the_file_when_the_map_cannot_close():
+    transport = SharedMemoryTransport(slot_size=64, slots=2)
+    view = memoryview(transport._map)
+    try:
+        with pytest.raises(BufferError):
+            transport.close()
+        assert not os.path.exists(transport.path)
+    finally:
+        view.release()
+        transport._map.close()
+
+
+def test_private_directory_is_removed_at_exit(transport):
+    directory = os.path.dirname(transport.path)
+    frame_transport._remove_frames_dir()
+    assert not os.path.exists(directory)
+    recreated = SharedMemoryTransport(slot_size=64, slots=2)
+    try:
+        assert os.path.isdir(os.path.dirname(recreated.path))
+    finally:
+        recreated.close()
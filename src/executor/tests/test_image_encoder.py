@@ -0,0 +1,35 @@
+import os
+
+from PIL import Image
+
+from utils.image_encoder import encode_screenshot, resize_for_target
+
+
+def noise(size):
+    # ランダムな画素は圧縮が効かず、予算に収めにくい
+    return Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3))
+
+
+def test_fits_budget_when_possible():
+    img = Image.new("RGB", (800, 600), (200, 200, 200))
+    result = encode_screenshot(img, quality=90, max_bytes=50_000)
+    assert len(result["data"]) <= 50_000
+    assert result["over_budget"] is False
+
+
+def test_unreachable_budget_is_flagged_with_the_smallest_attempt():
+    img = noise((400, 300))
+    unbounded = encode_screenshot(img, quality=90)
+    result = encode_screenshot(img, quality=90, max_bytes=200)
+    assert result["over_budget"] is True
+    assert len(result["data"]) < len(unbounded["data"])
+
+
+def test_no_budget_is_never_over_budget():
+    assert encode_screenshot(noise((64, 64)))["over_budget"] is False
+
+
+def test_resize_never_upscales():
+    img = Image.new("RGB", (100, 50))
+    assert resize_for_target(img, max_dimension=400) is img
+    assert resize_for_target(img, max_dimension=50).size == (50, 25)
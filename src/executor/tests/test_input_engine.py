@@ -0,0 +1,117 @@
+import sys
+import types
+
+import pytest
+
+from utils.input_backends import PyAutoGUIInputBackend, RecordingInputBackend
+from utils.input_engine import InputEngine, compute_path
+
+
+class FakeClock:
+    """time.monotonic と sleep を差し替えて、待機を実時間なしで記録する"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("utils.input_engine.time.monotonic", clock.monotonic)
+    monkeypatch.setattr("utils.input_backends.time.monotonic", clock.monotonic)
+    return clock
+
+
+def make_engine(clock, profile):
+    backend = RecordingInputBackend(cursor=(100, 100))
+    return InputEngine(backend=backend, profile=profile, sleep=clock.sleep), backend
+
+
+def test_path_ends_at_target_with_evenly_spaced_deadlines():
+    path = compute_path((0, 0), (100, 50), duration=0.1, rate=60)
+    assert len(path) == 6
+    assert path[-1][:2] == (100, 50)
+    assert [round(offset, 4) for _, _, offset in path] == [round(i / 60, 4) for i in range(6)]
+    xs = [x for x, _, _ in path]
+    assert xs == sorted(xs)
+
+
+def test_zero_duration_warps():
+    assert compute_path((0, 0), (10, 10), duration=0, rate=120) == [(10, 10, 0.0)]
+
+
+def test_instant_profile_sends_one_move_and_never_sleeps(clock):
+    engine, backend = make_engine(clock, "instant")
+    assert engine.click(300, 200) == 3
+    assert [event[0] for event in backend.events] == ["move", "down", "up"]
+    assert clock.sleeps == []
+
+
+def test_default_profile_paces_events_by_deadline(clock):
+    engine, backend = make_engine(clock, "default")
+    events = engine.move(400, 300)
+    moves = [event for event in backend.events if event[0] == "move"]
+    assert events == len(moves) == 6
+    assert moves[-1][1:3] == (400, 300)
+    timestamps = [event[-1] for event in moves]
+    assert [round(t - timestamps[0], 4) for t in timestamps] == [round(i / 60, 4) for i in range(6)]
+    # 最後の待機は操作後の PAUSE
+    assert clock.sleeps[-1] == pytest.approx(0.1)
+
+
+def test_humanlike_profile_takes_longer_than_default(clock):
+    engine, backend = make_engine(clock, "humanlike")
+    engine.move(400, 300)
+    assert len([event for event in backend.events if event[0] == "move"]) == 15
+
+
+def test_drag_moves_hold_the_button(clock):
+    engine, backend = make_engine(clock, "default")
+    engine.drag(100, 100, 500, 100)
+    kinds = [event[0] for event in backend.events]
+    assert kinds[0] == "move" and kinds.count("down") == 1 and kinds[-1] == "up"
+    down = kinds.index("down")
+    drag_moves = [event for event in backend.events[down + 1:-1]]
+    assert drag_moves and all(event[0] == "move" and event[3] == "left" for event in drag_moves)
+
+
+def test_failsafe_stops_input(clock):
+    engine, backend = make_engine(clock, "instant")
+    backend.cursor = (0, 0)
+    with pytest.raises(RuntimeError):
+        engine.click(10, 10)
+    assert backend.events == []
+
+
+def test_profile_overrides_are_validated(clock):
+    engine, _ = make_engine(clock, "default")
+    assert engine.set_profile("instant", {"EVENT_RATE": 30})["EVENT_RATE"] == 30
+    with pytest.raises(ValueError):
+        engine.set_profile("unknown")
+    with pytest.raises(ValueError):
+        engine.set_profile(overrides={"SPEED": 1})
+
+
+def test_pyautogui_backend_sends_drag_events_while_a_button_is_held(monkeypatch):
+    calls = []
+    fake = types.SimpleNamespace(
+        moveTo=lambda x, y, **kwargs: calls.append(("moveTo", x, y, kwargs)),
+        dragTo=lambda x, y, **kwargs: calls.append(("dragTo", x, y, kwargs)),
+    )
+    monkeypatch.setitem(sys.modules, "pyautogui", fake)
+    backend = PyAutoGUIInputBackend()
+
+    backend.move(10, 20)
+    backend.move(30, 40, "left")
+    assert calls[0][0] == "moveTo"
+    assert calls[1][:3] == ("dragTo", 30, 40)
+    assert calls[1][3]["button"] == "left"
+    assert calls[1][3]["mouseDownUp"] is False
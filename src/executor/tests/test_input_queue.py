@@ -0,0 +1,100 @@
+from utils.input_queue import InputQueue, attach_flush, coalescing_enabled
+from utils.request_scheduler import RequestScheduler, in_parallel_lane
+
+
+class Recorder:
+    def __init__(self, fail=None):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, action, params):
+        self.calls.append((action, params))
+        if self.fail == action:
+            raise RuntimeError("fail-safe triggered")
+        return {"status": "success"}
+
+
+def test_consecutive_moves_run_once_to_last_target():
+    recorder = Recorder()
+    queue = InputQueue(recorder)
+    for x in (10, 20, 30):
+        result = queue.enqueue("move", {"x": x, "y": 5})
+        assert result["queued"] is True
+    assert recorder.calls == []
+
+    flushed = queue.flush()
+    assert recorder.calls == [("move", {"x": 30, "y": 5})]
+    assert flushed["events"] == 3
+    assert flushed["coalesced"] == 2
+    assert queue.flush() is None
+
+
+def test_scroll_amounts_are_summed_and_kind_change_flushes():
+    recorder = Recorder()
+    queue = InputQueue(recorder)
+    queue.enqueue("scroll", {"amount": 3})
+    queue.enqueue("scroll", {"amount": -1})
+    result = queue.enqueue("move", {"x": 1, "y": 2})
+
+    assert recorder.calls == [("scroll", {"amount": 2})]
+    assert result["input_flush"]["action"] == "scroll"
+    assert result["pending"] == 1
+    assert queue.stats()["coalesced"] == 1
+
+
+def test_invalid_params_are_rejected_at_enqueue():
+    queue = InputQueue(Recorder())
+    assert queue.enqueue("scroll", {"amount": "x"})["status"] == "error"
+    assert queue.enqueue("move", {"x": 1})["status"] == "error"
+    assert queue.stats()["enqueued"] == 0
+
+
+def test_deferred_failure_fails_the_next_response():
+    queue = InputQueue(Recorder(fail="move"))
+    queue.enqueue("move", {"x": 0, "y": 0})
+
+    flushed = queue.flush()
+    assert flushed["status"] == "error"
+    result = attach_flush({"status": "success", "data": "..."}, flushed)
+    assert result["status"] == "error"
+    assert "fail-safe" in result["message"]
+    assert result["input_flush"] is flushed
+
+
+def test_failure_flushed_by_enqueue_fails_that_response():
+    queue = InputQueue(Recorder(fail="move"))
+    queue.enqueue("move", {"x": 0, "y": 0})
+    result = queue.enqueue("scroll", {"amount": 1})
+    assert result["status"] == "error"
+    assert result["input_flush"]["action"] == "move"
+
+
+def test_attach_flush_leaves_result_untouched_without_flush():
+    result = {"status": "success"}
+    assert attach_flush(result, None) is result
+
+
+def test_coalescing_is_opt_in(monkeypatch):
+    monkeypatch.delenv("MIKI_INPUT_COALESCE", raising=False)
+    assert coalescing_enabled() is False
+    monkeypatch.setenv("MIKI_INPUT_COALESCE", "1")
+    assert coalescing_enabled() is True
+
+
+def test_only_pool_lane_reports_parallel():
+    lanes = {}
+
+    def execute(action, params):
+        lanes[action] = in_parallel_lane()
+        return {"status": "success"}
+
+    class Writer:
+        def write(self, payload):
+            pass
+
+    scheduler = RequestScheduler(execute, Writer())
+    scheduler.submit(1, "move", {})
+    scheduler.submit(2, "screenshot", {})
+    scheduler.shutdown()
+    assert lanes == {"move": False, "screenshot": True}
+    assert in_parallel_lane() is False
@@ -0,0 +1,81 @@
+import json
+import time
+
+import pytest
+
+from actions import observe as observe_module
+from actions.observe import observe
+from utils import capture_backends
+from utils.capture_backends import FakeCaptureBackend, set_capture_backend
+from utils.osa_host import ScriptResult
+
+DELAY = 0.1
+
+
+@pytest.fixture
+def parts(monkeypatch):
+    previous = capture_backends._backend
+    backend = FakeCaptureBackend(width=320, height=200)
+    backend.cursor = (12, 34)
+    set_capture_backend(backend)
+    calls = {}
+
+    def screenshot(**options):
+        calls["frame"] = options
+        time.sleep(DELAY)
+        return {"status": "success", "data": "jpeg", "frame_id": 1}
+
+    def elements_json(app_name, max_depth=3, **options):
+        calls["tree"] = (app_name, max_depth, options)
+        time.sleep(DELAY)
+        return {"status": "success", "ui_data": {"windows": []}, "cached": False}
+
+    def run_template(template, args=None, timeout=None):
+        calls["focused"] = args
+        time.sleep(DELAY)
+        return ScriptResult(0, json.dumps({"focused": {"role": "AXTextField"}}), "")
+
+    monkeypatch.setattr(observe_module, "take_screenshot", screenshot)
+    monkeypatch.setattr(observe_module, "get_ui_elements_json", elements_json)
+    monkeypatch.setattr(observe_module, "run_template", run_template)
+    monkeypatch.setattr(observe_module, "frontmost_app", lambda: "Finder")
+    yield calls
+    set_capture_backend(previous)
+
+
+def test_parts_are_captured_concurrently(parts):
+    started = time.perf_counter()
+    result = observe(max_depth=2, screenshot={"quality": 70}, tree={"format": "columnar"})
+    elapsed = time.perf_counter() - started
+
+    assert result["status"] == "success"
+    assert result["app_name"] == "Finder"
+    assert result["screenshot"]["frame_id"] == 1
+    assert result["ui_data"] == {"windows": []}
+    assert result["mouse_position"] == {"x": 12, "y": 34}
+    assert result["focused_element"] == {"role": "AXTextField"}
+    assert "errors" not in result
+    assert elapsed < DELAY * 2.5
+    assert parts["frame"] == {"quality": 70}
+    assert parts["tree"] == ("Finder", 2, {"format": "columnar"})
+
+
+def test_failed_part_is_reported_without_failing_the_rest(parts, monkeypatch):
+    monkeypatch.setattr(observe_module, "get_ui_elements_json",
+                        lambda app_name, **options: {"status": "error", "message": "AX denied"})
+    result = observe(parts=["frame", "tree"])
+    assert result["status"] == "success"
+    assert result["errors"] == {"tree": "AX denied"}
+    assert "screenshot" in result
+
+
+def test_all_parts_failing_is_an_error(parts, monkeypatch):
+    monkeypatch.setattr(observe_module, "frontmost_app", lambda: None)
+    result = observe(parts=["tree", "focused"])
+    assert result["status"] == "error"
+    assert set(result["errors"]) == {"tree", "focused"}
+
+
+def test_unknown_parts_are_rejected(parts):
+    assert observe(parts=["audio"])["status"] == "error"
+    assert observe(parts=[])["status"] == "error"
@@ -0,0 +1,128 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from utils.osa_host import (
+    CallableScriptHost,
+    ProcessScriptHost,
+    ScriptHostPool,
+    ScriptHostUnavailable,
+)
+
+# osascript の代わりに JSON行プロトコルを話すホスト
+# script が "sleep" なら応答しない、"stale" なら前の id の応答を先に書く
+FAKE_HOST = r'''
+import json, sys, time
+print(json.dumps({"ready": True}), flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    script = request.get("script")
+    if script == "sleep":
+        time.sleep(30)
+    if script == "stale":
+        print(json.dumps({"id": request["id"] - 1, "ok": True, "output": "late"}), flush=True)
+    print(json.dumps({"id": request["id"], "ok": True, "output": "echo:" + str(script)}), flush=True)
+'''
+
+
+def fake_host():
+    return ProcessScriptHost(command=[sys.executable, "-c", FAKE_HOST])
+
+
+def test_process_host_round_trip():
+    host = fake_host()
+    try:
+        assert host.execute("hello").stdout == "echo:hello\n"
+    finally:
+        host.close()
+
+
+def test_stale_replies_are_discarded():
+    host = fake_host()
+    try:
+        host.execute("first")
+        assert host.execute("stale").stdout == "echo:stale\n"
+        assert host.execute("next").stdout == "echo:next\n"
+    finally:
+        host.close()
+
+
+def test_pool_restarts_a_host_after_a_timeout():
+    pool = ScriptHostPool(factory=fake_host, size=1)
+    try:
+        with pytest.raises(subprocess.TimeoutExpired):
+            pool.run("sleep", timeout=0.3)
+        assert pool.run("again").stdout == "echo:again\n"
+        assert pool.restarts == 1
+    finally:
+        pool.close()
+
+
+def test_waiting_for_a_busy_pool_counts_against_the_timeout():
+    release = threading.Event()
+    pool = ScriptHostPool(factory=lambda: CallableScriptHost(lambda script, language: release.wait(5)), size=1)
+    busy = threading.Thread(target=pool.run, args=("busy",))
+    busy.start()
+    try:
+        time.sleep(0.05)
+        started = time.monotonic()
+        with pytest.raises(subprocess.TimeoutExpired):
+            pool.run("queued", timeout=0.2)
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+        busy.join()
+    assert pool.run("after").returncode == 0
+
+
+def test_pool_recycles_hosts_after_max_requests():
+    hosts = []
+
+    def factory():
+        hosts.append(CallableScriptHost(lambda script, language: script))
+        return hosts[-1]
+
+    pool = ScriptHostPool(factory=factory, size=1, max_requests=2)
+    for _ in range(3):
+        pool.run("x")
+    assert len(hosts) == 2
+    assert pool.restarts == 1
+
+
+def test_failed_start_is_retried_after_a_cooldown():
+    attempts = []
+
+    def factory():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise ScriptHostUnavailable("busy")
+        return CallableScriptHost(lambda script, language: "ok")
+
+    pool = ScriptHostPool(factory=factory, size=1, retry_cooldown=0.1)
+    with pytest.raises(ScriptHostUnavailable):
+        pool.run("x")
+    # 待機中は起動を試みない
+    with pytest.raises(ScriptHostUnavailable):
+        pool.run("x")
+    assert len(attempts) == 1
+
+    time.sleep(0.15)
+    assert pool.run("x").stdout == "ok\n"
+    assert len(attempts) == 2
+
+
+def test_cooldown_grows_while_starts_keep_failing():
+    def factory():
+        raise ScriptHostUnavailable("busy")
+
+    pool = ScriptHostPool(factory=factory, size=1, retry_cooldown=10)
+    with pytest.raises(ScriptHostUnavailable):
+        pool.run("x")
+    first_wait = pool._retry_at - time.monotonic()
+    pool._retry_at = 0.0
+    with pytest.raises(ScriptHostUnavailable):
+        pool.run("x")
+    assert pool._retry_at - time.monotonic() > first_wait * 1.5
@@ -0,0 +1,152 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from actions import screenshot as screenshot_module
+from actions.screenshot import (
+    screenshot, screenshot_delta, screenshot_region, wait_for_stable, wait_until_stable
+)
+from utils import capture_backends
+from utils.capture_backends import FakeCaptureBackend, set_capture_backend
+from utils.display_geometry import invalidate_display_geometry
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    previous = capture_backends._backend
+    backend = FakeCaptureBackend(width=320, height=200, scale=2)
+    set_capture_backend(backend)
+    invalidate_display_geometry()
+    monkeypatch.setattr(screenshot_module, "_last_frames", {})
+    fingerprints = []
+    monkeypatch.setattr(screenshot_module, "note_screen_fingerprint", fingerprints.append)
+    backend.fingerprints = fingerprints
+    yield backend
+    set_capture_backend(previous)
+    invalidate_display_geometry()
+
+
+def test_unchanged_screen_is_not_resent(backend):
+    first = screenshot()
+    second = screenshot()
+    assert "data" in first
+    assert second["unchanged"] is True
+    assert second["frame_id"] == first["frame_id"]
+
+
+def test_changed_screen_is_resent(backend):
+    screenshot()
+    backend.set_frame(Image.new("RGB", (640, 400), (0, 0, 0)))
+    assert "data" in screenshot()
+
+
+def test_region_and_delta_do_not_mark_the_full_screen_as_sent(backend):
+    screenshot_region(0, 0, 100, 100)
+    screenshot_delta()
+    first = screenshot()
+    assert "data" in first
+    assert first.get("unchanged") is None
+
+
+def test_region_does_not_touch_the_screen_fingerprint(backend):
+    screenshot_region(0, 0, 100, 100, highlight_pos={"x": 10, "y": 10})
+    assert backend.fingerprints == []
+    screenshot(highlight_pos={"x": 10, "y": 10})
+    plain = screenshot(dedupe=False)
+    # ハイライトの有無に関わらず、記録されるのは描画前の全画面の指紋
+    assert len(backend.fingerprints) == 2
+    assert backend.fingerprints[0] == backend.fingerprints[1]
+    assert plain["frame_id"] > 0
+
+
+@pytest.mark.parametrize("zoom", [0, -1, 0.01, "large"])
+def test_region_rejects_unusable_zoom(backend, zoom):
+    result = screenshot_region(0, 0, 100, 100, zoom=zoom)
+    assert result["status"] == "error"
+
+
+def test_region_zoom_is_capped(backend):
+    result = screenshot_region(0, 0, 10, 10, zoom=100, format="png")
+    assert result["status"] == "success"
+    assert result["zoom"] == screenshot_module.MAX_REGION_ZOOM
+    assert result["image_width"] == 10 * 2 * screenshot_module.MAX_REGION_ZOOM
+
+
+class AnimatedBackend(FakeCaptureBackend):
+    """最初の frames 回のキャプチャだけ画面が変化し続けるバックエンド"""
+
+    def __init__(self, frames, **kwargs):
+        super().__init__(**kwargs)
+        self.frames = frames
+
+    def grab(self):
+        self.grab_count += 1
+        if self.frames is not None and self.grab_count > self.frames:
+            return Image.new("RGB", (self.width * self.scale, self.height * self.scale), (200, 200, 200))
+        shade = 255 if self.grab_count % 2 else 0
+        return Image.new("RGB", (self.width * self.scale, self.height * self.scale), (shade, shade, shade))
+
+
+def test_wait_for_stable_returns_once_the_screen_settles(backend):
+    animated = AnimatedBackend(frames=3, width=320, height=200, scale=2)
+    set_capture_backend(animated)
+
+    result = wait_for_stable(stable_ms=30, timeout_ms=2000, interval_ms=5)
+
+    assert result["status"] == "success"
+    assert result["stable"] is True
+    assert result["samples"] > 3
+    assert "data" in result
+
+
+def test_wait_for_stable_gives_up_at_the_timeout(backend):
+    set_capture_backend(AnimatedBackend(frames=None, width=320, height=200, scale=2))
+
+    result = wait_for_stable(stable_ms=50, timeout_ms=100, interval_ms=5)
+
+    assert result["stable"] is False
+    assert 100 <= result["waited_ms"] < 500
+    assert "data" in result
+
+
+def test_wait_until_stable_does_not_encode(backend):
+    result = wait_until_stable(stable_ms=20, timeout_ms=1000, interval_ms=5)
+    assert result["stable"] is True
+    assert set(result) == {"stable", "waited_ms", "samples"}
+
+
+def test_screenshot_is_downscaled_to_the_target(backend):
+    result = screenshot(max_dimension=320, dedupe=False)
+    assert (result["image_width"], result["image_height"]) == (320, 200)
+    assert result["image_scale"] == 1.0
+
+    half = screenshot(scale=0.25, dedupe=False)
+    assert half["image_width"] == 160
+
+
+def test_screenshot_fits_the_byte_budget(backend):
+    unbounded = screenshot(quality=95, dedupe=False)
+    result = screenshot(quality=95, max_bytes=4000, dedupe=False)
+    assert len(base64.b64decode(result["data"])) <= 4000 < len(base64.b64decode(unbounded["data"]))
+    assert result.get("over_budget") is None
+
+
+def test_region_is_captured_at_the_retina_scale(backend):
+    frame = Image.new("RGB", (640, 400), (0, 0, 0))
+    frame.paste((255, 0, 0), (20, 40, 120, 140))
+    backend.set_frame(frame)
+
+    result = screenshot_region(10, 20, 50, 50, format="png")
+    assert result["region"] == {"x": 10, "y": 20, "width": 50, "height": 50}
+    assert (result["image_width"], result["image_height"]) == (100, 100)
+    assert result["image_scale"] == 2.0
+    decoded = Image.open(io.BytesIO(base64.b64decode(result["data"])))
+    assert decoded.getpixel((50, 50))[:3] == (255, 0, 0)
+
+
+def test_region_is_clipped_to_the_screen(backend):
+    clipped = screenshot_region(300, 180, 100, 100)
+    assert clipped["region"] == {"x": 300, "y": 180, "width": 20, "height": 20}
+    assert screenshot_region(400, 0, 10, 10)["status"] == "error"
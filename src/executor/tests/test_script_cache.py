@@ -0,0 +1,115 @@
+import os
+import stat
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from utils import script_cache
+from utils.osa_host import ScriptResult
+from utils.script_cache import ScriptTemplate
+
+TEMPLATE = ScriptTemplate("test", "function run(argv) { return argv[0]; }")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    directory = tmp_path / "scripts"
+    monkeypatch.setattr(script_cache, "SCRIPT_CACHE_DIR", str(directory))
+    monkeypatch.setattr(script_cache, "_compiled_files", {})
+    monkeypatch.setattr(script_cache, "_verified_dirs", set())
+    compiles = []
+
+    def fake_run(args, **kwargs):
+        # osacompile の代わりに出力ファイルを作る
+        compiles.append(args)
+        with open(args[args.index("-o") + 1], "w") as f:
+            f.write("compiled")
+        return ScriptResult(0, "", "")
+
+    monkeypatch.setattr(script_cache.subprocess, "run", fake_run)
+    return SimpleNamespace(path=directory, compiles=compiles)
+
+
+def test_cache_directory_is_created_private(cache):
+    path, cache_hit = script_cache._compiled_path(TEMPLATE)
+    assert cache_hit is False
+    assert os.path.dirname(path) == str(cache.path)
+    assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o700
+
+
+def test_own_compiled_file_is_reused_across_processes(cache):
+    script_cache._compiled_path(TEMPLATE)
+    script_cache._compiled_files.clear()
+    _, cache_hit = script_cache._compiled_path(TEMPLATE)
+    assert cache_hit is True
+    assert len(cache.compiles) == 1
+
+
+def test_writable_planted_file_is_recompiled(cache):
+    cache.path.mkdir(mode=0o700)
+    planted = cache.path / f"{TEMPLATE.key}.scpt"
+    planted.write_text("planted")
+    planted.chmod(0o666)
+
+    _, cache_hit = script_cache._compiled_path(TEMPLATE)
+    assert cache_hit is False
+    assert planted.read_text() == "compiled"
+
+
+def test_loose_directory_permissions_are_tightened(cache):
+    cache.path.mkdir(mode=0o777)
+    cache.path.chmod(0o777)
+    script_cache._compiled_path(TEMPLATE)
+    assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o700
+
+
+@pytest.mark.skipif(not hasattr(os, "geteuid") or os.geteuid() != 0, reason="chown requires root")
+def test_directory_owned_by_another_user_is_rejected(cache):
+    cache.path.mkdir(mode=0o700)
+    os.chown(cache.path, 12345, -1)
+    with pytest.raises(RuntimeError):
+        script_cache._compiled_path(TEMPLATE)
+
+
+@pytest.mark.skipif(not hasattr(os, "geteuid") or os.geteuid() != 0, reason="chown requires root")
+def test_file_owned_by_another_user_is_not_reused(cache):
+    cache.path.mkdir(mode=0o700)
+    planted = cache.path / f"{TEMPLATE.key}.scpt"
+    planted.write_text("planted")
+    planted.chmod(0o644)
+    os.chown(planted, 12345, -1)
+
+    _, cache_hit = script_cache._compiled_path(TEMPLATE)
+    assert cache_hit is False
+    assert planted.read_text() == "compiled"
+
+
+def test_concurrent_compiles_use_separate_temp_files(cache, monkeypatch):
+    both_compiling = threading.Barrier(2, timeout=5)
+    outputs = []
+
+    def slow_run(args, **kwargs):
+        output = args[args.index("-o") + 1]
+        outputs.append(output)
+        both_compiling.wait()
+        with open(output, "w") as f:
+            f.write("compiled")
+        return ScriptResult(0, "", "")
+
+    monkeypatch.setattr(script_cache.subprocess, "run", slow_run)
+    threads = [threading.Thread(target=script_cache._compiled_path, args=(TEMPLATE,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(outputs)) == 2
+    assert os.listdir(cache.path) == [f"{TEMPLATE.key}.scpt"]
+
+
+def test_failed_compile_leaves_no_temp_file(cache, monkeypatch):
+    monkeypatch.setattr(script_cache.subprocess, "run", lambda args, **kwargs: ScriptResult(1, "", "syntax error"))
+    with pytest.raises(RuntimeError):
+        script_cache._compiled_path(TEMPLATE)
+    assert os.listdir(cache.path) == []
@@ -0,0 +1,85 @@
+import pytest
+
+from utils.input_backends import RecordingInputBackend
+from utils.text_entry import MemoryClipboard, TextEntryEngine
+
+
+class FailingBackend(RecordingInputBackend):
+    def key_combo(self, key, modifiers=()):
+        raise RuntimeError("event post failed")
+
+
+def make_engine(clipboard, backend=None, restore_delay=0.01):
+    return TextEntryEngine(clipboard=clipboard, backend=backend or RecordingInputBackend(),
+                           restore_delay=restore_delay)
+
+
+def test_pastes_with_command_v_and_restores_after_flush():
+    clipboard = MemoryClipboard("original")
+    backend = RecordingInputBackend()
+    engine = make_engine(clipboard, backend, restore_delay=60)
+
+    result = engine.type_text("こんにちは")
+    assert result["restore_scheduled"] is True
+    assert clipboard.items == [{"public.utf8-plain-text": "こんにちは"}]
+    assert [event[:3] for event in backend.events] == [("key", "v", ("command",))]
+
+    engine.flush()
+    assert clipboard.items == [{"public.utf8-plain-text": "original"}]
+
+
+def test_consecutive_entries_restore_the_first_contents_once():
+    clipboard = MemoryClipboard("original")
+    engine = make_engine(clipboard, restore_delay=60)
+    engine.type_text("one")
+    engine.type_text("two")
+    engine.flush()
+    assert clipboard.items == [{"public.utf8-plain-text": "original"}]
+
+
+def test_restore_is_skipped_when_someone_else_copied():
+    clipboard = MemoryClipboard("original")
+    engine = make_engine(clipboard, restore_delay=60)
+    engine.type_text("typed")
+    clipboard.write_text("copied by the user")
+
+    engine.flush()
+    assert clipboard.items == [{"public.utf8-plain-text": "copied by the user"}]
+
+
+def test_restore_can_be_disabled():
+    clipboard = MemoryClipboard("original")
+    engine = make_engine(clipboard)
+    assert engine.type_text("typed", restore=False) == {"restore_scheduled": False}
+    engine.flush()
+    assert clipboard.items == [{"public.utf8-plain-text": "typed"}]
+
+
+def test_entry_without_restore_keeps_an_earlier_pending_restore():
+    clipboard = MemoryClipboard("original")
+    engine = make_engine(clipboard, restore_delay=60)
+    engine.type_text("one")
+    result = engine.type_text("two", restore=False)
+    assert result["restore_scheduled"] is True
+
+    engine.flush()
+    assert clipboard.items == [{"public.utf8-plain-text": "original"}]
+
+
+def test_restore_delay_can_be_set_per_call():
+    clipboard = MemoryClipboard("original")
+    engine = make_engine(clipboard, restore_delay=60)
+    result = engine.type_text("typed", restore_delay=0.25)
+    assert result["restore_delay"] == 0.25
+    assert engine._pending[2].interval == 0.25
+    engine.flush()
+
+
+def test_failed_paste_restores_immediately():
+    clipboard = MemoryClipboard("original")
+    engine = make_engine(clipboard, FailingBackend(), restore_delay=60)
+
+    with pytest.raises(RuntimeError):
+        engine.type_text("typed")
+    assert clipboard.items == [{"public.utf8-plain-text": "original"}]
+    assert engine._pending is None
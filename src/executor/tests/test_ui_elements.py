@@ -0,0 +1,296 @@
+import copy
+import json
+import time
+
+import pytest
+
+from actions import ui_elements
+from actions.ax_scripts import ELEMENT_ACTION_SCRIPT, FIND_ELEMENTS_SCRIPT, UI_ELEMENTS_JSON_SCRIPT
+from actions.ui_elements import (
+    find_elements, focus_element, get_ui_elements_json, get_ui_elements_json_delta, wait_for_element
+)
+from utils import capture_backends
+from utils.ax_cache import AXSnapshotCache
+from utils.capture_backends import FakeCaptureBackend, set_capture_backend
+from utils.display_geometry import invalidate_display_geometry
+from utils.ax_snapshots import SnapshotStore
+from utils.locator_index import LocatorIndex
+from utils.osa_host import ScriptResult
+from utils.ui_tree_codec import decode_columnar
+
+
+def make_tree(title="draft"):
+    """UI_ELEMENTS_JSON_SCRIPT と同じ形のツリー（各ノードの path つき）"""
+    return {
+        "windows": [{
+            "role": "AXWindow", "name": "Doc", "position": [0, 0], "size": [800, 600], "path": [0],
+            "children": [
+                {"role": "AXButton", "name": "Save", "position": [10, 10], "size": [60, 20],
+                 "actions": ["AXPress"], "path": [0, 0]},
+                {"role": "AXTextField", "name": "Title", "value": title, "position": [10, 40],
+                 "size": [200, 20], "path": [0, 1]},
+            ],
+        }],
+        "stats": {"visited": 3, "pruned": 0, "truncated": False},
+    }
+
+
+class FakeScripts:
+    """run_template の代わりにテンプレートごとの応答を返す"""
+
+    def __init__(self):
+        self.tree = make_tree()
+        self.find_results = []
+        self.action_reply = None
+        self.calls = []
+
+    def __call__(self, template, args=None, timeout=None):
+        self.calls.append((template, copy.deepcopy(args)))
+        if template is UI_ELEMENTS_JSON_SCRIPT:
+            reply = self.tree
+        elif template is FIND_ELEMENTS_SCRIPT:
+            reply = {"results": self.find_results}
+        elif template is ELEMENT_ACTION_SCRIPT:
+            reply = self.action_reply
+        else:
+            raise AssertionError(f"unexpected template {template.name}")
+        return ScriptResult(0, json.dumps(reply) + "\n", "")
+
+    def walks(self):
+        return [args for template, args in self.calls if template is UI_ELEMENTS_JSON_SCRIPT]
+
+
+@pytest.fixture
+def scripts(monkeypatch):
+    fake = FakeScripts()
+    fake.cache = AXSnapshotCache(ttl=60)
+    fake.store = SnapshotStore()
+    fake.index = LocatorIndex()
+    fake.fingerprint = "screen-a"
+    monkeypatch.setattr(ui_elements, "run_template", fake)
+    monkeypatch.setattr(ui_elements, "get_ax_cache", lambda: fake.cache)
+    monkeypatch.setattr(ui_elements, "get_snapshot_store", lambda: fake.store)
+    monkeypatch.setattr(ui_elements, "get_locator_index", lambda: fake.index)
+    monkeypatch.setattr(ui_elements, "current_screen_fingerprint", lambda: fake.fingerprint)
+    monkeypatch.setattr(ui_elements, "app_window_state", lambda app_name: ((1, (0, 0, 800, 600)),))
+    return fake
+
+
+class HangingProbe:
+    """応答しないアプリの代わりに、与えられたタイムアウトいっぱいまで待ってから失敗する"""
+
+    def __init__(self):
+        self.timeouts = []
+
+    def __call__(self, app_name, locator, max_depth, timeout):
+        self.timeouts.append(timeout)
+        time.sleep(timeout)
+        raise RuntimeError("probe timed out")
+
+
+def test_wait_for_element_does_not_overshoot_its_timeout(monkeypatch):
+    probe = HangingProbe()
+    monkeypatch.setattr(ui_elements, "_probe_element", probe)
+
+    started = time.monotonic()
+    result = wait_for_element("Finder", role="AXButton", name="OK", timeout_ms=150, interval_ms=10)
+    elapsed = time.monotonic() - started
+
+    assert result["matched"] is False
+    assert result["last_error"] == "probe timed out"
+    assert elapsed < 0.4
+    assert all(timeout <= 0.15 for timeout in probe.timeouts)
+
+
+def test_wait_for_element_returns_once_the_element_appears(monkeypatch):
+    element = {"found": True, "role": "AXButton", "name": "OK", "center": {"x": 5, "y": 5}}
+    answers = iter([None, None, element])
+    monkeypatch.setattr(ui_elements, "_probe_element", lambda *args: next(answers))
+
+    result = wait_for_element("Finder", role="AXButton", name="OK", timeout_ms=2000, interval_ms=1)
+
+    assert result["matched"] is True
+    assert result["element"] is element
+    assert result["polls"] == 3
+
+
+def test_wait_for_disappear_keeps_the_last_seen_element(monkeypatch):
+    element = {"found": True, "role": "AXSheet", "name": "Saving"}
+    answers = iter([element, None])
+    monkeypatch.setattr(ui_elements, "_probe_element", lambda *args: next(answers))
+
+    result = wait_for_element("Finder", role="AXSheet", state="disappear", timeout_ms=2000, interval_ms=1)
+
+    assert result["matched"] is True
+    assert result["element"] is element
+
+
+def test_unchanged_tree_is_served_from_the_cache(scripts):
+    first = get_ui_elements_json("TextEdit")
+    second = get_ui_elements_json("TextEdit")
+
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["ui_data"] == first["ui_data"]
+    assert second["visited"] == 3
+    assert len(scripts.walks()) == 1
+
+
+def test_screen_change_and_use_cache_false_walk_again(scripts):
+    get_ui_elements_json("TextEdit")
+    scripts.fingerprint = "screen-b"
+    assert get_ui_elements_json("TextEdit")["cached"] is False
+    assert get_ui_elements_json("TextEdit", use_cache=False)["cached"] is False
+    assert len(scripts.walks()) == 3
+
+
+def test_input_to_the_app_invalidates_its_tree(scripts):
+    get_ui_elements_json("TextEdit")
+    scripts.cache.invalidate_app("TextEdit")
+    assert get_ui_elements_json("TextEdit")["cached"] is False
+    assert len(scripts.walks()) == 2
+
+
+def test_delta_reports_only_changed_nodes_with_stable_ids(scripts):
+    base = get_ui_elements_json_delta("TextEdit")
+    assert base["mode"] == "full"
+    button_id = base["ui_data"]["windows"][0]["children"][0]["id"]
+
+    tree = make_tree(title="final")
+    # ボタンが移動しても同じIDのまま changed になる
+    tree["windows"][0]["children"][0]["position"] = [30, 10]
+    tree["windows"][0]["children"].append(
+        {"role": "AXButton", "name": "Cancel", "position": [80, 10], "size": [60, 20], "path": [0, 2]})
+    scripts.tree = tree
+
+    delta = get_ui_elements_json_delta("TextEdit", base_snapshot_id=base["snapshot_id"], use_cache=False)
+
+    assert delta["mode"] == "delta"
+    assert delta["removed"] == []
+    assert [node["name"] for node in delta["added"]] == ["Cancel"]
+    changed = {node["name"]: node for node in delta["changed"]}
+    assert set(changed) == {"Doc", "Save", "Title"}
+    assert changed["Save"]["id"] == button_id
+    assert changed["Title"]["value"] == "final"
+
+
+def test_delta_falls_back_to_the_full_tree_for_an_unknown_base(scripts):
+    result = get_ui_elements_json_delta("TextEdit", base_snapshot_id=999)
+    assert result["mode"] == "full"
+    assert "ui_data" in result
+
+
+def test_filters_are_sent_to_the_walk_and_key_the_cache(scripts):
+    get_ui_elements_json("TextEdit", interactive_only=True, roles=["AXButton"], max_nodes=50)
+    get_ui_elements_json("TextEdit", interactive_only=True, roles=["AXButton"], max_nodes=50)
+    get_ui_elements_json("TextEdit", name_contains="save")
+
+    walks = scripts.walks()
+    assert len(walks) == 2
+    assert walks[0]["query"] == {"interactive_only": True, "roles": ["AXButton"], "max_nodes": 50}
+    assert walks[1]["query"] == {"name_contains": "save"}
+
+
+def test_visible_only_passes_the_screen_as_the_viewport(scripts):
+    previous = capture_backends._backend
+    set_capture_backend(FakeCaptureBackend(width=320, height=200))
+    invalidate_display_geometry()
+    try:
+        get_ui_elements_json("TextEdit", visible_only=True)
+    finally:
+        set_capture_backend(previous)
+        invalidate_display_geometry()
+    assert scripts.walks()[0]["viewport"] == [0, 0, 320, 200]
+
+
+def test_walk_statistics_are_reported(scripts):
+    scripts.tree["stats"] = {"visited": 40, "pruned": 12, "truncated": True}
+    result = get_ui_elements_json("TextEdit", exclude_roles=["AXTable"])
+    assert (result["visited"], result["pruned"], result["truncated"]) == (40, 12, True)
+    assert "stats" not in result["ui_data"]
+
+
+def test_columnar_format_is_served_from_the_same_cache_entry(scripts):
+    tree = get_ui_elements_json("TextEdit")
+    table = get_ui_elements_json("TextEdit", format="columnar")
+    assert table["cached"] is True
+    assert "ui_data" not in table
+    decoded = decode_columnar(table["ui_table"])["windows"][0]
+    original = tree["ui_data"]["windows"][0]
+    assert decoded["id"] == original["id"]
+    assert [(child["id"], child["name"], child["value"]) for child in decoded["children"]] == [
+        (child["id"], child["name"], child.get("value")) for child in original["children"]]
+
+
+def action_reply(method, path, **fields):
+    return {"status": "success", "x": 40, "y": 20, "frame": [10, 10, 60, 20], "window": 0,
+            "window_name": "Doc", "path": path, "method": method, **fields}
+
+
+def test_elements_json_builds_the_locator_index(scripts):
+    result = get_ui_elements_json("TextEdit")
+    locators = scripts.index.lookup("TextEdit", "AXButton", "Save")
+    assert [(loc.window, loc.window_name, loc.path) for loc in locators] == [(0, "Doc", [0])]
+    # path は応答のツリーに残さない
+    assert "path" not in result["ui_data"]["windows"][0]["children"][0]
+
+
+def test_focus_uses_the_indexed_path(scripts):
+    get_ui_elements_json("TextEdit")
+    scripts.action_reply = action_reply("index", [0])
+
+    result = focus_element("TextEdit", "AXButton", "Save")
+
+    assert result == {"status": "success", "frame": [10, 10, 60, 20], "method": "index"}
+    _, args = scripts.calls[-1]
+    assert args["locators"] == [{"window": 0, "window_name": "Doc", "path": [0]}]
+    assert args["walk"] is True
+
+
+def test_stale_path_is_replaced_by_the_rewalked_position(scripts):
+    get_ui_elements_json("TextEdit")
+    scripts.action_reply = action_reply("rewalk", [3])
+
+    assert focus_element("TextEdit", "AXButton", "Save")["method"] == "rewalk"
+    assert scripts.index.lookup("TextEdit", "AXButton", "Save")[0].path == [3]
+
+
+def test_unindexed_element_falls_back_to_a_walk(scripts):
+    scripts.action_reply = action_reply("walk", [0, 2])
+
+    assert focus_element("TextEdit", "AXButton", "Open")["method"] == "walk"
+    _, args = scripts.calls[-1]
+    assert args["locators"] == []
+    assert scripts.index.lookup("TextEdit", "AXButton", "Open")[0].path == [0, 2]
+
+
+def test_missing_element_is_an_error(scripts):
+    scripts.action_reply = "ERROR: element not found"
+    assert focus_element("TextEdit", "AXButton", "Open")["status"] == "error"
+
+
+def found(role, name, path):
+    return {"found": True, "role": role, "name": name, "frame": [1, 2, 3, 4],
+            "center": {"x": 2.5, "y": 4}, "window": 0, "window_name": "Doc", "path": path}
+
+
+def test_find_elements_resolves_all_locators_in_one_walk(scripts):
+    scripts.find_results = [found("AXButton", "Save", [0]), {"found": False},
+                            found("AXTextField", "Title", [1])]
+    locators = [{"role": "AXButton", "name": "Save"}, {"role": "AXButton", "name": "Open"},
+                {"role": "AXTextField", "name_regex": "^Ti"}]
+
+    result = find_elements("TextEdit", locators, max_depth=4)
+
+    assert result["status"] == "success"
+    assert [entry["found"] for entry in result["results"]] == [True, False, True]
+    assert len(scripts.calls) == 1
+    assert scripts.calls[0][1] == {"app_name": "TextEdit", "locators": locators, "max_depth": 4}
+    # 見つかった要素は索引に入り、続く focusElement が直接参照できる
+    assert scripts.index.lookup("TextEdit", "AXTextField", "Title")[0].path == [1]
+
+
+def test_find_elements_reports_script_errors(scripts, monkeypatch):
+    monkeypatch.setattr(ui_elements, "run_template",
+                        lambda template, args=None, timeout=None: ScriptResult(0, '{"error": "no app"}', ""))
+    assert find_elements("Nope", [{"role": "AXButton"}]) == {"status": "error", "message": "no app"}
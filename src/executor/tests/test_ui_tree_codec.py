@@ -0,0 +1,51 @@
+import json
+
+from utils.ui_tree_codec import FORMAT, decode_columnar, encode_columnar
+
+
+def node(role, name, children=(), **fields):
+    return {
+        "role": role, "roleDescription": role.lower(), "name": name, "description": "",
+        "value": fields.get("value"), "position": fields.get("position", [0, 0]),
+        "size": fields.get("size", [10, 10]), "enabled": fields.get("enabled", True),
+        "focused": fields.get("focused", False), "selected": False,
+        "actions": fields.get("actions", []), "subrole": "", "children": list(children),
+        "id": fields.get("id"),
+    }
+
+
+TREE = {"windows": [
+    node("AXWindow", "Main", [
+        node("AXButton", "OK", actions=["AXPress"], position=[5, 6], size=[7, 8], id="b1"),
+        node("AXButton", "Cancel", actions=["AXPress"], enabled=False, id="b2"),
+        node("AXTextField", "Query", value="abc", focused=True, id="t1"),
+    ], id="w1"),
+    node("AXWindow", "Other", id="w2"),
+]}
+
+
+def test_round_trip_preserves_the_tree():
+    table = encode_columnar(TREE)
+    assert table["format"] == FORMAT
+    assert table["count"] == 5
+    assert decode_columnar(table) == TREE
+
+
+def test_rows_are_preorder_with_parents_first():
+    columns = encode_columnar(TREE)["columns"]
+    assert columns["parent"] == [-1, 0, 0, 0, -1]
+    assert columns["frame"][4:8] == [5, 6, 7, 8]
+
+
+def test_repeated_strings_are_interned():
+    table = encode_columnar(TREE)
+    assert table["roles"].count("AXButton") == 1
+    assert table["actions"] == ["AXPress"]
+    assert table["columns"]["actions"][1] == table["columns"]["actions"][2]
+
+
+def test_columnar_is_smaller_than_the_nested_json():
+    wide = {"windows": [node("AXWindow", "Main", [
+        node("AXButton", f"Button {i}", actions=["AXPress", "AXShowMenu"], id=f"n{i}") for i in range(200)
+    ], id="w")]}
+    assert len(json.dumps(encode_columnar(wide))) < len(json.dumps(wide)) * 0.6
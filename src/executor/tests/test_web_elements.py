@@ -0,0 +1,73 @@
+import subprocess
+
+from actions import web_elements
+from actions.web_elements import click_web_element, get_web_elements
+
+
+class EndlessDom:
+    """毎ページ1秒かかり、続きが尽きないDOM"""
+
+    def __init__(self, monkeypatch, fail_after=None):
+        self.now = 0.0
+        self.pages = 0
+        self.fail_after = fail_after
+        self.timeouts = []
+        monkeypatch.setattr(web_elements.time, "monotonic", lambda: self.now)
+        monkeypatch.setattr(web_elements, "_fetch_page", self.fetch)
+
+    def fetch(self, state, limit, timeout):
+        self.timeouts.append(timeout)
+        if self.fail_after is not None and self.pages >= self.fail_after:
+            raise subprocess.TimeoutExpired("osascript", timeout)
+        self.now += 1.0
+        self.pages += 1
+        state["frontier"] = [[self.pages]]
+        return {"elements": [{"role": "AXLink", "name": f"link {self.pages}"}] * limit,
+                "visited": limit}
+
+
+def test_deadline_returns_partial_results_with_a_cursor(monkeypatch):
+    dom = EndlessDom(monkeypatch)
+    result = get_web_elements("Safari", limit=10_000, chunk_size=5, visible_only=False,
+                              deadline_ms=3000)
+    assert result["status"] == "success"
+    assert result["deadline_reached"] is True
+    assert dom.pages == 3
+    assert result["count"] == 15
+    assert result["next_cursor"] is not None
+    # 1ページのタイムアウトは締め切りまでの残り時間に合わせる
+    assert dom.timeouts == [3.0, 2.0, 1.0]
+
+    following = get_web_elements("Safari", cursor=result["next_cursor"], limit=5, chunk_size=5)
+    assert following["count"] == 5
+
+
+def test_page_timeout_after_progress_keeps_what_was_fetched(monkeypatch):
+    EndlessDom(monkeypatch, fail_after=2)
+    result = get_web_elements("Safari", limit=100, chunk_size=5, visible_only=False)
+    assert result["status"] == "success"
+    assert result["count"] == 10
+    assert result["deadline_reached"] is True
+    assert result["next_cursor"] is not None
+
+
+def test_first_page_timeout_is_an_error(monkeypatch):
+    EndlessDom(monkeypatch, fail_after=0)
+    result = get_web_elements("Safari", visible_only=False)
+    assert result["status"] == "error"
+
+
+class NoMatchDom(EndlessDom):
+    """目的の要素が見つからないまま続きが尽きないDOM"""
+
+    def fetch(self, state, limit, timeout):
+        data = super().fetch(state, limit, timeout)
+        return {**data, "elements": []}
+
+
+def test_click_gives_up_at_the_deadline(monkeypatch):
+    dom = NoMatchDom(monkeypatch)
+    result = click_web_element("Safari", "AXButton", "OK", deadline_ms=2500)
+    assert result["status"] == "error"
+    assert "2500ms" in result["message"]
+    assert dom.pages == 3
@@ -0,0 +1,206 @@
+"""アクセシビリティツリー（elementsJson）のスナップショットキャッシュ
+
+elementsJson は呼び出しごとにウィンドウ全体を properties() / actions() で
+たどり直すため、変化していないウィンドウに対しても数百ms〜数秒かかる。
+ここでは取得結果を (アプリ, ウィンドウ, 深さ, 探索フィルター) ごとに保持し、次の場合に破棄する:
+
+- そのアプリを対象とする入力アクションが実行された（invalidate_app）
+- 画面の指紋（frame_diff.frame_fingerprint）が取得時から変わった
+- そのアプリの画面上のウィンドウ（並び順・位置・サイズ）が取得時から変わった
+- TTL を過ぎた
+
+画面の指紋はスクリーンショット（またはフレームグラバー）のフレームからしか分からない。
+入力アクションもスクリーンショットも伴わずにウィンドウ内の内容だけが変わった場合
+（アプリ自身の更新や他のプロセスによる変更）は、ウィンドウ一覧が同じなら TTL の間は古いツリーを返す。
+そうした変化を待つ場合は use_cache=False（または max_age）で取得し直す。
+"""
+import json
+import threading
+import time
+from collections import namedtuple
+
+from utils.frame_diff import frame_fingerprint, make_thumbnail
+from utils.frame_grabber import get_frame_grabber
+
+DEFAULT_AX_CACHE_TTL = 5.0  # 秒
+MAX_AX_CACHE_ENTRIES = 32
+
+AXSnapshot = namedtuple("AXSnapshot", ["data", "created_at", "screen_fingerprint", "windows"])
+
+_screen_lock = threading.Lock()
+_screen_fingerprint = None
+_screen_fingerprint_at = 0.0
+
+
+def note_screen_fingerprint(fingerprint, timestamp=None):
+    """スクリーンショット処理で計算した画面の指紋を記録する"""
+    global _screen_fingerprint, _screen_fingerprint_at
+    with _screen_lock:
+        _screen_fingerprint = fingerprint
+        _screen_fingerprint_at = time.monotonic() if timestamp is None else timestamp
+
+
+def current_screen_fingerprint():
+    """把握している最新の画面の指紋を返す（不明ならNone）
+
+    フレームグラバーが動作中で、記録済みの指紋より新しいフレームがあればそれを使う。
+    新たなキャプチャは行わない。
+    """
+    grabber = get_frame_grabber()
+    frame = grabber.latest() if grabber is not None and grabber.running else None
+    with _screen_lock:
+        if frame is None or frame.timestamp <= _screen_fingerprint_at:
+            return _screen_fingerprint
+    fingerprint = frame_fingerprint(make_thumbnail(frame.image))
+    note_screen_fingerprint(fingerprint, frame.timestamp)
+    return fingerprint
+
+
+def _on_screen_windows():
+    """画面上のウィンドウ（前面から順）を (所有アプリ名, ウィンドウ番号, (x, y, 幅, 高さ)) で返す"""
+    try:
+        import Quartz
+    except ImportError:
+        return None
+    try:
+        infos = Quartz.CGWindowListCopyWindowInfo(
+            Quartz.kCGWindowListOptionOnScreenOnly | Quartz.kCGWindowListExcludeDesktopElements,
+            Quartz.kCGNullWindowID)
+    except Exception:
+        return None
+    # レイヤー0が通常のアプリケーションウィンドウ（メニューバーやDockを除く）
+    return [(info.get("kCGWindowOwnerName"), info.get("kCGWindowNumber"), _window_bounds(info))
+            for info in infos or () if info.get("kCGWindowLayer") == 0]
+
+
+def _window_bounds(info):
+    bounds = info.get("kCGWindowBounds") or {}
+    return tuple(int(bounds.get(name, 0)) for name in ("X", "Y", "Width", "Height"))
+
+
+def frontmost_app():
+    """最前面のアプリ名を返す（取得できなければNone）"""
+    windows = _on_screen_windows()
+    return windows[0][0] if windows else None
+
+
+def app_window_state(app_name):
+    """アプリの画面上のウィンドウを前面から順に (番号, 位置とサイズ) のタプルで返す（取得できなければNone）
+
+    ウィンドウ一覧の取得だけで求めるためキャプチャより安く、スクリーンショットを撮っていなくても
+    ウィンドウの開閉・切り替え・移動・リサイズを検知できる。
+    """
+    windows = _on_screen_windows()
+    if windows is None:
+        return None
+    return tuple((number, bounds) for owner, number, bounds in windows if owner == app_name)
+
+
+class AXSnapshotCache:
+    """(アプリ, ウィンドウ, 深さ) ごとのアクセシビリティツリーのキャッシュ
+
+    Args:
+        ttl: エントリの有効期間（秒）
+        max_entries: 保持するエントリ数の上限（古いものから破棄）
+    """
+
+    def __init__(self, ttl=DEFAULT_AX_CACHE_TTL, max_entries=MAX_AX_CACHE_ENTRIES):
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = {"input": 0, "screen": 0, "window": 0, "ttl": 0, "manual": 0}
+
+    @staticmethod
+    def make_key(app_name, window=None, depth=None, query=None):
+        """キーを作る。query（探索フィルターの dict）は順序に依存しない形に変換する"""
+        return app_name, window or "", depth, json.dumps(query or {}, sort_keys=True)
+
+    def get(self, key, screen_fingerprint=None, windows=None, max_age=None):
+        """有効なエントリがあれば (データ, 経過秒数) を返し、無ければNoneを返す
+
+        Args:
+            screen_fingerprint: 現在の画面の指紋（Noneなら比較しない）
+            windows: 現在のアプリのウィンドウの状態（app_window_state。Noneなら比較しない）
+            max_age: TTL の代わりに使う最大経過秒数
+        """
+        now = time.monotonic()
+        ttl = self.ttl if max_age is None else float(max_age)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            reason = None
+            if now - entry.created_at > ttl:
+                reason = "ttl"
+            elif (screen_fingerprint is not None and entry.screen_fingerprint is not None
+                  and screen_fingerprint != entry.screen_fingerprint):
+                reason = "screen"
+            elif (windows is not None and entry.windows is not None
+                  and windows != entry.windows):
+                reason = "window"
+            if reason is not None:
+                del self._entries[key]
+                self.invalidations[reason] += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.data, now - entry.created_at
+
+    def put(self, key, data, screen_fingerprint=None, windows=None):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = AXSnapshot(data, time.monotonic(), screen_fingerprint, windows)
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+
+    def invalidate_app(self, app_name=None, reason="input"):
+        """アプリのエントリを破棄する（app_name が None なら全て）"""
+        with self._lock:
+            keys = [key for key in self._entries if app_name is None or key[0] == app_name]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations[reason] += len(keys)
+            return len(keys)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": dict(self.invalidations),
+                "ttl": self.ttl,
+            }
+
+
+_cache = AXSnapshotCache()
+
+
+def get_ax_cache():
+    """共有のアクセシビリティツリーキャッシュを返す"""
+    return _cache
+
+
+def invalidate_for_input(params=None):
+    """入力アクションの対象アプリのエントリを破棄する
+
+    パラメーターに app_name があればそのアプリ、無ければ最前面のアプリを対象とする。
+    最前面のアプリが分からない場合は全エントリを破棄する。
+    """
+    if not len(_cache):
+        return 0
+    app_name = (params or {}).get("app_name") or frontmost_app()
+    return _cache.invalidate_app(app_name)
+
+
+def clear_elements_cache(app_name=None):
+    """キャッシュを破棄し、統計を返す（clearElementsCache アクション）"""
+    removed = _cache.invalidate_app(app_name, reason="manual")
+    return {"status": "success", "removed": removed, **_cache.stats()}
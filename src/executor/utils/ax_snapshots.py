@@ -0,0 +1,124 @@
+"""アクセシビリティツリーのノードID付与とスナップショット間の差分
+
+elementsJson のツリー（actions/ax_scripts.py の inspectElement が生成する形式）の
+各ノードに、取得し直しても変わらないID を付ける。IDは親のID・role・subrole・name と、
+同じ親の下で同じ role/name を持つ兄弟の中での順番から計算する。位置・サイズや値は
+IDに含めず、変化は changed として検出する（移動したボタンが削除+追加にならない）。
+
+取得したツリーは snapshot_id を付けて直近数件を保持し、elementsJsonDelta で
+呼び出し側が持っているスナップショットからの追加・削除・変更ノードだけを返せるようにする。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+MAX_SNAPSHOTS = 16
+
+# 差分の比較対象とするノードの属性（children はIDの親子関係で表す）
+NODE_FIELDS = (
+    "role", "roleDescription", "name", "description", "value", "position", "size",
+    "enabled", "focused", "selected", "actions", "subrole",
+)
+
+
+def _node_id(parent_id, node, ordinal):
+    signature = "\x1f".join([
+        parent_id or "", str(node.get("role")), str(node.get("subrole", "")),
+        str(node.get("name", "")), str(ordinal),
+    ])
+    return hashlib.blake2b(signature.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def assign_node_ids(nodes, parent_id=None):
+    """ツリーの各ノードに "id" を付ける（入力を書き換える）"""
+    seen = {}
+    for node in nodes:
+        signature = (node.get("role"), node.get("subrole", ""), node.get("name", ""))
+        ordinal = seen.get(signature, 0)
+        seen[signature] = ordinal + 1
+        node["id"] = _node_id(parent_id, node, ordinal)
+        assign_node_ids(node.get("children") or (), node["id"])
+
+
+def flatten_tree(nodes, parent_id=None, flat=None):
+    """ID付きツリーを {id: フラットなノード} に変換する
+
+    フラットなノードは NODE_FIELDS と id / parent / children（子のIDのリスト）を持つ。
+    """
+    if flat is None:
+        flat = {}
+    for node in nodes:
+        entry = {field: node.get(field) for field in NODE_FIELDS}
+        entry["id"] = node["id"]
+        entry["parent"] = parent_id
+        children = node.get("children") or ()
+        entry["children"] = [child["id"] for child in children]
+        flat[node["id"]] = entry
+        flatten_tree(children, node["id"], flat)
+    return flat
+
+
+def diff_flat(base, current):
+    """2つのフラットなツリーの差分を返す
+
+    Returns:
+        dict: {"added": [ノード], "removed": [ID], "changed": [ノード]}
+    """
+    added = [node for node_id, node in current.items() if node_id not in base]
+    removed = [node_id for node_id in base if node_id not in current]
+    changed = []
+    for node_id, node in current.items():
+        previous = base.get(node_id)
+        if previous is None:
+            continue
+        if any(node[field] != previous[field] for field in NODE_FIELDS) \
+                or node["children"] != previous["children"]:
+            changed.append(node)
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+class SnapshotStore:
+    """直近のツリーを snapshot_id で保持する
+
+    同じツリーオブジェクト（キャッシュから返されたもの）には同じ snapshot_id を返す。
+    """
+
+    def __init__(self, max_snapshots=MAX_SNAPSHOTS):
+        self.max_snapshots = int(max_snapshots)
+        self._snapshots = OrderedDict()
+        self._ids_by_tree = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def register(self, tree):
+        """ツリー（{"windows": [...]}）にノードIDを付けて保持し、snapshot_id を返す"""
+        with self._lock:
+            snapshot_id = self._ids_by_tree.get(id(tree))
+            if snapshot_id is not None:
+                return snapshot_id
+        windows = tree.get("windows") or []
+        assign_node_ids(windows)
+        flat = flatten_tree(windows)
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = (tree, flat)
+            self._ids_by_tree[id(tree)] = snapshot_id
+            while len(self._snapshots) > self.max_snapshots:
+                _, (old_tree, _) = self._snapshots.popitem(last=False)
+                self._ids_by_tree.pop(id(old_tree), None)
+            return snapshot_id
+
+    def flat(self, snapshot_id):
+        """保持しているスナップショットのフラットなツリーを返す（無ければNone）"""
+        with self._lock:
+            entry = self._snapshots.get(snapshot_id)
+            return entry[1] if entry is not None else None
+
+
+_store = SnapshotStore()
+
+
+def get_snapshot_store():
+    """共有のスナップショットストアを返す"""
+    return _store
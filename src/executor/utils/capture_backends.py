@@ -0,0 +1,224 @@
+"""スクリーンキャプチャのバックエンド
+
+- QuartzCaptureBackend: CoreGraphicsでプロセス内キャプチャ（一時ファイル・PNG変換なし）
+- PyAutoGUICaptureBackend: 従来の pyautogui.screenshot()（screencapture を起動）
+- FakeCaptureBackend: 合成フレームを返す（Linux上でのテスト・ベンチマーク用）
+
+使用するバックエンドは環境変数 MIKI_CAPTURE_BACKEND（auto/quartz/pyautogui/fake）で選択できる。
+"""
+import os
+import sys
+import threading
+
+from PIL import Image, ImageDraw
+
+
+class CaptureBackend:
+    """キャプチャバックエンドの基底クラス"""
+
+    name = "base"
+
+    def grab(self):
+        """メインディスプレイ全体をキャプチャし、物理解像度のRGB画像を返す"""
+        raise NotImplementedError
+
+    def grab_region(self, x, y, width, height):
+        """論理座標の矩形をキャプチャし、物理解像度のRGB画像を返す
+
+        既定の実装は全画面をキャプチャして切り出す。バックエンドが矩形キャプチャに
+        対応している場合はオーバーライドして、キャプチャ面積自体を減らす。
+        """
+        img = self.grab()
+        screen_w, screen_h = self.logical_size()
+        scale_x = img.size[0] / screen_w
+        scale_y = img.size[1] / screen_h
+        return img.crop((
+            round(x * scale_x),
+            round(y * scale_y),
+            round((x + width) * scale_x),
+            round((y + height) * scale_y),
+        ))
+
+    def logical_size(self):
+        """論理解像度（ポイント単位）を (width, height) で返す"""
+        raise NotImplementedError
+
+    def physical_size(self):
+        """物理解像度（ピクセル単位）を (width, height) で返す"""
+        return self.grab().size
+
+    def cursor_position(self):
+        """マウスカーソルの論理座標を (x, y) で返す"""
+        raise NotImplementedError
+
+
+class QuartzCaptureBackend(CaptureBackend):
+    """CoreGraphicsでメインディスプレイを直接メモリ上にキャプチャする"""
+
+    name = "quartz"
+
+    def __init__(self):
+        import Quartz
+        self._quartz = Quartz
+
+    def grab(self):
+        Quartz = self._quartz
+        image_ref = Quartz.CGDisplayCreateImage(Quartz.CGMainDisplayID())
+        if image_ref is None:
+            raise RuntimeError("CGDisplayCreateImage failed (画面収録の権限を確認してください)")
+        return self._to_pil(image_ref)
+
+    def grab_region(self, x, y, width, height):
+        Quartz = self._quartz
+        # CGDisplayCreateImageForRect は論理座標の矩形を受け取り、物理解像度の画像を返す
+        image_ref = Quartz.CGDisplayCreateImageForRect(
+            Quartz.CGMainDisplayID(), Quartz.CGRectMake(x, y, width, height))
+        if image_ref is None:
+            raise RuntimeError("CGDisplayCreateImageForRect failed (画面収録の権限を確認してください)")
+        return self._to_pil(image_ref)
+
+    def _to_pil(self, image_ref):
+        Quartz = self._quartz
+        width = Quartz.CGImageGetWidth(image_ref)
+        height = Quartz.CGImageGetHeight(image_ref)
+        bytes_per_row = Quartz.CGImageGetBytesPerRow(image_ref)
+        data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(image_ref))
+        # CoreGraphicsのピクセルはBGRA（プリマルチプライド）。アルファは捨ててRGBとして読む
+        return Image.frombuffer(
+            "RGB", (width, height), bytes(data), "raw", "BGRX", bytes_per_row, 1)
+
+    def logical_size(self):
+        Quartz = self._quartz
+        bounds = Quartz.CGDisplayBounds(Quartz.CGMainDisplayID())
+        return int(bounds.size.width), int(bounds.size.height)
+
+    def physical_size(self):
+        Quartz = self._quartz
+        mode = Quartz.CGDisplayCopyDisplayMode(Quartz.CGMainDisplayID())
+        if mode is None:
+            return super().physical_size()
+        return (int(Quartz.CGDisplayModeGetPixelWidth(mode)),
+                int(Quartz.CGDisplayModeGetPixelHeight(mode)))
+
+    def cursor_position(self):
+        Quartz = self._quartz
+        location = Quartz.CGEventGetLocation(Quartz.CGEventCreate(None))
+        return int(location.x), int(location.y)
+
+
+class PyAutoGUICaptureBackend(CaptureBackend):
+    """pyautogui.screenshot() を使う従来のバックエンド（フォールバック用）"""
+
+    name = "pyautogui"
+
+    def grab(self):
+        import pyautogui
+        return pyautogui.screenshot().convert("RGB")
+
+    def logical_size(self):
+        import pyautogui
+        width, height = pyautogui.size()
+        return int(width), int(height)
+
+    def cursor_position(self):
+        import pyautogui
+        x, y = pyautogui.position()
+        return int(x), int(y)
+
+
+class FakeCaptureBackend(CaptureBackend):
+    """合成フレームを返すテスト用バックエンド
+
+    Args:
+        width: 論理幅
+        height: 論理高さ
+        scale: 論理座標に対する物理ピクセルの倍率（Retinaなら2）
+    """
+
+    name = "fake"
+
+    def __init__(self, width=1440, height=900, scale=2):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.grab_count = 0
+        self.cursor = (width // 2, height // 2)
+        self._frame = None
+
+    def set_frame(self, img):
+        """次回以降の grab() で返すフレームを設定する（Noneで合成フレームに戻す）"""
+        self._frame = img
+
+    def _synthetic_frame(self):
+        size = (self.width * self.scale, self.height * self.scale)
+        img = Image.new("RGB", size, (236, 236, 236))
+        draw = ImageDraw.Draw(img)
+        # UIらしい構造（メニューバーとウィンドウ）を描いてエンコード負荷を現実に近づける
+        draw.rectangle([0, 0, size[0], 24 * self.scale], fill=(250, 250, 250))
+        draw.rectangle(
+            [size[0] // 8, size[1] // 8, size[0] * 7 // 8, size[1] * 7 // 8],
+            fill=(255, 255, 255), outline=(180, 180, 180), width=self.scale)
+        for row in range(size[1] // 8 + 40 * self.scale, size[1] * 7 // 8, 18 * self.scale):
+            draw.line([size[0] // 8 + 20 * self.scale, row, size[0] // 2, row],
+                      fill=(60, 60, 60), width=self.scale)
+        return img
+
+    def grab(self):
+        self.grab_count += 1
+        if self._frame is not None:
+            return self._frame.copy()
+        return self._synthetic_frame()
+
+    def logical_size(self):
+        return self.width, self.height
+
+    def physical_size(self):
+        if self._frame is not None:
+            return self._frame.size
+        return self.width * self.scale, self.height * self.scale
+
+    def cursor_position(self):
+        return self.cursor
+
+
+_BACKEND_FACTORIES = {
+    "quartz": QuartzCaptureBackend,
+    "pyautogui": PyAutoGUICaptureBackend,
+    "fake": FakeCaptureBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_capture_backend(name=None):
+    """名前からバックエンドを生成する。auto の場合はQuartzを優先し、使えなければpyautogui"""
+    name = (name or os.environ.get("MIKI_CAPTURE_BACKEND") or "auto").lower()
+    if name == "auto":
+        if sys.platform == "darwin":
+            try:
+                return QuartzCaptureBackend()
+            except ImportError:
+                pass
+        return PyAutoGUICaptureBackend()
+    factory = _BACKEND_FACTORIES.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown capture backend: {name}")
+    return factory()
+
+
+def get_capture_backend():
+    """現在のキャプチャバックエンドを返す（初回呼び出し時に生成）"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_capture_backend()
+    return _backend
+
+
+def set_capture_backend(backend):
+    """キャプチャバックエンドを差し替える（テスト・ベンチマーク用）"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -1,5 +1,5 @@
 """座標変換とスケーリングのヘルパー関数"""
-import pyautogui
+from utils.display_geometry import get_display_geometry
 
 
 def calculate_scale_factors():
@@ -7,14 +7,8 @@ def calculate_scale_factors():
     ディスプレイのスケーリング係数を計算する
     Retina等でのスクリーンショットと論理座標の差を考慮
     """
-    screen_w, screen_h = pyautogui.size()
-    shot = pyautogui.screenshot()
-    img_w, img_h = shot.size
-
-    scale_x = img_w / screen_w
-    scale_y = img_h / screen_h
-
-    return scale_x, scale_y
+    geometry = get_display_geometry()
+    return geometry.scale_x, geometry.scale_y
 
 
 def scale_coordinates(x, y, scale_x, scale_y):
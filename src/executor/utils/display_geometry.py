@@ -0,0 +1,68 @@
+"""ディスプレイのジオメトリ（論理サイズ・物理サイズ・スケール）のキャッシュ
+
+スケール係数を知るために毎回スクリーンショットを撮らずに済むよう、
+一度計算した値を保持し、ディスプレイ構成が変わった時だけ再計算する。
+
+無効化のきっかけ:
+- キャプチャしたフレームの物理サイズがキャッシュと食い違った場合
+- 明示的な refresh_display_geometry() 呼び出し（refreshDisplay アクション）
+
+CoreGraphicsのディスプレイ再構成コールバックは CFRunLoop を回すスレッドでしか呼ばれず、
+エグゼキューターは CFRunLoop を回さないため使わない。論理解像度だけが変わり
+キャプチャの物理サイズが変わらない構成変更は、refreshDisplay を呼ぶまで検知されない。
+"""
+import threading
+from collections import namedtuple
+
+from utils.capture_backends import get_capture_backend
+
+DisplayGeometry = namedtuple(
+    "DisplayGeometry",
+    ["width", "height", "physical_width", "physical_height", "scale_x", "scale_y"],
+)
+
+_geometry = None
+_lock = threading.Lock()
+
+
+def _compute_geometry():
+    backend = get_capture_backend()
+    width, height = backend.logical_size()
+    phys_width, phys_height = backend.physical_size()
+    return DisplayGeometry(
+        width=width,
+        height=height,
+        physical_width=phys_width,
+        physical_height=phys_height,
+        scale_x=phys_width / width,
+        scale_y=phys_height / height,
+    )
+
+
+def get_display_geometry():
+    """キャッシュ済みのディスプレイジオメトリを返す（未計算なら計算する）"""
+    geometry = _geometry
+    if geometry is not None:
+        return geometry
+    return refresh_display_geometry()
+
+
+def refresh_display_geometry():
+    """ディスプレイジオメトリを再計算してキャッシュする"""
+    global _geometry
+    with _lock:
+        _geometry = _compute_geometry()
+        return _geometry
+
+
+def invalidate_display_geometry():
+    """キャッシュを破棄する。次回の参照時に再計算される"""
+    global _geometry
+    _geometry = None
+
+
+def note_frame_size(size):
+    """全画面キャプチャのサイズを通知する。キャッシュと異なれば構成変更とみなして破棄する"""
+    geometry = _geometry
+    if geometry is not None and tuple(size) != (geometry.physical_width, geometry.physical_height):
+        invalidate_display_geometry()
@@ -0,0 +1,89 @@
+"""フレーム比較のヘルパー関数
+
+フル解像度の画像を縮小したグレースケールのサムネイルに変換し、
+NumPyで平均絶対差を計算することで、画面の変化を安価に判定する。
+"""
+import base64
+import hashlib
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_THUMBNAIL_WIDTH = 96
+
+
+def make_thumbnail(img, width=DEFAULT_THUMBNAIL_WIDTH):
+    """画像を比較用の縮小グレースケール配列（int16）に変換する"""
+    img_w, img_h = img.size
+    height = max(1, round(img_h * width / img_w))
+    # reducing_gap を指定すると整数倍の縮小を先に行うため、5K画像でも高速に縮小できる
+    thumb = img.resize((width, height), Image.BILINEAR, reducing_gap=2.0).convert("L")
+    return np.asarray(thumb, dtype=np.int16)
+
+
+def thumbnail_distance(a, b):
+    """2つのサムネイルの平均絶対差（0-255）を返す。形状が異なる場合は最大値"""
+    if a is None or b is None or a.shape != b.shape:
+        return 255.0
+    return float(np.abs(a - b).mean())
+
+
+def frame_fingerprint(thumb):
+    """サムネイルからフレームの指紋（16進文字列）を計算する
+
+    下位ビットを落としてから hash するため、JPEG相当の微小なノイズでは変化しない。
+    """
+    quantized = (np.asarray(thumb, dtype=np.uint8) >> 3).tobytes()
+    return hashlib.blake2b(quantized, digest_size=16).hexdigest()
+
+
+def dirty_tile_grid(previous, current, tile_size):
+    """2つのフレーム配列（H x W x C）を固定グリッドで比較し、変化したタイルのbool配列を返す
+
+    戻り値の形状は (タイル行数, タイル列数)。形状が異なる場合はNoneを返す。
+    """
+    if previous is None or previous.shape != current.shape:
+        return None
+    height, width = current.shape[:2]
+    rows = -(-height // tile_size)
+    cols = -(-width // tile_size)
+    changed = np.any(previous != current, axis=2)
+    pad_h = rows * tile_size - height
+    pad_w = cols * tile_size - width
+    if pad_h or pad_w:
+        changed = np.pad(changed, ((0, pad_h), (0, pad_w)))
+    return changed.reshape(rows, tile_size, cols, tile_size).any(axis=(1, 3))
+
+
+def dirty_rects(grid, tile_size, width, height):
+    """変化したタイルを行ごとに横方向へ連結し、(x, y, w, h) の矩形リストにする"""
+    rects = []
+    for row, cells in enumerate(grid):
+        col = 0
+        cols = len(cells)
+        while col < cols:
+            if not cells[col]:
+                col += 1
+                continue
+            start = col
+            while col < cols and cells[col]:
+                col += 1
+            x = start * tile_size
+            y = row * tile_size
+            rects.append((x, y, min(col * tile_size, width) - x, min(tile_size, height - y)))
+    return rects
+
+
+def apply_tile_delta(base_img, delta):
+    """screenshotDelta の応答を基準フレームに適用し、完全なフレームを復元する
+
+    Args:
+        base_img: クライアントが保持している基準フレーム（base_frame_id のフレーム）
+        delta: screenshotDelta の応答（mode が "delta" のもの）
+    """
+    img = base_img.copy()
+    for tile in delta["tiles"]:
+        patch = Image.open(BytesIO(base64.b64decode(tile["data"])))
+        img.paste(patch, (tile["x"], tile["y"]))
+    return img
@@ -0,0 +1,160 @@
+"""バックグラウンドでの連続フレーム取得
+
+一定レートで画面をキャプチャし、直近数フレームをリングバッファに保持する。
+screenshot アクションは「最後の操作が終わった後に撮られた最新フレーム」を
+新たなキャプチャを待たずに返せるようになる。
+
+- 各フレームには time.monotonic() のタイムスタンプが付く（キャプチャを開始した時刻。
+  入力の前に始まり後に終わったキャプチャを「操作後のフレーム」と誤認しないため）
+- バッファ長は上限付き（古いフレームから破棄）でメモリ使用量を抑える
+- 一定時間フレームが参照されなければスレッドを停止する（次回参照時に再開）
+"""
+import threading
+import time
+from collections import deque, namedtuple
+
+from utils.capture_backends import get_capture_backend
+from utils.display_geometry import note_frame_size
+
+Frame = namedtuple("Frame", ["frame_id", "timestamp", "image"])
+
+DEFAULT_GRABBER_FPS = 5
+DEFAULT_GRABBER_BUFFER_SIZE = 3
+MAX_GRABBER_BUFFER_SIZE = 8
+DEFAULT_GRABBER_IDLE_TIMEOUT = 30.0  # 秒
+
+
+class FrameGrabber:
+    """キャプチャスレッドとリングバッファ
+
+    Args:
+        fps: 1秒あたりのキャプチャ回数
+        buffer_size: 保持するフレーム数（上限 MAX_GRABBER_BUFFER_SIZE）
+        idle_timeout: この秒数フレームが参照されなければスレッドを停止する
+    """
+
+    def __init__(self, fps=DEFAULT_GRABBER_FPS, buffer_size=DEFAULT_GRABBER_BUFFER_SIZE,
+                 idle_timeout=DEFAULT_GRABBER_IDLE_TIMEOUT):
+        self.interval = 1.0 / max(float(fps), 0.1)
+        self.idle_timeout = float(idle_timeout)
+        self._frames = deque(maxlen=max(1, min(int(buffer_size), MAX_GRABBER_BUFFER_SIZE)))
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._next_frame_id = 1
+        self._last_access = time.monotonic()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """キャプチャスレッドを開始する（既に動作中なら何もしない）"""
+        with self._condition:
+            self._last_access = time.monotonic()
+            if self.running:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="miki-frame-grabber", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """キャプチャスレッドを停止し、バッファを解放する"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+        with self._condition:
+            self._thread = None
+            self._frames.clear()
+            self._condition.notify_all()
+
+    def _run(self):
+        backend = get_capture_backend()
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            if started - self._last_access > self.idle_timeout:
+                # アイドル状態: スレッドを終了してCPUとメモリを解放する
+                with self._condition:
+                    self._frames.clear()
+                break
+            try:
+                # キャプチャ開始時刻を記録する。完了時刻では操作前の画面を操作後として扱ってしまう
+                captured_at = time.monotonic()
+                image = backend.grab()
+                note_frame_size(image.size)
+                with self._condition:
+                    self._frames.append(Frame(self._next_frame_id, captured_at, image))
+                    self._next_frame_id += 1
+                    self._condition.notify_all()
+            except Exception:
+                # 一時的なキャプチャ失敗は次の周期で再試行する
+                pass
+            self._stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def latest(self):
+        """最新フレームを返す（無ければNone）"""
+        with self._condition:
+            self._last_access = time.monotonic()
+            return self._frames[-1] if self._frames else None
+
+    def wait_for_frame_after(self, timestamp, timeout):
+        """指定時刻より後にキャプチャされたフレームを待って返す（タイムアウト時はNone）"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._last_access = time.monotonic()
+            while True:
+                if self._frames and self._frames[-1].timestamp > timestamp:
+                    return self._frames[-1]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.running:
+                    return None
+                self._condition.wait(remaining)
+
+
+_grabber = None
+_grabber_lock = threading.Lock()
+_last_action_end = 0.0
+
+
+def get_frame_grabber():
+    """有効化されているフレームグラバーを返す（無効ならNone）"""
+    return _grabber
+
+
+def mark_action_end():
+    """入力アクションの完了時刻を記録する"""
+    global _last_action_end
+    _last_action_end = time.monotonic()
+
+
+def last_action_end():
+    """最後に完了した入力アクションの時刻（time.monotonic()）を返す"""
+    return _last_action_end
+
+
+def start_frame_grabber(fps=DEFAULT_GRABBER_FPS, buffer_size=DEFAULT_GRABBER_BUFFER_SIZE,
+                        idle_timeout=DEFAULT_GRABBER_IDLE_TIMEOUT):
+    """フレームグラバーを有効化する（startFrameGrabber アクション）"""
+    global _grabber
+    with _grabber_lock:
+        if _grabber is not None:
+            _grabber.stop()
+        _grabber = FrameGrabber(fps=fps, buffer_size=buffer_size, idle_timeout=idle_timeout)
+        _grabber.start()
+        return {
+            "status": "success",
+            "fps": 1.0 / _grabber.interval,
+            "buffer_size": _grabber._frames.maxlen,
+            "idle_timeout": _grabber.idle_timeout,
+        }
+
+
+def stop_frame_grabber():
+    """フレームグラバーを無効化する（stopFrameGrabber アクション）"""
+    global _grabber
+    with _grabber_lock:
+        if _grabber is not None:
+            _grabber.stop()
+            _grabber = None
+    return {"status": "success"}
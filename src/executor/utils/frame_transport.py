@@ -0,0 +1,200 @@
+"""画像ペイロードの転送方式
+
+- base64: JSON応答の "data" にBase64文字列として埋め込む（デフォルト、従来互換）
+- shm: 共有メモリマップドファイルのスロットに画像バイト列を書き込み、
+       JSON応答には "data_ref"（path / handle / offset / length）のみを載せる
+
+shmファイルは固定長スロットのリングになっており、各スロットの先頭8バイトに
+書き込んだフレームのhandle（連番、リトルエンディアンuint64）を格納する。
+書き込み側はヘッダーを0にしてからデータを書き、最後にhandleを書く。
+読み出し側は offset - 8 のhandleが応答と一致することを確認して offset から
+length バイトを読み、読み終えた後にもう一度handleを確認する。読み出し中に
+リングが一周して上書きされた場合は2回目の確認で不一致になり、2つのフレームが
+混ざったデータを使わずに済む。
+
+shmファイルはエグゼキューターが作成する専用ディレクトリ（パーミッション 0700）の
+中にだけ作成する。ディレクトリはプロセス終了時に削除する。
+"""
+import atexit
+import base64
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+
+DEFAULT_SLOT_SIZE = 16 * 1024 * 1024  # 5Kディスプレイの高品質JPEGも収まるサイズ
+DEFAULT_SLOTS = 4
+SLOT_HEADER = struct.Struct("<Q")
+
+_private_dir = None
+_private_dir_lock = threading.Lock()
+
+
+def _frames_dir():
+    """shmファイルを置く専用ディレクトリ（初回呼び出し時に 0700 で作成する）"""
+    global _private_dir
+    with _private_dir_lock:
+        if _private_dir is None:
+            _private_dir = tempfile.mkdtemp(prefix="miki-frames-")
+            atexit.register(_remove_frames_dir)
+        return _private_dir
+
+
+def _remove_frames_dir():
+    """専用ディレクトリを中に残ったshmファイルごと削除する（プロセス終了時）"""
+    global _private_dir
+    with _private_dir_lock:
+        if _private_dir is not None:
+            shutil.rmtree(_private_dir, ignore_errors=True)
+            _private_dir = None
+
+
+def _resolve_frame_path(path):
+    """呼び出し側が指定したファイル名を専用ディレクトリ内のパスにする
+
+    ディレクトリを含むパスは受け付けない（任意のファイルを切り詰め・削除できないようにする）。
+    """
+    directory = _frames_dir()
+    if path is None:
+        return None, directory
+    name = os.path.basename(path)
+    if name in ("", ".", "..") or (path != name and os.path.dirname(os.path.abspath(path)) != directory):
+        raise ValueError(f"shm path must be a file name inside {directory}: {path}")
+    return os.path.join(directory, name), directory
+
+
+class Base64Transport:
+    """画像をBase64文字列としてJSON応答に埋め込む"""
+
+    mode = "base64"
+
+    def encode(self, data, mime_type="image/jpeg"):
+        return {"data": base64.b64encode(data).decode("utf-8")}
+
+    def describe(self):
+        return {"mode": self.mode}
+
+    def close(self):
+        pass
+
+
+class SharedMemoryTransport:
+    """画像をメモリマップドファイルのスロットに書き込み、参照情報だけを返す
+
+    Args:
+        path: 共有ファイル名。専用ディレクトリ内のファイル名のみ指定できる（省略時は自動で作成）
+        slot_size: 1スロットの最大バイト数（ヘッダー含む）
+        slots: スロット数。読み出し前に上書きされないよう並行数以上にする
+    """
+
+    mode = "shm"
+
+    def __init__(self, path=None, slot_size=DEFAULT_SLOT_SIZE, slots=DEFAULT_SLOTS):
+        path, directory = _resolve_frame_path(path)
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="frames-", suffix=".bin", dir=directory)
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        self.path = path
+        self.slot_size = int(slot_size)
+        self.slots = int(slots)
+        self._fd = fd
+        os.ftruncate(fd, self.slot_size * self.slots)
+        self._map = mmap.mmap(fd, self.slot_size * self.slots)
+        self._next_handle = 1
+        self._lock = threading.Lock()
+
+    def encode(self, data, mime_type="image/jpeg"):
+        if len(data) + SLOT_HEADER.size > self.slot_size:
+            # スロットに収まらない場合はBase64で返す（受信側はどちらの形式も扱える）
+            return Base64Transport().encode(data, mime_type)
+
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            slot_offset = (handle % self.slots) * self.slot_size
+            data_offset = slot_offset + SLOT_HEADER.size
+            # 先にヘッダーを無効化し、書き込み途中のスロットを古いhandleで読まれないようにする
+            SLOT_HEADER.pack_into(self._map, slot_offset, 0)
+            self._map[data_offset:data_offset + len(data)] = data
+            # handleはデータの後に書く
+            SLOT_HEADER.pack_into(self._map, slot_offset, handle)
+
+        return {
+            "data_ref": {
+                "transport": self.mode,
+                "path": self.path,
+                "handle": handle,
+                "offset": data_offset,
+                "length": len(data),
+                "mime_type": mime_type,
+            }
+        }
+
+    def describe(self):
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "slot_size": self.slot_size,
+            "slots": self.slots,
+        }
+
+    def close(self):
+        # マップを閉じられなくても（BufferError など）fd を閉じてファイルを削除する
+        try:
+            self._map.close()
+        finally:
+            try:
+                os.close(self._fd)
+            finally:
+                try:
+                    os.unlink(self.path)
+                except FileNotFoundError:
+                    pass
+
+
+_transport = Base64Transport()
+_transport_lock = threading.Lock()
+
+
+def get_frame_transport():
+    """現在の画像転送方式を返す"""
+    return _transport
+
+
+def encode_image_payload(data, mime_type="image/jpeg"):
+    """画像バイト列を現在の転送方式で応答用フィールドに変換する"""
+    return _transport.encode(data, mime_type)
+
+
+def set_transport(mode="base64", path=None, slot_size=DEFAULT_SLOT_SIZE, slots=DEFAULT_SLOTS):
+    """画像ペイロードの転送方式を切り替える（setTransport アクション）
+
+    Args:
+        mode: "base64" または "shm"
+        path: shmモードで使用するファイル名（専用ディレクトリ内に作成する。省略時は自動作成）
+        slot_size: shmモードのスロットサイズ（バイト）
+        slots: shmモードのスロット数
+    """
+    global _transport
+    if mode not in ("base64", "shm"):
+        return {"status": "error", "message": f"Unknown transport mode: {mode}"}
+    try:
+        if mode == "shm" and (int(slots) <= 0 or int(slot_size) <= SLOT_HEADER.size):
+            return {
+                "status": "error",
+                "message": f"Invalid shm layout: slots={slots}, slot_size={slot_size} "
+                           f"(slots must be positive and slot_size larger than {SLOT_HEADER.size})",
+            }
+        with _transport_lock:
+            if mode == "shm":
+                new_transport = SharedMemoryTransport(path=path, slot_size=slot_size, slots=slots)
+            else:
+                new_transport = Base64Transport()
+            old_transport, _transport = _transport, new_transport
+        old_transport.close()
+        return {"status": "success", **new_transport.describe()}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to set transport: {str(e)}"}
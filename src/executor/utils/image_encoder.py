@@ -0,0 +1,164 @@
+"""スクリーンショットの縮小とエンコード
+
+- 目標解像度（最大辺または倍率）への縮小
+- JPEG / WebP / PNG でのエンコード（auto で最も小さい形式を選択）
+- バイト数の上限（予算）に収まる最大の品質・サイズの探索
+
+予算探索では、フル解像度の画像を品質ごとに何度もエンコードする代わりに、
+縮小したプローブ画像で品質とサイズの関係を調べ、フル解像度との比率から
+結果サイズを予測する。フル解像度のエンコードは通常1〜2回で済む。
+MAX_FULL_ENCODES 回で予算に収まらなかった場合は、試した中で最も小さい結果を返し
+over_budget を True にする（呼び出し側が予算を満たしたと誤認しないように）。
+"""
+from io import BytesIO
+
+from PIL import Image, features
+
+RESAMPLE_FILTERS = {
+    "nearest": Image.NEAREST,
+    "box": Image.BOX,
+    "bilinear": Image.BILINEAR,
+    "hamming": Image.HAMMING,
+    "bicubic": Image.BICUBIC,
+    "lanczos": Image.LANCZOS,
+}
+
+MIME_TYPES = {
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "png": "image/png",
+}
+
+MIN_BUDGET_QUALITY = 30
+PROBE_MAX_DIMENSION = 512
+MAX_FULL_ENCODES = 4
+
+
+def resize_for_target(img, max_dimension=None, scale=None, resample="bilinear"):
+    """画像を目標解像度に縮小する（拡大はしない）
+
+    Args:
+        max_dimension: 長辺の最大ピクセル数
+        scale: 倍率（0 < scale <= 1）。max_dimension と両方指定した場合は小さい方
+        resample: 縮小フィルター名（RESAMPLE_FILTERS のキー）
+    """
+    if resample not in RESAMPLE_FILTERS:
+        raise ValueError(f"Unknown resample filter: {resample}")
+    width, height = img.size
+    factor = 1.0
+    if scale:
+        factor = min(factor, float(scale))
+    if max_dimension:
+        factor = min(factor, max_dimension / max(width, height))
+    if factor >= 1.0:
+        return img
+    size = (max(1, round(width * factor)), max(1, round(height * factor)))
+    return img.resize(size, RESAMPLE_FILTERS[resample], reducing_gap=3.0)
+
+
+def available_formats():
+    """利用可能なエンコード形式の一覧"""
+    formats = ["jpeg", "png"]
+    if features.check("webp"):
+        formats.append("webp")
+    return formats
+
+
+def encode_image(img, fmt="jpeg", quality=85):
+    """画像を指定形式でエンコードし、バイト列を返す"""
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buffered = BytesIO()
+    if fmt == "jpeg":
+        img.save(buffered, format="JPEG", quality=quality, optimize=True)
+    elif fmt == "webp":
+        img.save(buffered, format="WEBP", quality=quality, method=4)
+    elif fmt == "png":
+        img.save(buffered, format="PNG", optimize=False, compress_level=6)
+    else:
+        raise ValueError(f"Unknown image format: {fmt}")
+    return buffered.getvalue()
+
+
+def _make_probe(img):
+    width, height = img.size
+    factor = PROBE_MAX_DIMENSION / max(width, height)
+    if factor >= 1.0:
+        return img
+    return img.resize((max(1, round(width * factor)), max(1, round(height * factor))),
+                      Image.BILINEAR, reducing_gap=2.0)
+
+
+def _choose_format(probe, quality):
+    """プローブ画像で各形式を試し、最も小さくなる形式を返す"""
+    sizes = {fmt: len(encode_image(probe, fmt, quality)) for fmt in available_formats()}
+    return min(sizes, key=sizes.get)
+
+
+def _search_quality(probe, fmt, ratio, max_bytes, high, low=MIN_BUDGET_QUALITY):
+    """プローブで二分探索し、予測サイズが予算に収まる最大品質を返す（無ければNone）"""
+    best = None
+    while low <= high:
+        mid = (low + high) // 2
+        predicted = len(encode_image(probe, fmt, mid)) * ratio
+        if predicted <= max_bytes:
+            best = mid
+            low = mid + 1
+        else:
+            high = mid - 1
+    return best
+
+
+def encode_screenshot(img, fmt="jpeg", quality=85, max_bytes=None):
+    """画像をエンコードする。max_bytes 指定時は予算に収まる最大の品質・サイズを探す
+
+    Args:
+        img: エンコードする画像
+        fmt: "jpeg" / "webp" / "png" / "auto"
+        quality: 品質の上限（1-100。PNGでは無視）
+        max_bytes: エンコード後のバイト数の上限
+
+    Returns:
+        dict: {"data": bytes, "format", "mime_type", "quality", "image": エンコードした画像,
+               "over_budget": max_bytes に収まらなかったか}
+    """
+    if fmt != "auto" and fmt not in MIME_TYPES:
+        raise ValueError(f"Unknown image format: {fmt}")
+    probe = _make_probe(img) if (fmt == "auto" or max_bytes) else None
+    if fmt == "auto":
+        fmt = _choose_format(probe, quality)
+    if fmt == "webp" and "webp" not in available_formats():
+        fmt = "jpeg"
+
+    data = encode_image(img, fmt, quality)
+    attempts = 1
+    smallest = (data, quality, img)
+    while max_bytes and len(data) > max_bytes and attempts < MAX_FULL_ENCODES:
+        next_quality = None
+        if fmt != "png":
+            # 実測したフル解像度とプローブのサイズ比で、プローブの結果を補正する
+            ratio = len(data) / max(1, len(encode_image(probe, fmt, quality)))
+            next_quality = _search_quality(probe, fmt, ratio, max_bytes * 0.95, quality - 1)
+        if next_quality is None:
+            # 品質を下げても収まらない場合は解像度を下げる（面積はバイト数にほぼ比例）
+            factor = (max_bytes / len(data)) ** 0.5 * 0.95
+            img = resize_for_target(img, scale=factor, resample="bilinear")
+            probe = _make_probe(img)
+        else:
+            quality = next_quality
+        data = encode_image(img, fmt, quality)
+        attempts += 1
+        if len(data) < len(smallest[0]):
+            smallest = (data, quality, img)
+
+    over_budget = bool(max_bytes) and len(data) > max_bytes
+    if over_budget:
+        data, quality, img = smallest
+    return {
+        "data": data,
+        "format": fmt,
+        "mime_type": MIME_TYPES[fmt],
+        "quality": quality,
+        "image": img,
+        "over_budget": over_budget,
+    }
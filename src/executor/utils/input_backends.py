@@ -0,0 +1,229 @@
+"""マウス・キー入力のバックエンド
+
+- QuartzInputBackend: CGEvent を直接ポストする（pyautogui のペーシングや待機を介さない）
+- PyAutoGUIInputBackend: pyautogui の低レベル関数を使う（Quartz が使えない場合のフォールバック）
+- RecordingInputBackend: イベントを記録するだけのテスト用バックエンド
+
+バックエンドは「イベント1つ」の単位の操作のみを持ち、移動経路や待機時間は
+utils/input_engine.py の InputEngine が速度プロファイルに従って生成する。
+使用するバックエンドは環境変数 MIKI_INPUT_BACKEND（auto/quartz/pyautogui/recording）で選択できる。
+"""
+import os
+import sys
+import threading
+import time
+
+
+class InputBackend:
+    """入力バックエンドの基底クラス"""
+
+    name = "base"
+
+    def cursor_position(self):
+        """マウスカーソルの論理座標を (x, y) で返す"""
+        raise NotImplementedError
+
+    def move(self, x, y, button=None):
+        """カーソルを (x, y) へ移動するイベントを1つ送る（button 指定時はドラッグ中の移動）"""
+        raise NotImplementedError
+
+    def button(self, x, y, button, down, click_state=1):
+        """(x, y) でボタンを押す/離すイベントを送る
+
+        click_state はダブルクリックなどの連続クリックの何回目か（1始まり）。
+        """
+        raise NotImplementedError
+
+    def scroll(self, lines):
+        """スクロールホイールのイベントを送る（正の値で上方向、行単位）"""
+        raise NotImplementedError
+
+    def key_combo(self, key, modifiers=()):
+        """修飾キー（command/shift/option/control）つきでキーを押して離す"""
+        raise NotImplementedError
+
+
+# macOS の仮想キーコード（Carbon の kVK_ANSI_*）
+_QUARTZ_KEY_CODES = {"a": 0x00, "c": 0x08, "v": 0x09, "x": 0x07, "z": 0x06}
+
+
+class QuartzInputBackend(InputBackend):
+    """CGEventCreateMouseEvent / CGEventPost でイベントを直接ポストする"""
+
+    name = "quartz"
+
+    def __init__(self):
+        import Quartz
+        self._quartz = Quartz
+        self._buttons = {
+            "left": (Quartz.kCGMouseButtonLeft, Quartz.kCGEventLeftMouseDown,
+                     Quartz.kCGEventLeftMouseUp, Quartz.kCGEventLeftMouseDragged),
+            "right": (Quartz.kCGMouseButtonRight, Quartz.kCGEventRightMouseDown,
+                      Quartz.kCGEventRightMouseUp, Quartz.kCGEventRightMouseDragged),
+            "middle": (Quartz.kCGMouseButtonCenter, Quartz.kCGEventOtherMouseDown,
+                       Quartz.kCGEventOtherMouseUp, Quartz.kCGEventOtherMouseDragged),
+        }
+
+    def _button(self, button):
+        entry = self._buttons.get(button)
+        if entry is None:
+            raise ValueError(f"Unknown mouse button: {button}")
+        return entry
+
+    def _post(self, event):
+        self._quartz.CGEventPost(self._quartz.kCGHIDEventTap, event)
+
+    def cursor_position(self):
+        Quartz = self._quartz
+        location = Quartz.CGEventGetLocation(Quartz.CGEventCreate(None))
+        return int(location.x), int(location.y)
+
+    def move(self, x, y, button=None):
+        Quartz = self._quartz
+        if button is None:
+            event_type, mouse_button = Quartz.kCGEventMouseMoved, Quartz.kCGMouseButtonLeft
+        else:
+            mouse_button, _, _, event_type = self._button(button)
+        self._post(Quartz.CGEventCreateMouseEvent(None, event_type, (x, y), mouse_button))
+
+    def button(self, x, y, button, down, click_state=1):
+        Quartz = self._quartz
+        mouse_button, down_type, up_type, _ = self._button(button)
+        event = Quartz.CGEventCreateMouseEvent(
+            None, down_type if down else up_type, (x, y), mouse_button)
+        Quartz.CGEventSetIntegerValueField(event, Quartz.kCGMouseEventClickState, click_state)
+        self._post(event)
+
+    def scroll(self, lines):
+        Quartz = self._quartz
+        self._post(Quartz.CGEventCreateScrollWheelEvent(
+            None, Quartz.kCGScrollEventUnitLine, 1, int(lines)))
+
+    def key_combo(self, key, modifiers=()):
+        Quartz = self._quartz
+        key_code = _QUARTZ_KEY_CODES.get(key)
+        if key_code is None:
+            raise ValueError(f"Unsupported key for Quartz events: {key}")
+        masks = {
+            "command": Quartz.kCGEventFlagMaskCommand,
+            "shift": Quartz.kCGEventFlagMaskShift,
+            "option": Quartz.kCGEventFlagMaskAlternate,
+            "control": Quartz.kCGEventFlagMaskControl,
+        }
+        flags = 0
+        for modifier in modifiers:
+            flags |= masks[modifier]
+        for down in (True, False):
+            event = Quartz.CGEventCreateKeyboardEvent(None, key_code, down)
+            # 修飾キー自体のイベントは送らず、フラグで指定する（物理キーの状態に影響しない）
+            Quartz.CGEventSetFlags(event, flags)
+            self._post(event)
+
+
+class PyAutoGUIInputBackend(InputBackend):
+    """pyautogui の低レベル関数を使うフォールバック（pyautogui.PAUSE の待機は行わない）"""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    def cursor_position(self):
+        x, y = self._pyautogui.position()
+        return int(x), int(y)
+
+    def move(self, x, y, button=None):
+        if button is not None:
+            # ボタンを押したままの移動はドラッグイベントとして送る（moveTo では通常の移動になる）
+            self._pyautogui.dragTo(x, y, button=button, mouseDownUp=False, _pause=False)
+        else:
+            self._pyautogui.moveTo(x, y, _pause=False)
+
+    def button(self, x, y, button, down, click_state=1):
+        if down:
+            self._pyautogui.mouseDown(x, y, button=button, _pause=False)
+        else:
+            self._pyautogui.mouseUp(x, y, button=button, _pause=False)
+
+    def scroll(self, lines):
+        self._pyautogui.scroll(int(lines), _pause=False)
+
+    def key_combo(self, key, modifiers=()):
+        self._pyautogui.hotkey(*modifiers, key, _pause=False)
+
+
+class RecordingInputBackend(InputBackend):
+    """送られたイベントを記録するテスト用バックエンド
+
+    events は (種類, 引数..., time.monotonic()) のタプルのリスト。
+    """
+
+    name = "recording"
+
+    def __init__(self, cursor=(100, 100)):
+        self.cursor = tuple(cursor)
+        self.events = []
+
+    def cursor_position(self):
+        return self.cursor
+
+    def move(self, x, y, button=None):
+        self.cursor = (x, y)
+        self.events.append(("move", x, y, button, time.monotonic()))
+
+    def button(self, x, y, button, down, click_state=1):
+        self.cursor = (x, y)
+        self.events.append(("down" if down else "up", x, y, button, click_state, time.monotonic()))
+
+    def scroll(self, lines):
+        self.events.append(("scroll", lines, time.monotonic()))
+
+    def key_combo(self, key, modifiers=()):
+        self.events.append(("key", key, tuple(modifiers), time.monotonic()))
+
+    def clear(self):
+        self.events.clear()
+
+
+_BACKEND_FACTORIES = {
+    "quartz": QuartzInputBackend,
+    "pyautogui": PyAutoGUIInputBackend,
+    "recording": RecordingInputBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_input_backend(name=None):
+    """名前からバックエンドを生成する。auto の場合はQuartzを優先し、使えなければpyautogui"""
+    name = (name or os.environ.get("MIKI_INPUT_BACKEND") or "auto").lower()
+    if name == "auto":
+        if sys.platform == "darwin":
+            try:
+                return QuartzInputBackend()
+            except ImportError:
+                pass
+        return PyAutoGUIInputBackend()
+    factory = _BACKEND_FACTORIES.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown input backend: {name}")
+    return factory()
+
+
+def get_input_backend():
+    """現在の入力バックエンドを返す（初回呼び出し時に生成）"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_input_backend()
+    return _backend
+
+
+def set_input_backend(backend):
+    """入力バックエンドを差し替える（テスト用）"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,178 @@
+"""速度プロファイルに従ってマウス操作のイベント列を生成する入力エンジン
+
+移動経路は開始時に easeInOutQuad で一度に計算し、プロファイルの EVENT_RATE（毎秒のイベント数）
+の等間隔で送る。各イベントの送信時刻は開始時刻からの締め切りで決めるため、
+送信処理の遅れが積み重ならない。DURATION が 0 の場合は目標位置へ直接移動する（ワープ）。
+
+速度プロファイル:
+    instant: ワープしてクリック。移動アニメーションと操作後の待機なし
+    default: 従来の pyautogui 設定相当（短いアニメーションと 0.1 秒の待機）
+    humanlike: 人の操作に近い速さの移動とクリック
+起動時のプロファイルは環境変数 MIKI_SPEED_PROFILE で選択でき、
+setSpeedProfile アクションで実行中に切り替えられる。
+"""
+import os
+import threading
+import time
+
+from utils.input_backends import get_input_backend
+
+SPEED_PROFILES = {
+    "instant": {
+        "PAUSE": 0.0,               # 操作後の待機時間
+        "CLICK_DURATION": 0.0,      # クリック前のマウス移動時間
+        "MOUSE_MOVE_DURATION": 0.0, # マウス移動時間
+        "DRAG_DURATION": 0.0,       # ドラッグ操作時間
+        "EVENT_RATE": 120,          # 移動中のイベント数（毎秒）
+    },
+    "default": {
+        "PAUSE": 0.1,
+        "CLICK_DURATION": 0.1,
+        "MOUSE_MOVE_DURATION": 0.1,
+        "DRAG_DURATION": 0.2,
+        "EVENT_RATE": 60,
+    },
+    "humanlike": {
+        "PAUSE": 0.1,
+        "CLICK_DURATION": 0.25,
+        "MOUSE_MOVE_DURATION": 0.25,
+        "DRAG_DURATION": 0.5,
+        "EVENT_RATE": 60,
+    },
+}
+DEFAULT_PROFILE_NAME = "default"
+
+# pyautogui.FAILSAFE と同じく、カーソルが左上隅にある場合は操作を中止する
+FAILSAFE_POINT = (0, 0)
+
+
+def ease_in_out_quad(t):
+    if t < 0.5:
+        return 2 * t * t
+    return -1 + (4 - 2 * t) * t
+
+
+def compute_path(start, end, duration, rate):
+    """start から end への移動経路を [(x, y, 開始からの秒数), ...] で返す（最後は必ず end）"""
+    steps = int(duration * rate)
+    if steps <= 1:
+        return [(end[0], end[1], 0.0)]
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    path = []
+    for i in range(1, steps + 1):
+        progress = ease_in_out_quad(i / steps)
+        path.append((round(start[0] + dx * progress), round(start[1] + dy * progress),
+                     (i - 1) / rate))
+    return path
+
+
+class InputEngine:
+    """マウス操作をバックエンドのイベント列に変換して送る
+
+    Args:
+        backend: utils/input_backends.py の InputBackend（省略時は共有のバックエンド）
+        profile: 速度プロファイルの名前
+        sleep: 待機に使う関数（テストで差し替える）
+    """
+
+    def __init__(self, backend=None, profile=DEFAULT_PROFILE_NAME, sleep=time.sleep):
+        self._backend = backend
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.profile_name = profile
+        self.profile = dict(SPEED_PROFILES[profile])
+
+    @property
+    def backend(self):
+        return self._backend if self._backend is not None else get_input_backend()
+
+    def set_profile(self, name=None, overrides=None):
+        """速度プロファイルを切り替える（overrides で個別の値を上書きできる）"""
+        with self._lock:
+            if name is not None:
+                if name not in SPEED_PROFILES:
+                    raise ValueError(f"Unknown speed profile: {name}")
+                self.profile_name = name
+                self.profile = dict(SPEED_PROFILES[name])
+            for key, value in (overrides or {}).items():
+                if key not in self.profile:
+                    raise ValueError(f"Unknown speed profile setting: {key}")
+                self.profile[key] = value
+            return dict(self.profile)
+
+    def _check_failsafe(self, backend):
+        if tuple(backend.cursor_position()) == FAILSAFE_POINT:
+            raise RuntimeError("Fail-safe triggered: マウスカーソルが画面の左上隅にあります")
+
+    def _play(self, backend, path, button=None):
+        """経路の各点を予定時刻に送る。送ったイベント数を返す"""
+        start = time.monotonic()
+        for x, y, offset in path:
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                self._sleep(delay)
+            backend.move(x, y, button)
+        return len(path)
+
+    def _move(self, backend, x, y, duration, button=None):
+        path = compute_path(backend.cursor_position(), (x, y), duration, self.profile["EVENT_RATE"])
+        return self._play(backend, path, button)
+
+    def _pause(self):
+        if self.profile["PAUSE"] > 0:
+            self._sleep(self.profile["PAUSE"])
+
+    def move(self, x, y, duration=None):
+        """(x, y) へ移動する。送ったイベント数を返す"""
+        backend = self.backend
+        self._check_failsafe(backend)
+        if duration is None:
+            duration = self.profile["MOUSE_MOVE_DURATION"]
+        events = self._move(backend, x, y, duration)
+        self._pause()
+        return events
+
+    def click(self, x, y, clicks=1, button="left", duration=None):
+        """(x, y) へ移動してクリックする（clicks 回の連続クリック）。送ったイベント数を返す"""
+        backend = self.backend
+        self._check_failsafe(backend)
+        if duration is None:
+            duration = self.profile["CLICK_DURATION"]
+        events = self._move(backend, x, y, duration)
+        for click_state in range(1, clicks + 1):
+            backend.button(x, y, button, True, click_state)
+            backend.button(x, y, button, False, click_state)
+        self._pause()
+        return events + clicks * 2
+
+    def drag(self, from_x, from_y, to_x, to_y, duration=None, button="left"):
+        """(from_x, from_y) から (to_x, to_y) へドラッグする。送ったイベント数を返す"""
+        backend = self.backend
+        self._check_failsafe(backend)
+        if duration is None:
+            duration = self.profile["DRAG_DURATION"]
+        events = self._move(backend, from_x, from_y, self.profile["MOUSE_MOVE_DURATION"])
+        backend.button(from_x, from_y, button, True)
+        # ドラッグ中の移動イベントが1つも無いと、ドロップとして扱わないアプリがある
+        path = compute_path((from_x, from_y), (to_x, to_y), duration, self.profile["EVENT_RATE"])
+        events += self._play(backend, path, button)
+        backend.button(to_x, to_y, button, False)
+        self._pause()
+        return events + 2
+
+    def scroll(self, lines):
+        """スクロールする（正の値で上方向、行単位）。送ったイベント数を返す"""
+        backend = self.backend
+        self._check_failsafe(backend)
+        backend.scroll(lines)
+        self._pause()
+        return 1
+
+
+_engine = InputEngine(profile=os.environ.get("MIKI_SPEED_PROFILE") or DEFAULT_PROFILE_NAME)
+
+
+def get_input_engine():
+    """共有の入力エンジンを返す"""
+    return _engine
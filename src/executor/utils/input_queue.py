@@ -0,0 +1,119 @@
+"""move / scroll の合体（coalescing）キュー
+
+連続した move と scroll はすぐには実行せずキューに入れ、隣接する同種のイベントを1つにまとめる:
+- 連続した move は最後の移動先への1回の移動にする
+- 連続した scroll は量を合計した1回のスクロールにする
+- move と scroll が入れ替わる位置では、それまでのイベントを先に実行する
+  （スクロール対象はカーソル位置で決まるため）
+
+キューは直列レーンで実行される他のアクション（クリック・キー入力・flushInput など）の
+実行前にだけ実行される（タイマーや並行プールのスレッドからは実行しない）。
+実行結果と合体したイベント数（coalesced）はその応答の input_flush に入り、
+遅延実行した move / scroll が失敗した場合はその応答自体がエラーになる。
+環境変数 MIKI_INPUT_COALESCE=1 で有効化する（既定は無効で、move / scroll を即座に実行する）。
+"""
+import os
+import threading
+
+COALESCABLE_ACTIONS = frozenset({"move", "scroll"})
+
+
+class InputQueue:
+    """move / scroll を合体させて実行するキュー
+
+    Args:
+        execute: (action, params) を実行して結果dictを返す関数
+    """
+
+    def __init__(self, execute):
+        self._execute = execute
+        # 実行中のフラッシュと新しいイベントの追加を直列化する
+        self._lock = threading.RLock()
+        self._pending = None  # [action, params, イベント数]
+        self.last_flush = None
+        self.enqueued = 0
+        self.executed = 0
+
+    def enqueue(self, action, params):
+        """イベントをキューに入れる。直前のイベントと合体できなければ先に実行する
+
+        Returns:
+            dict: 応答（queued: True、pending: 合体待ちのイベント数、input_flush: 先に実行した結果）
+        """
+        error = _validate(action, params)
+        if error is not None:
+            return {"status": "error", "message": error}
+        flushed = None
+        with self._lock:
+            self.enqueued += 1
+            pending = self._pending
+            if pending is not None and pending[0] == action:
+                if action == "scroll":
+                    pending[1] = {**params, "amount": int(pending[1]["amount"]) + int(params["amount"])}
+                else:
+                    pending[1] = dict(params)
+                pending[2] += 1
+            else:
+                flushed = self._flush_locked()
+                self._pending = [action, dict(params), 1]
+            pending_count = self._pending[2]
+        return attach_flush({"status": "success", "queued": True, "pending": pending_count}, flushed)
+
+    def _flush_locked(self):
+        pending = self._pending
+        if pending is None:
+            return None
+        self._pending = None
+        action, params, count = pending
+        self.executed += 1
+        try:
+            result = self._execute(action, params)
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        self.last_flush = {**result, "action": action, "events": count, "coalesced": count - 1}
+        return self.last_flush
+
+    def flush(self):
+        """キューのイベントを実行し、その結果を返す（空なら None）"""
+        with self._lock:
+            return self._flush_locked()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "executed": self.executed,
+                "coalesced": self.enqueued - self.executed - (self._pending[2] if self._pending else 0),
+                "pending": self._pending[2] if self._pending else 0,
+            }
+
+
+def attach_flush(result, flushed):
+    """フラッシュの結果を応答の input_flush に入れる。フラッシュが失敗していれば応答をエラーにする
+
+    遅延実行した move / scroll の失敗（フェイルセーフ・入力バックエンドのエラーなど）を
+    呼び出し側が見落とさないよう、input_flush だけでなく status / message にも反映する。
+    """
+    if flushed is None:
+        return result
+    result = {**result, "input_flush": flushed}
+    if flushed.get("status") != "success":
+        result["status"] = "error"
+        result["message"] = f"Deferred {flushed['action']} failed: {flushed.get('message')}"
+    return result
+
+
+def _validate(action, params):
+    """実行時ではなくキューに入れる時点でパラメーターの誤りを返す"""
+    if action == "scroll":
+        try:
+            int(params.get("amount"))
+        except (TypeError, ValueError):
+            return f"Invalid scroll amount: {params.get('amount')}"
+    elif "x" not in params or "y" not in params:
+        return "move には x と y が必要です"
+    return None
+
+
+def coalescing_enabled():
+    return os.environ.get("MIKI_INPUT_COALESCE", "0") == "1"
@@ -0,0 +1,98 @@
+"""UI要素のロケーター索引（role + name → ウィンドウ内のパスと位置）
+
+elementsJson でツリーを取得するたびに、各要素の位置（ウィンドウ番号・ウィンドウ名と、
+ウィンドウからの uiElements の添字の列）を (アプリ, role, name) ごとに記録する。
+focusElement / クリックはこのパスで要素を直接参照し、ツリーをたどり直さずに済む。
+
+索引のパスが古くなっている場合（参照した要素の role/name が一致しない）は、
+スクリプト側でパスの親の周辺から探し直し、見つけた位置で索引を更新する。
+"""
+import threading
+from collections import namedtuple
+
+Locator = namedtuple("Locator", ["window", "window_name", "path", "frame"])
+
+MAX_LOCATORS_PER_KEY = 4
+
+
+class LocatorIndex:
+    """アプリごとの (role, name) → [Locator] の索引"""
+
+    def __init__(self):
+        self._apps = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def rebuild(self, app_name, windows, replace=True):
+        """ツリー（JXA が各ノードに "path" を付けたもの）から索引を作る
+
+        ノードの "path" は取り除く。replace=False の場合は既存の索引に追加・上書きする
+        （ウィンドウやフィルターで絞り込んだ取得結果の場合）。
+        """
+        entries = {}
+        for window in windows:
+            window_path = window.pop("path", None)
+            if window_path is None:
+                continue
+            window_index, window_name = window_path[0], window.get("name", "")
+            stack = [window]
+            while stack:
+                node = stack.pop()
+                path = node.pop("path", window_path)
+                if node is not window:
+                    key = (node.get("role"), node.get("name") or "")
+                    locators = entries.setdefault(key, [])
+                    if len(locators) < MAX_LOCATORS_PER_KEY:
+                        locators.append(Locator(window_index, window_name, path[1:],
+                                                list(node.get("position") or []) + list(node.get("size") or [])))
+                stack.extend(reversed(node.get("children") or ()))
+        with self._lock:
+            if replace or app_name not in self._apps:
+                self._apps[app_name] = entries
+            else:
+                self._apps[app_name].update(entries)
+        return sum(len(locators) for locators in entries.values())
+
+    def lookup(self, app_name, role, name):
+        """ロケーターの候補を返す（無ければ空のリスト）"""
+        with self._lock:
+            locators = self._apps.get(app_name, {}).get((role, name or ""), [])
+            if locators:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return list(locators)
+
+    def update(self, app_name, role, name, locator):
+        """探し直して見つけた位置を索引の先頭に登録する"""
+        with self._lock:
+            locators = self._apps.setdefault(app_name, {}).setdefault((role, name or ""), [])
+            locators[:] = [locator] + [old for old in locators if old.path != locator.path
+                                       or old.window_name != locator.window_name]
+            del locators[MAX_LOCATORS_PER_KEY:]
+
+    def clear(self, app_name=None):
+        with self._lock:
+            if app_name is None:
+                self._apps.clear()
+            else:
+                self._apps.pop(app_name, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "apps": len(self._apps),
+                "locators": sum(len(locators) for entries in self._apps.values()
+                                for locators in entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_index = LocatorIndex()
+
+
+def get_locator_index():
+    """共有のロケーター索引を返す"""
+    return _index
@@ -0,0 +1,508 @@
+"""常駐型のAppleScript/JXAスクリプトホストとそのプール
+
+osascript を呼び出しごとに起動すると、インタープリターの起動と System Events への
+新規接続のコストが毎回かかる。ここでは osascript を常駐させ、パイプ経由で
+スクリプトを受け取って実行するホストを複数保持し、使い回す。
+
+プロトコル（1行1JSON、ASCIIのみ）:
+    要求: {"id": 1, "language": "AppleScript" | "JavaScript", "script": "..."}
+    応答: {"id": 1, "ok": true, "output": "..."} / {"id": 1, "ok": false, "error": "..."}
+
+    テンプレート実行（utils/script_cache.py）:
+    要求: {"id": 2, "language": ..., "key": "<内容ハッシュ>", "script": "...", "argv": [...]}
+          script はそのホストで未コンパイルの場合のみ送る。ホストはコンパイル済みの
+          スクリプトを key ごとに保持し、run ハンドラーを argv つきで呼び出す
+    応答: 上記と同じ。未コンパイルの key に script が無ければ {"missing": true}
+
+- 要求ごとのタイムアウト: 応答が無ければホストを強制終了して TimeoutExpired を送出
+  （ホストの空き待ちもタイムアウトに含め、空かなければ同じく TimeoutExpired を送出）
+- 応答の id は要求と照合し、一致しない（前の要求への遅れた）応答は捨てる
+- クラッシュからの復旧: 異常終了したホストは破棄し、次回の要求で新しいホストを起動
+- 起動の失敗: 待機時間（失敗が続くと倍々に伸ばす）の間は osascript の都度起動に切り替え、
+  待機後に再び起動を試みる（一時的な失敗でプールが使えなくなったままにならない）
+- リーク対策: 一定回数の要求を処理したホストは破棄して再起動
+- テスト用: CallableScriptHost で任意のPython関数をインタープリターの代わりに使える
+"""
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+from collections import namedtuple
+
+# subprocess.run() の戻り値と同じ属性名にして、呼び出し側の処理を共通化する
+ScriptResult = namedtuple("ScriptResult", ["returncode", "stdout", "stderr"])
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_REQUESTS_PER_HOST = 100
+DEFAULT_SCRIPT_TIMEOUT = 30  # 秒
+HOST_STARTUP_TIMEOUT = 10  # 秒
+# ホストの起動に失敗してから再び起動を試みるまでの時間（秒）。失敗が続くと倍々に伸ばす
+HOST_RETRY_COOLDOWN = 5.0
+MAX_HOST_RETRY_COOLDOWN = 120.0
+
+# osascript 上で動作するホスト本体（JXA）
+# OSAKit で要求ごとに独立したスクリプトとしてコンパイル・実行するため、
+# 実行されるスクリプト同士で変数が干渉しない
+JXA_HOST_SCRIPT = r'''
+ObjC.import('Foundation');
+ObjC.import('OSAKit');
+
+const stdin = $.NSFileHandle.fileHandleWithStandardInput;
+const stdout = $.NSFileHandle.fileHandleWithStandardOutput;
+const TYPE_LIST = 0x6C697374;  // 'list'
+let buffer = "";
+
+function readLine() {
+  while (true) {
+    const index = buffer.indexOf("\n");
+    if (index >= 0) {
+      const line = buffer.slice(0, index);
+      buffer = buffer.slice(index + 1);
+      return line;
+    }
+    const data = stdin.availableData;
+    if (data.length === 0) return null;
+    buffer += $.NSString.alloc.initWithDataEncoding(data, $.NSASCIIStringEncoding).js;
+  }
+}
+
+function writeLine(obj) {
+  // 非ASCII文字はエスケープして、出力を常にASCIIに保つ
+  const text = JSON.stringify(obj).replace(/[\u007f-\uffff]/g,
+    c => "\\u" + ("0000" + c.charCodeAt(0).toString(16)).slice(-4));
+  stdout.writeData($(text + "\n").dataUsingEncoding($.NSASCIIStringEncoding));
+}
+
+function descriptorToString(desc) {
+  if (!desc || desc.isNil()) return "";
+  if (desc.descriptorType === TYPE_LIST) {
+    // osascript と同じく、リストは ", " 区切りで出力する
+    const items = [];
+    for (let i = 1; i <= desc.numberOfItems; i++) {
+      items.push(descriptorToString(desc.descriptorAtIndex(i)));
+    }
+    return items.join(", ");
+  }
+  const value = desc.stringValue;
+  return (value && !value.isNil()) ? value.js : "";
+}
+
+function errorMessage(errorRef) {
+  try {
+    const info = ObjC.deepUnwrap(errorRef[0]) || {};
+    for (const key of Object.keys(info)) {
+      if (key.indexOf("Message") >= 0) return String(info[key]);
+    }
+    return JSON.stringify(info);
+  } catch (e) {
+    return String(e);
+  }
+}
+
+const compiled = {};
+
+function compileScript(request) {
+  const language = $.OSALanguage.languageForName(request.language || "AppleScript");
+  const script = $.OSAScript.alloc.initWithSourceLanguage(request.script, language);
+  const errorRef = Ref();
+  if (!script.compileAndReturnError(errorRef)) {
+    throw new Error(errorMessage(errorRef));
+  }
+  return script;
+}
+
+function executeTemplate(request) {
+  let script = compiled[request.key];
+  if (!script) {
+    if (!request.script) {
+      return { id: request.id, ok: false, missing: true, error: "Script not compiled" };
+    }
+    script = compileScript(request);
+    compiled[request.key] = script;
+  }
+  const errorRef = Ref();
+  // run ハンドラーの引数は osascript と同じく「引数リスト」1つ
+  const result = script.executeHandlerWithNameArgumentsError("run", $([request.argv || []]), errorRef);
+  if (!result || result.isNil()) {
+    return { id: request.id, ok: false, error: errorMessage(errorRef) };
+  }
+  return { id: request.id, ok: true, output: descriptorToString(result) };
+}
+
+function execute(request) {
+  if (request.key) return executeTemplate(request);
+  const language = $.OSALanguage.languageForName(request.language || "AppleScript");
+  const script = $.OSAScript.alloc.initWithSourceLanguage(request.script, language);
+  const errorRef = Ref();
+  const result = script.executeAndReturnError(errorRef);
+  if (!result || result.isNil()) {
+    return { id: request.id, ok: false, error: errorMessage(errorRef) };
+  }
+  return { id: request.id, ok: true, output: descriptorToString(result) };
+}
+
+writeLine({ ready: true });
+while (true) {
+  const line = readLine();
+  if (line === null) break;
+  if (!line.trim()) continue;
+  let request = null;
+  try {
+    request = JSON.parse(line);
+    writeLine(execute(request));
+  } catch (e) {
+    writeLine({ id: request ? request.id : null, ok: false, error: String(e) });
+  }
+}
+'''
+
+
+class ScriptHostUnavailable(RuntimeError):
+    """スクリプトホストを起動できない（osascript が無い環境など）"""
+
+
+class ScriptHost:
+    """スクリプトホストの基底クラス"""
+
+    def __init__(self):
+        self.requests_served = 0
+
+    @property
+    def alive(self):
+        return True
+
+    def execute(self, script, language="AppleScript", timeout=DEFAULT_SCRIPT_TIMEOUT):
+        """スクリプトを実行して ScriptResult を返す。タイムアウト時は TimeoutExpired を送出"""
+        raise NotImplementedError
+
+    def execute_template(self, key, script, argv, language="JavaScript",
+                         timeout=DEFAULT_SCRIPT_TIMEOUT):
+        """コンパイル済みテンプレートの run ハンドラーを argv つきで実行する
+
+        Returns:
+            (ScriptResult, cache_hit): cache_hit はホスト上のコンパイル済みスクリプトを使ったか
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ProcessScriptHost(ScriptHost):
+    """JSON行プロトコルを話す常駐プロセス（既定は osascript 上のJXAホスト）
+
+    Args:
+        command: 起動するコマンド。省略時は osascript で JXA_HOST_SCRIPT を実行する
+    """
+
+    def __init__(self, command=None):
+        super().__init__()
+        self.compiled_keys = set()
+        self.command = command or ["osascript", "-l", "JavaScript", "-e", JXA_HOST_SCRIPT]
+        self._lines = queue.Queue()
+        self._next_id = 1
+        try:
+            self._process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding="ascii",
+                bufsize=1,
+            )
+        except OSError as e:
+            raise ScriptHostUnavailable(f"Failed to start script host: {e}") from e
+        threading.Thread(target=self._read_loop, name="miki-osa-host-reader", daemon=True).start()
+
+        ready = self._read_reply(HOST_STARTUP_TIMEOUT)
+        if not ready or not ready.get("ready"):
+            self.close()
+            raise ScriptHostUnavailable("Script host did not become ready")
+
+    @property
+    def alive(self):
+        return self._process.poll() is None
+
+    def _read_loop(self):
+        for line in self._process.stdout:
+            self._lines.put(line)
+        self._lines.put(None)
+
+    def _read_reply(self, timeout):
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        if line is None:
+            return None
+        return json.loads(line)
+
+    def execute(self, script, language="AppleScript", timeout=DEFAULT_SCRIPT_TIMEOUT):
+        reply = self._request({"language": language, "script": script}, timeout)
+        return self._to_result(reply)
+
+    def execute_template(self, key, script, argv, language="JavaScript",
+                         timeout=DEFAULT_SCRIPT_TIMEOUT):
+        cache_hit = key in self.compiled_keys
+        request = {"language": language, "key": key, "argv": list(argv)}
+        if not cache_hit:
+            request["script"] = script
+        reply = self._request(request, timeout)
+        if cache_hit and isinstance(reply, dict) and reply.get("missing"):
+            # ホスト側のキャッシュと食い違った場合はソースを添えて再送する
+            cache_hit = False
+            request["script"] = script
+            reply = self._request(request, timeout)
+        result = self._to_result(reply)
+        if isinstance(reply, dict) and not reply.get("missing"):
+            self.compiled_keys.add(key)
+        return result, cache_hit
+
+    def _request(self, request, timeout):
+        request_id = self._next_id
+        self._next_id += 1
+        self.requests_served += 1
+        try:
+            self._process.stdin.write(json.dumps(
+                {"id": request_id, **request}, ensure_ascii=True) + "\n")
+            self._process.stdin.flush()
+        except OSError:
+            self.close()
+            return None
+
+        deadline = time.monotonic() + timeout
+        while True:
+            reply = self._read_reply(max(0.0, deadline - time.monotonic()))
+            if reply is False:
+                # 応答が無いホストは状態が不明なため強制終了する。終了を待ち、
+                # プールに戻す時点で alive が False になるようにする（再利用させない）
+                self._process.kill()
+                self._process.wait()
+                raise subprocess.TimeoutExpired(self.command[:1], timeout)
+            # id が null の応答は要求を解析できなかった場合のもの
+            if reply is None or reply.get("id") in (request_id, None):
+                return reply
+            # 前の要求への遅れた応答は捨てる
+
+    def _to_result(self, reply):
+        if reply is None:
+            self.close()
+            return ScriptResult(1, "", "Script host crashed")
+        if reply.get("ok"):
+            return ScriptResult(0, reply.get("output", "") + "\n", "")
+        return ScriptResult(1, "", reply.get("error", "") + "\n")
+
+    def close(self):
+        if self._process.poll() is None:
+            try:
+                self._process.stdin.close()
+                self._process.wait(timeout=1)
+            except Exception:
+                self._process.kill()
+
+
+class CallableScriptHost(ScriptHost):
+    """Python関数をインタープリターの代わりに使うホスト（Linux上のテスト用）
+
+    Args:
+        handler: (script, language) を受け取り出力文字列を返す関数。例外はエラー応答になる
+        template_handler: テンプレート実行時に (script, argv, language) を受け取る関数
+    """
+
+    def __init__(self, handler, template_handler=None):
+        super().__init__()
+        self.handler = handler
+        self.template_handler = template_handler
+        self.compiled_keys = set()
+        self.scripts = []
+
+    def execute(self, script, language="AppleScript", timeout=DEFAULT_SCRIPT_TIMEOUT):
+        self.requests_served += 1
+        self.scripts.append((language, script))
+        try:
+            return ScriptResult(0, str(self.handler(script, language)) + "\n", "")
+        except Exception as e:
+            return ScriptResult(1, "", str(e) + "\n")
+
+    def execute_template(self, key, script, argv, language="JavaScript",
+                         timeout=DEFAULT_SCRIPT_TIMEOUT):
+        cache_hit = key in self.compiled_keys
+        self.compiled_keys.add(key)
+        self.requests_served += 1
+        self.scripts.append((language, script))
+        try:
+            if self.template_handler is None:
+                raise NotImplementedError("template_handler is not set")
+            output = self.template_handler(script, list(argv), language)
+            return ScriptResult(0, str(output) + "\n", ""), cache_hit
+        except Exception as e:
+            return ScriptResult(1, "", str(e) + "\n"), cache_hit
+
+
+class ScriptHostPool:
+    """スクリプトホストのプール
+
+    Args:
+        factory: ホストを生成する関数
+        size: 同時に保持するホストの最大数
+        max_requests: 1ホストが処理する最大要求数（超えたら再起動）
+        retry_cooldown: ホストの起動に失敗してから再び起動を試みるまでの秒数（失敗が続くと倍々、
+                        上限 MAX_HOST_RETRY_COOLDOWN）
+    """
+
+    def __init__(self, factory=ProcessScriptHost, size=DEFAULT_POOL_SIZE,
+                 max_requests=DEFAULT_MAX_REQUESTS_PER_HOST, retry_cooldown=HOST_RETRY_COOLDOWN):
+        self.factory = factory
+        self.size = size
+        self.max_requests = max_requests
+        self.retry_cooldown = retry_cooldown
+        self._idle = queue.LifoQueue()
+        self._slots = threading.Semaphore(size)
+        self._failure_lock = threading.Lock()
+        self._failures = 0
+        self._retry_at = 0.0
+        self.restarts = 0
+
+    def _start_host(self):
+        with self._failure_lock:
+            if time.monotonic() < self._retry_at:
+                raise ScriptHostUnavailable("Script host is cooling down after a failed start")
+        try:
+            host = self.factory()
+        except ScriptHostUnavailable:
+            with self._failure_lock:
+                cooldown = min(self.retry_cooldown * (2 ** self._failures), MAX_HOST_RETRY_COOLDOWN)
+                self._failures += 1
+                self._retry_at = time.monotonic() + cooldown
+            raise
+        with self._failure_lock:
+            self._failures = 0
+            self._retry_at = 0.0
+        return host
+
+    def _checkout(self):
+        while True:
+            try:
+                host = self._idle.get_nowait()
+            except queue.Empty:
+                return self._start_host()
+            if host.alive:
+                return host
+            self.restarts += 1
+
+    def _checkin(self, host):
+        if host.alive and host.requests_served < self.max_requests:
+            self._idle.put(host)
+        else:
+            host.close()
+            self.restarts += 1
+
+    def _acquire_slot(self, timeout):
+        """ホストの空きを待ち、実行に使える残り秒数を返す
+
+        待ち時間も要求のタイムアウトに含める。timeout 内に空かなければ TimeoutExpired を送出する。
+        """
+        deadline = time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise subprocess.TimeoutExpired("osascript", timeout)
+        return max(deadline - time.monotonic(), 0.0)
+
+    def run(self, script, language="AppleScript", timeout=DEFAULT_SCRIPT_TIMEOUT):
+        """空いているホストでスクリプトを実行する"""
+        remaining = self._acquire_slot(timeout)
+        try:
+            host = self._checkout()
+            try:
+                return host.execute(script, language=language, timeout=remaining)
+            finally:
+                self._checkin(host)
+        finally:
+            self._slots.release()
+
+    def run_template(self, key, script, argv, language="JavaScript", timeout=DEFAULT_SCRIPT_TIMEOUT):
+        """空いているホストでテンプレートを実行し、(ScriptResult, cache_hit) を返す"""
+        remaining = self._acquire_slot(timeout)
+        try:
+            host = self._checkout()
+            try:
+                return host.execute_template(key, script, argv, language=language, timeout=remaining)
+            finally:
+                self._checkin(host)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_disabled = os.environ.get("MIKI_OSA_POOL") == "0"
+
+
+def get_script_pool():
+    """共有のスクリプトホストプールを返す（無効化されている場合はNone）"""
+    global _pool
+    if _pool_disabled:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ScriptHostPool()
+    return _pool
+
+
+def set_script_pool(pool):
+    """スクリプトホストプールを差し替える（テスト用。Noneで無効化）"""
+    global _pool, _pool_disabled
+    with _pool_lock:
+        if _pool is not None and _pool is not pool:
+            _pool.close()
+        _pool = pool
+        _pool_disabled = pool is None
+
+
+def _run_osascript(script, language, timeout):
+    args = ["osascript"]
+    if language != "AppleScript":
+        args += ["-l", language]
+    result = subprocess.run(args + ["-e", script], capture_output=True, text=True, timeout=timeout)
+    return ScriptResult(result.returncode, result.stdout, result.stderr)
+
+
+def run_script(script, language="AppleScript", timeout=DEFAULT_SCRIPT_TIMEOUT):
+    """AppleScript / JXA を実行する
+
+    常駐ホストのプールを優先し、ホストが使えない場合（起動に失敗した後の待機中を含む）は
+    osascript を都度起動する。
+
+    Args:
+        script: スクリプト本文
+        language: "AppleScript" または "JavaScript"
+        timeout: タイムアウト（秒）。超えた場合は subprocess.TimeoutExpired を送出
+
+    Returns:
+        ScriptResult: returncode / stdout / stderr
+    """
+    pool = get_script_pool()
+    if pool is not None:
+        try:
+            return pool.run(script, language=language, timeout=timeout)
+        except ScriptHostUnavailable:
+            # プールは待機時間の後に再び起動を試みる
+            pass
+    return _run_osascript(script, language, timeout)
+
+
+def close_script_pool():
+    """共有プールのホストを全て終了する（エグゼキューター終了時）"""
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
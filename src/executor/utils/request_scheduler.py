@@ -0,0 +1,119 @@
+"""リクエストIDつきコマンドの並行スケジューラー
+
+IDを持つコマンドは完了順に応答され、読み取り専用のアクションは
+スレッドプールで並行実行される。入力を発生させるアクションは
+専用の単一スレッドで直列に実行し、操作順序を保証する。
+
+実行中のアクションは emit_partial() で途中結果を {"id", "partial": true, "seq", ...}
+の行として先に書き出せる（最終応答は従来通り partial を含まない1行）。
+"""
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 入力やUI状態の変更を伴うため直列化が必要なアクション
+# osa は任意のキー入力を送れるため、batch は入力アクションを含みうるため、
+# 安全側に倒して直列レーンで実行する
+SERIAL_ACTIONS = frozenset({
+    "click",
+    "type",
+    "press",
+    "hotkey",
+    "move",
+    "scroll",
+    "drag",
+    "setCursorVisibility",
+    "setSpeedProfile",
+    "focusElement",
+    "osa",
+    "batch",
+    "flushInput",
+})
+
+DEFAULT_MAX_WORKERS = 4
+
+# 実行中のコマンドの (request_id, writer, 次の seq)。スレッドごとに保持する
+_stream_context = threading.local()
+# 並行プールのスレッドで実行中かどうか。スレッドごとに保持する
+_lane_context = threading.local()
+
+
+class ResponseWriter:
+    """標準出力へJSON行を書き出す（複数スレッドから安全に呼び出せる）"""
+
+    def __init__(self, stream=None):
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, payload):
+        line = json.dumps(payload, ensure_ascii=False)
+        with self._lock:
+            stream = self._stream or sys.stdout
+            stream.write(line + "\n")
+            stream.flush()
+
+
+class RequestScheduler:
+    """IDつきコマンドを直列レーンと並行プールに振り分けて実行する
+
+    Args:
+        execute: (action, params) を受け取り結果dictを返す関数
+        writer: 結果を書き出す ResponseWriter
+        max_workers: 読み取り専用アクション用スレッドプールの上限
+    """
+
+    def __init__(self, execute, writer, max_workers=DEFAULT_MAX_WORKERS):
+        self._execute = execute
+        self._writer = writer
+        self._serial = ThreadPoolExecutor(max_workers=1, thread_name_prefix="miki-serial")
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="miki-worker")
+
+    def submit(self, request_id, action, params):
+        """コマンドを適切なレーンへ投入する。結果は完了時に request_id つきで書き出される"""
+        if action in SERIAL_ACTIONS:
+            self._serial.submit(self._run, request_id, action, params, False)
+        else:
+            self._pool.submit(self._run, request_id, action, params, True)
+
+    def _run(self, request_id, action, params, parallel):
+        _stream_context.current = [request_id, self._writer, 0]
+        _lane_context.parallel = parallel
+        try:
+            result = self._execute(action, params)
+        finally:
+            _stream_context.current = None
+            _lane_context.parallel = False
+        result["id"] = request_id
+        self._writer.write(result)
+
+    def shutdown(self):
+        """実行中・待機中のコマンドを全て完了させてから停止する"""
+        self._serial.shutdown(wait=True)
+        self._pool.shutdown(wait=True)
+
+
+def in_parallel_lane():
+    """現在のスレッドが読み取り専用アクション用の並行プールで実行中なら True
+
+    直列レーンとIDなし（FIFOモード）のメインスレッドでは False。
+    入力を発生させる処理はこれが False のときだけ実行してよい。
+    """
+    return getattr(_lane_context, "parallel", False)
+
+
+def emit_partial(payload):
+    """実行中のIDつきコマンドの途中結果を書き出す
+
+    IDなし（FIFOモード）のコマンドから呼ばれた場合は何もしない。
+
+    Returns:
+        bool: 書き出した場合 True（呼び出し側は False なら結果を最終応答にまとめる）
+    """
+    context = getattr(_stream_context, "current", None)
+    if context is None:
+        return False
+    request_id, writer, seq = context
+    context[2] = seq + 1
+    writer.write({**payload, "id": request_id, "partial": True, "seq": seq})
+    return True
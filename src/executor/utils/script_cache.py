@@ -0,0 +1,191 @@
+"""パラメーター化されたスクリプトテンプレートとコンパイル済みキャッシュ
+
+UI要素の取得などで使うAppleScript/JXAは、以前は呼び出しごとにアプリ名や
+ロール名を文字列として埋め込んでいたため、毎回ソースが変わりコンパイルを
+やり直していた（引数のエスケープ漏れの原因にもなる）。
+
+ここではスクリプト本文を固定し、引数は run ハンドラーの argv として渡す。
+本文の内容ハッシュをキーにして、コンパイル結果を次の場所にキャッシュする:
+
+- 常駐ホスト（utils/osa_host.py）: ホスト内の OSAScript オブジェクト
+- osascript を都度起動する場合: osacompile で作成した .scpt ファイル
+
+JavaScript のテンプレートは `function run(argv)` で、argv[0] に引数の
+JSON文字列を受け取る。AppleScript のテンプレートは `on run argv` で、
+文字列のリストをそのまま受け取る。
+
+.scpt ファイルはファイル名（内容ハッシュ）だけで再利用するため、他のユーザーが
+置いたファイルを実行しないよう、キャッシュはユーザーごとのディレクトリに置き、
+ディレクトリとファイルの所有者とパーミッションを確認してから使う。
+"""
+import hashlib
+import json
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+
+from utils.osa_host import (
+    DEFAULT_SCRIPT_TIMEOUT,
+    ScriptHostUnavailable,
+    ScriptResult,
+    get_script_pool,
+)
+
+
+def _default_cache_dir():
+    """ユーザーごとのキャッシュディレクトリ（macOS は ~/Library/Caches、他は XDG_CACHE_HOME）"""
+    if sys.platform == "darwin":
+        base = os.path.join(os.path.expanduser("~"), "Library", "Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "miki", "scripts")
+
+
+SCRIPT_CACHE_DIR = os.environ.get("MIKI_SCRIPT_CACHE_DIR") or _default_cache_dir()
+
+
+class ScriptTemplate:
+    """引数を argv で受け取る固定のスクリプト
+
+    Args:
+        name: 統計に表示する名前
+        source: スクリプト本文
+        language: "AppleScript" または "JavaScript"
+    """
+
+    def __init__(self, name, source, language="JavaScript"):
+        self.name = name
+        self.source = source
+        self.language = language
+        self.key = hashlib.blake2b(
+            f"{language}\n{source}".encode("utf-8"), digest_size=12).hexdigest()
+
+    def build_argv(self, args):
+        """引数を argv に変換する（JavaScript は JSON 1つ、AppleScript は文字列のリスト）"""
+        if self.language == "JavaScript":
+            return [json.dumps(args if args is not None else {}, ensure_ascii=False)]
+        return [str(arg) for arg in (args or ())]
+
+
+_stats_lock = threading.Lock()
+_stats = {}
+_compiled_files = {}
+_verified_dirs = set()
+
+
+def _record(template, cache_hit, where):
+    with _stats_lock:
+        entry = _stats.setdefault(template.name, {"calls": 0, "hits": 0, "misses": 0})
+        entry["calls"] += 1
+        entry["hits" if cache_hit else "misses"] += 1
+        entry["last"] = where
+
+
+def _is_private(st):
+    """自分が所有し、グループ・他のユーザーが書き込めないか"""
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _ensure_cache_dir(directory):
+    """キャッシュディレクトリを 0700 で作成し、自分だけが書き込めることを確認する"""
+    if directory in _verified_dirs:
+        return
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise RuntimeError(f"Script cache directory is not owned by the current user: {directory}")
+    if stat.S_IMODE(st.st_mode) != 0o700:
+        os.chmod(directory, 0o700)
+    _verified_dirs.add(directory)
+
+
+def _reusable(path):
+    """以前のプロセスがコンパイルした .scpt を再利用してよいか（自分が所有する通常のファイルのみ）"""
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return False
+    return stat.S_ISREG(st.st_mode) and _is_private(st)
+
+
+def _compiled_path(template):
+    """osacompile でコンパイルした .scpt のパスを返す（初回のみコンパイル）"""
+    path = _compiled_files.get(template.key)
+    if path is not None and os.path.exists(path):
+        return path, True
+    _ensure_cache_dir(SCRIPT_CACHE_DIR)
+    path = os.path.join(SCRIPT_CACHE_DIR, f"{template.key}.scpt")
+    if _reusable(path):
+        # 以前のプロセスがコンパイルしたファイルを再利用する
+        _compiled_files[template.key] = path
+        return path, True
+    # 条件を満たさないファイルは使わず、コンパイルし直して置き換える
+    # 一時ファイル名は呼び出しごとに一意にする（同じテンプレートを複数のスレッドが同時にコンパイルしても
+    # 互いの書きかけのファイルを置き換えない）
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{template.key}.", suffix=".scpt.tmp", dir=SCRIPT_CACHE_DIR)
+    os.close(fd)
+    try:
+        result = subprocess.run(
+            ["osacompile", "-l", template.language, "-o", tmp_path],
+            input=template.source, capture_output=True, text=True, timeout=DEFAULT_SCRIPT_TIMEOUT)
+        if result.returncode != 0:
+            raise RuntimeError(f"osacompile failed: {result.stderr.strip()}")
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    _compiled_files[template.key] = path
+    return path, False
+
+
+def _run_compiled_file(template, argv, timeout):
+    path, cache_hit = _compiled_path(template)
+    _record(template, cache_hit, "file")
+    result = subprocess.run(["osascript", path] + argv, capture_output=True, text=True,
+                            timeout=timeout)
+    return ScriptResult(result.returncode, result.stdout, result.stderr)
+
+
+def run_template(template, args=None, timeout=DEFAULT_SCRIPT_TIMEOUT):
+    """テンプレートをコンパイル済みキャッシュ経由で実行する
+
+    Args:
+        template: ScriptTemplate
+        args: JavaScript なら JSON に変換できる値、AppleScript なら文字列のリスト
+        timeout: タイムアウト（秒）。超えた場合は subprocess.TimeoutExpired を送出
+
+    Returns:
+        ScriptResult: returncode / stdout / stderr（run_script と同じ形式）
+    """
+    argv = template.build_argv(args)
+    pool = get_script_pool()
+    if pool is not None:
+        try:
+            result, cache_hit = pool.run_template(
+                template.key, template.source, argv, language=template.language, timeout=timeout)
+            _record(template, cache_hit, "host")
+            return result
+        except ScriptHostUnavailable:
+            # プールは待機時間の後に再び起動を試みる
+            pass
+    return _run_compiled_file(template, argv, timeout)
+
+
+def get_script_cache_stats(reset=False):
+    """テンプレートごとのキャッシュヒット数を返す（scriptCacheStats アクション）"""
+    with _stats_lock:
+        templates = {name: dict(entry) for name, entry in _stats.items()}
+        if reset:
+            _stats.clear()
+    return {
+        "status": "success",
+        "hits": sum(entry["hits"] for entry in templates.values()),
+        "misses": sum(entry["misses"] for entry in templates.values()),
+        "templates": templates,
+    }
@@ -0,0 +1,201 @@
+"""クリップボード経由のテキスト入力エンジン
+
+テキストを NSPasteboard にプロセス内で書き込み、⌘V を入力バックエンド
+（utils/input_backends.py）のキーイベントとして送る。pbcopy / osascript のプロセスを起動しない。
+
+- 書き込みの完了は固定時間の待機ではなく、ペーストボードの changeCount の変化で確認する
+- 入力前のクリップボードの内容は保存しておき、ペースト後に戻す。戻す処理は
+  restore_delay 秒（既定 RESTORE_DELAY）待ってからバックグラウンドで行い、
+  その間に changeCount が変わった場合（ユーザーや他のアプリがコピーした場合）は戻さない
+- 待機時間は経験則にすぎない。ペースト先のアプリがそれより後にペーストボードを読むと、
+  戻した元の内容が貼り付けられてしまう。遅いアプリには呼び出しごとに長い待機を指定する
+- ⌘V の送信に失敗した場合は待たずにすぐ戻す
+- 連続した入力では最初に保存した内容を保持し、最後の入力の後に1回だけ戻す
+  （restore=False の入力が続いても、それ以前に保存した内容の復元は取り消さずに引き継ぐ）
+"""
+import threading
+import time
+
+from utils.input_backends import get_input_backend
+
+# ⌘V を送ってからクリップボードを元に戻すまでの既定の時間（秒）。経験則による値
+RESTORE_DELAY = 0.5
+# 書き込み後に changeCount の変化を待つ上限（秒）と確認間隔（秒）
+WRITE_TIMEOUT = 0.5
+WRITE_POLL_INTERVAL = 0.005
+
+
+class NSPasteboardClipboard:
+    """AppKit の NSPasteboard（一般ペーストボード）を操作する"""
+
+    def __init__(self):
+        import AppKit
+        self._appkit = AppKit
+        self._pasteboard = AppKit.NSPasteboard.generalPasteboard()
+
+    def change_count(self):
+        return int(self._pasteboard.changeCount())
+
+    def snapshot(self):
+        """現在の内容を [{型: データ}, ...]（項目ごと）で返す"""
+        items = []
+        for item in self._pasteboard.pasteboardItems() or []:
+            entry = {}
+            for pasteboard_type in item.types():
+                data = item.dataForType_(pasteboard_type)
+                if data is not None:
+                    entry[pasteboard_type] = data
+            items.append(entry)
+        return items
+
+    def write_text(self, text):
+        self._pasteboard.clearContents()
+        if not self._pasteboard.setString_forType_(text, self._appkit.NSPasteboardTypeString):
+            raise RuntimeError("NSPasteboard への書き込みに失敗しました")
+
+    def restore(self, items):
+        AppKit = self._appkit
+        self._pasteboard.clearContents()
+        restored = []
+        for entry in items:
+            item = AppKit.NSPasteboardItem.alloc().init()
+            for pasteboard_type, data in entry.items():
+                item.setData_forType_(data, pasteboard_type)
+            restored.append(item)
+        if restored:
+            self._pasteboard.writeObjects_(restored)
+
+
+class MemoryClipboard:
+    """メモリ上のクリップボード（テスト用）"""
+
+    def __init__(self, text=None):
+        self.items = [] if text is None else [{"public.utf8-plain-text": text}]
+        self.count = 0
+
+    def change_count(self):
+        return self.count
+
+    def snapshot(self):
+        return [dict(entry) for entry in self.items]
+
+    def write_text(self, text):
+        self.items = [{"public.utf8-plain-text": text}]
+        self.count += 1
+
+    def restore(self, items):
+        self.items = [dict(entry) for entry in items]
+        self.count += 1
+
+
+class TextEntryEngine:
+    """クリップボードへの書き込みと ⌘V の送信でテキストを入力する
+
+    Args:
+        clipboard: NSPasteboardClipboard 互換のオブジェクト（省略時は初回使用時に生成）
+        backend: 入力バックエンド（省略時は共有のバックエンド）
+        restore_delay: ペーストからクリップボードを戻すまでの既定の秒数（type_text で呼び出しごとに変更できる）
+    """
+
+    def __init__(self, clipboard=None, backend=None, restore_delay=RESTORE_DELAY):
+        self._clipboard = clipboard
+        self._backend = backend
+        self.restore_delay = restore_delay
+        self._lock = threading.Lock()
+        # (入力前の内容, 自分が書き込んだ後の changeCount, 復元タイマー)
+        self._pending = None
+
+    @property
+    def clipboard(self):
+        if self._clipboard is None:
+            self._clipboard = NSPasteboardClipboard()
+        return self._clipboard
+
+    @property
+    def backend(self):
+        return self._backend if self._backend is not None else get_input_backend()
+
+    def _wait_for_change(self, clipboard, previous):
+        deadline = time.monotonic() + WRITE_TIMEOUT
+        while True:
+            count = clipboard.change_count()
+            if count != previous or time.monotonic() >= deadline:
+                return count
+            time.sleep(WRITE_POLL_INTERVAL)
+
+    def type_text(self, text, restore=True, restore_delay=None):
+        """テキストを貼り付ける
+
+        Args:
+            text: 入力するテキスト
+            restore: ペースト後に入力前のクリップボードの内容を戻すか。False でも、前の入力で保存した
+                     内容の復元が予定されていればそれを引き継いでこの入力の後に戻す
+            restore_delay: ペーストから戻すまでの秒数（省略時は self.restore_delay）。
+                           ペースト先のアプリが読み取り終えるまでの時間の見積もりでしかないため、
+                           読み取りが遅いアプリでは長めに指定する
+
+        Returns:
+            dict: restore_scheduled（クリップボードを戻す予定か）
+        """
+        if restore_delay is None:
+            restore_delay = self.restore_delay
+        clipboard = self.clipboard
+        with self._lock:
+            saved = None
+            if self._pending is not None:
+                saved, written_count, timer = self._pending
+                timer.cancel()
+                self._pending = None
+                # 前回の入力の後に他の誰かがコピーしていれば、その内容を新たな元の内容とする
+                if clipboard.change_count() != written_count:
+                    saved = None
+            if saved is None and restore:
+                saved = clipboard.snapshot()
+
+            try:
+                previous = clipboard.change_count()
+                clipboard.write_text(text)
+                written_count = self._wait_for_change(clipboard, previous)
+                if written_count == previous:
+                    raise RuntimeError("クリップボードへの書き込みが反映されませんでした")
+                self.backend.key_combo("v", ("command",))
+            except Exception:
+                # ペーストできなかった場合は待たずに元の内容を戻す
+                if saved is not None:
+                    clipboard.restore(saved)
+                raise
+
+            # restore=False でも前の入力から引き継いだ内容は戻す（ユーザーの元の内容を失わない）
+            if saved is not None:
+                timer = threading.Timer(restore_delay, self._restore, (written_count,))
+                timer.daemon = False
+                self._pending = (saved, written_count, timer)
+                timer.start()
+                return {"restore_scheduled": True, "restore_delay": restore_delay}
+            return {"restore_scheduled": False}
+
+    def _restore(self, written_count):
+        with self._lock:
+            if self._pending is None or self._pending[1] != written_count:
+                return
+            saved, _, _ = self._pending
+            self._pending = None
+            # 貼り付けた後に他の誰かがコピーしていれば、その内容を上書きしない
+            if self.clipboard.change_count() == written_count:
+                self.clipboard.restore(saved)
+
+    def flush(self):
+        """予定しているクリップボードの復元をすぐに行う"""
+        with self._lock:
+            pending = self._pending
+        if pending is not None:
+            pending[2].cancel()
+            self._restore(pending[1])
+
+
+_engine = TextEntryEngine()
+
+
+def get_text_entry():
+    """共有のテキスト入力エンジンを返す"""
+    return _engine
@@ -0,0 +1,124 @@
+"""UI要素ツリーの列指向（columnar）エンコード
+
+elementsJson のネストしたJSONは、全ノードで roleDescription / subrole / enabled などの
+キーと "AXButton" などの role 文字列を繰り返す。列指向形式では、ノードを行番号で
+並べ（深さ優先の前順、親は必ず子より前）、属性ごとに1つの配列を持つ:
+
+    {
+      "format": "columnar-v1",
+      "count": ノード数,
+      "roles": [role / subrole / roleDescription の文字列表],
+      "actions": [アクション名の文字列表],
+      "action_sets": [[actions の添字, ...], ...],
+      "columns": {
+        "parent": [親の行番号（ウィンドウは -1）],
+        "id": [ノードID],
+        "role": [roles の添字], "subrole": [...], "role_description": [...],
+        "name": [...], "description": [...], "value": [...],
+        "frame": [x, y, width, height, ...（ノードごとに4要素）],
+        "flags": [enabled=1 | focused=2 | selected=4],
+        "actions": [action_sets の添字]
+      }
+    }
+
+TypeScript側の復元は src/core/ui-tree-codec.ts。
+"""
+FORMAT = "columnar-v1"
+FLAG_ENABLED = 1
+FLAG_FOCUSED = 2
+FLAG_SELECTED = 4
+
+
+class _Interner:
+    """値を初出順の表に登録し、添字を返す"""
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def add(self, value):
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+def encode_columnar(tree):
+    """ツリー（{"windows": [...]}）を列指向形式に変換する"""
+    roles = _Interner()
+    actions = _Interner()
+    action_sets = _Interner()
+    columns = {name: [] for name in (
+        "parent", "id", "role", "subrole", "role_description", "name", "description",
+        "value", "frame", "flags", "actions")}
+
+    stack = [(node, -1) for node in reversed(tree.get("windows") or [])]
+    while stack:
+        node, parent = stack.pop()
+        row = len(columns["parent"])
+        columns["parent"].append(parent)
+        columns["id"].append(node.get("id"))
+        columns["role"].append(roles.add(node.get("role") or ""))
+        columns["subrole"].append(roles.add(node.get("subrole") or ""))
+        columns["role_description"].append(roles.add(node.get("roleDescription") or ""))
+        columns["name"].append(node.get("name") or "")
+        columns["description"].append(node.get("description") or "")
+        columns["value"].append(node.get("value"))
+        position = node.get("position") or (0, 0)
+        size = node.get("size") or (0, 0)
+        columns["frame"].extend((position[0], position[1], size[0], size[1]))
+        columns["flags"].append(
+            (FLAG_ENABLED if node.get("enabled", True) else 0)
+            | (FLAG_FOCUSED if node.get("focused") else 0)
+            | (FLAG_SELECTED if node.get("selected") else 0))
+        action_indexes = tuple(actions.add(name) for name in node.get("actions") or ())
+        columns["actions"].append(action_sets.add(action_indexes))
+        for child in reversed(node.get("children") or []):
+            stack.append((child, row))
+
+    if not any(node_id is not None for node_id in columns["id"]):
+        del columns["id"]
+    return {
+        "format": FORMAT,
+        "count": len(columns["parent"]),
+        "roles": roles.values,
+        "actions": actions.values,
+        "action_sets": [list(action_set) for action_set in action_sets.values],
+        "columns": columns,
+    }
+
+
+def decode_columnar(table):
+    """列指向形式をツリー（{"windows": [...]}）に戻す"""
+    columns = table["columns"]
+    roles = table["roles"]
+    actions = table["actions"]
+    action_sets = table["action_sets"]
+    ids = columns.get("id")
+    frame = columns["frame"]
+    nodes = []
+    windows = []
+    for row in range(table["count"]):
+        flags = columns["flags"][row]
+        node = {
+            "role": roles[columns["role"][row]],
+            "roleDescription": roles[columns["role_description"][row]],
+            "name": columns["name"][row],
+            "description": columns["description"][row],
+            "value": columns["value"][row],
+            "position": frame[row * 4:row * 4 + 2],
+            "size": frame[row * 4 + 2:row * 4 + 4],
+            "enabled": bool(flags & FLAG_ENABLED),
+            "focused": bool(flags & FLAG_FOCUSED),
+            "selected": bool(flags & FLAG_SELECTED),
+            "actions": [actions[index] for index in action_sets[columns["actions"][row]]],
+            "subrole": roles[columns["subrole"][row]],
+            "children": [],
+        }
+        if ids is not None:
+            node["id"] = ids[row]
+        nodes.append(node)
+        parent = columns["parent"][row]
+        (windows if parent < 0 else nodes[parent]["children"]).append(node)
+    return {"windows": windows}